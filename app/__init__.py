@@ -2,21 +2,42 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 import os
 
+from config import Config
+
 db = SQLAlchemy()
 
 def create_app():
     app = Flask(__name__)
 
     # Load configuration
-    app.config['SQLALCHEMY_DATABASE_URI'] = (
-        f"postgresql://{os.getenv('DATABASE_USER')}:{os.getenv('DATABASE_PASSWORD')}"
-        f"@{os.getenv('DATABASE_HOST')}/{os.getenv('DATABASE_NAME')}"
-    )
+    app.config.from_object(Config)
+    # DATABASE_URL (e.g. a local SQLite file for benchmarks) takes precedence
+    # over the DATABASE_* Postgres settings
+    if not app.config.get('SQLALCHEMY_DATABASE_URI'):
+        app.config['SQLALCHEMY_DATABASE_URI'] = (
+            f"postgresql://{os.getenv('DATABASE_USER')}:{os.getenv('DATABASE_PASSWORD')}"
+            f"@{os.getenv('DATABASE_HOST')}/{os.getenv('DATABASE_NAME')}"
+        )
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+    # Connection pool sizing and timeouts
+    from .pool import engine_options
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+
     # Initialize database
     db.init_app(app)
 
+    # Start the write-behind prediction writer if enabled
+    if app.config['PREDICTION_WRITE_BEHIND']:
+        from .persistence import PredictionWriter
+        PredictionWriter(
+            app,
+            max_queue=app.config['PREDICTION_WRITE_QUEUE_SIZE'],
+            batch_size=app.config['PREDICTION_WRITE_BATCH_SIZE'],
+            flush_interval=app.config['PREDICTION_WRITE_FLUSH_INTERVAL'],
+            id_block_size=app.config['PREDICTION_ID_BLOCK_SIZE']
+        )
+
     # Register blueprints
     from .routes import api
     app.register_blueprint(api)
@@ -0,0 +1,98 @@
+# app/asgi.py
+"""
+ASGI entry point with a non-blocking POST /predict.
+
+Model inference and the database write run in a thread pool of
+ASGI_INFERENCE_THREADS threads, so the event loop keeps accepting requests
+while a prediction is computed. Every other route is served by the Flask
+app through asgiref's WSGI adapter.
+
+Usage: uvicorn app.asgi:application --workers 4
+   or: gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker app.asgi:application
+"""
+
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from . import create_app
+from .metrics import stage_timer
+from .routes import timed_score_and_store
+
+flask_app = create_app()
+executor = ThreadPoolExecutor(
+    max_workers=Config.ASGI_INFERENCE_THREADS, thread_name_prefix="inference"
+)
+
+_wsgi_app = None
+
+
+def _score(input_data, started):
+    with flask_app.app_context():
+        return timed_score_and_store(input_data, started)
+
+
+async def _read_body(receive):
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+
+async def _send_json(send, status, payload):
+    body = json.dumps(payload, default=str).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('ascii')),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown(wait=True)
+            writer = flask_app.extensions.get('prediction_writer')
+            if writer is not None:
+                writer.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    global _wsgi_app
+
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+
+    if scope['type'] == 'http' and scope['path'] == '/predict' and scope['method'] == 'POST':
+        started = time.perf_counter()
+        try:
+            body = await _read_body(receive)
+            with stage_timer('parse'):
+                input_data = json.loads(body)
+        except ValueError as e:
+            await _send_json(send, 400, {"error": f"Invalid JSON: {e}"})
+            return
+        loop = asyncio.get_running_loop()
+        payload, status = await loop.run_in_executor(executor, _score, input_data, started)
+        await _send_json(send, status, payload)
+        return
+
+    if _wsgi_app is None:
+        from asgiref.wsgi import WsgiToAsgi
+        _wsgi_app = WsgiToAsgi(flask_app)
+    await _wsgi_app(scope, receive, send)
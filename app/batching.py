@@ -0,0 +1,141 @@
+# app/batching.py
+"""
+Micro-batching of concurrent single-row predictions.
+
+Each /predict call submits its input to a PredictionCoalescer and waits on
+a Future. A background thread collects the calls that arrive within a short
+window (or until max_rows are waiting), runs one batched predict over all
+of their inputs and hands each caller back its own result. Callers may
+pass the predict function to use, so rows submitted just before a model
+swap are still scored by the model they were routed to.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class CoalescerStats:
+    """Thread-safe counters for batch sizes and queueing delay."""
+
+    size_buckets = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+        self.max_batch_size = 0
+        self.size_histogram = {bucket: 0 for bucket in self.size_buckets}
+        self.size_histogram['+Inf'] = 0
+        self.queue_delay_total_ms = 0.0
+        self.queue_delay_max_ms = 0.0
+        self.fallbacks = 0
+
+    def record_batch(self, size, queue_delays_ms):
+        with self._lock:
+            self.batches += 1
+            self.rows += size
+            self.max_batch_size = max(self.max_batch_size, size)
+            bucket = next((b for b in self.size_buckets if size <= b), '+Inf')
+            self.size_histogram[bucket] += 1
+            self.queue_delay_total_ms += sum(queue_delays_ms)
+            self.queue_delay_max_ms = max(self.queue_delay_max_ms, max(queue_delays_ms))
+
+    def record_fallback(self):
+        with self._lock:
+            self.fallbacks += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "rows": self.rows,
+                "mean_batch_size": self.rows / self.batches if self.batches else 0.0,
+                "max_batch_size": self.max_batch_size,
+                "batch_size_histogram": {str(k): v for k, v in self.size_histogram.items()},
+                "mean_queue_delay_ms": self.queue_delay_total_ms / self.rows if self.rows else 0.0,
+                "max_queue_delay_ms": self.queue_delay_max_ms,
+                "fallbacks": self.fallbacks,
+            }
+
+
+class PredictionCoalescer:
+    """
+    Gathers concurrent single-row predictions into batched predict calls.
+
+    Args:
+    - predict_fn (callable): Default function taking a list of input dicts and returning
+      one prediction per input (typically LoadedModel.predict_records).
+    - window_ms (float): How long to wait for more rows once the first one arrives.
+    - max_rows (int): Flush as soon as this many rows are waiting.
+    """
+
+    def __init__(self, predict_fn=None, window_ms=2.0, max_rows=64):
+        self.predict_fn = predict_fn
+        self.window = window_ms / 1000.0
+        self.max_rows = max_rows
+        self.stats = CoalescerStats()
+        self._start()
+        # Threads do not survive fork: restart in workers forked after preload
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="prediction-coalescer", daemon=True)
+        self._thread.start()
+
+    def predict(self, input_data, predict_fn=None, timeout=None):
+        """Submits one input dict and blocks until its prediction is ready."""
+        future = Future()
+        self._queue.put((input_data, future, time.perf_counter(), predict_fn or self.predict_fn))
+        return future.result(timeout=timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_rows:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            self.stats.record_batch(
+                len(batch), [(started - enqueued) * 1000.0 for _, _, enqueued, _ in batch]
+            )
+
+            # Rows routed to different models are scored separately; bound
+            # methods are grouped by the model they belong to
+            groups = {}
+            for item in batch:
+                owner = getattr(item[3], '__self__', item[3])
+                groups.setdefault(id(owner), []).append(item)
+            for group in groups.values():
+                self._predict_group(group[0][3], group)
+
+    def _predict_group(self, predict_fn, group):
+        inputs = [input_data for input_data, _, _, _ in group]
+        try:
+            predictions = predict_fn(inputs)
+        except Exception:
+            # One bad row must not fail its neighbours: retry row by row
+            self.stats.record_fallback()
+            for input_data, future, _, _ in group:
+                try:
+                    future.set_result(predict_fn([input_data])[0])
+                except Exception as e:
+                    future.set_exception(e)
+            return
+
+        for (_, future, _, _), prediction in zip(group, predictions):
+            future.set_result(prediction)
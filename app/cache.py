@@ -0,0 +1,212 @@
+# app/cache.py
+"""
+Content-addressed cache of NutriScore predictions.
+
+Entries are keyed by a SHA-256 of the 11 input fields stored in the
+predictions table, in a fixed order, with numbers normalised to floats so
+that 12 and 12.0 share an entry. Every key is namespaced by the version of
+the loaded model, so a new model file never serves stale grades. When the
+in-process cache sees the model version change, it also drops the entries
+of the old version; a shared cache is never cleared, since other workers
+may still serve that version, and old entries age out with the TTL.
+
+Two backends are available: an in-process LRU with TTL, and a shared
+Redis backend (requires the optional `redis` package).
+"""
+
+import collections
+import hashlib
+import json
+import math
+import threading
+import time
+
+# Input fields stored with every prediction, in canonical order
+CACHE_KEY_FIELDS = (
+    'pnns_groups_1',
+    'pnns_groups_2',
+    'energy-kcal_100g',
+    'fat_100g',
+    'saturated-fat_100g',
+    'carbohydrates_100g',
+    'sugars_100g',
+    'fiber_100g',
+    'proteins_100g',
+    'salt_100g',
+    'fruits-vegetables-nuts-estimate-from-ingredients_100g',
+)
+
+
+def _normalize(value):
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        value = float(value)
+        return None if math.isnan(value) else value
+    return str(value)
+
+
+def cache_key(input_data):
+    """Canonical hash of the fields of one product that determine its prediction."""
+    canonical = json.dumps(
+        [_normalize(input_data.get(field)) for field in CACHE_KEY_FIELDS],
+        separators=(',', ':')
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class InProcessBackend:
+    """
+    Thread-safe LRU dictionary with a per-entry time to live.
+
+    Args:
+    - max_size (int): Maximum number of entries; the least recently used one is evicted first.
+    - ttl (float): Seconds an entry stays valid (0 disables expiry).
+    """
+
+    shared = False
+
+    def __init__(self, max_size=10000, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.evictions += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisBackend:
+    """
+    Shared cache in Redis. Entries expire with SETEX; size is bounded by the
+    server's maxmemory / allkeys-lru policy.
+
+    Args:
+    - url (str): Redis connection URL.
+    - ttl (int): Seconds an entry stays valid.
+    - prefix (str): Prefix of every key written by this cache.
+    """
+
+    # Shared by every worker: never cleared on a version change
+    shared = True
+
+    def __init__(self, url, ttl=3600, prefix='nutriscore:prediction:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.evictions = 0
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value):
+        if self.ttl:
+            self.client.setex(self.prefix + key, int(self.ttl), value)
+        else:
+            self.client.set(self.prefix + key, value)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + '*'))
+
+
+class PredictionCache:
+    """
+    Prediction cache with hit/miss counters and model-version invalidation.
+
+    Args:
+    - backend: InProcessBackend, RedisBackend or any object with get/set/clear.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.model_version = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _check_version(self, model_version):
+        if model_version != self.model_version:
+            with self._lock:
+                if model_version != self.model_version:
+                    # Keys are namespaced by version: only free the memory held by the old
+                    # version, and never on the first lookup of this process
+                    if self.model_version is not None and not getattr(self.backend, 'shared', False):
+                        self.backend.clear()
+                    self.model_version = model_version
+
+    def _key(self, input_data, model_version):
+        return f"{model_version}:{cache_key(input_data)}"
+
+    def get(self, input_data, model_version):
+        """Returns the cached grade for this product, or None."""
+        self._check_version(model_version)
+        grade = self.backend.get(self._key(input_data, model_version))
+        with self._lock:
+            if grade is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return grade
+
+    def set(self, input_data, model_version, grade):
+        self._check_version(model_version)
+        self.backend.set(self._key(input_data, model_version), str(grade))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "model_version": self.model_version,
+            "size": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.backend.evictions,
+        }
+
+
+def create_cache(backend_name, max_size=10000, ttl=3600, redis_url=None):
+    """Builds the PredictionCache selected by configuration, or None if disabled."""
+    if backend_name in (None, '', 'none'):
+        return None
+    if backend_name == 'memory':
+        return PredictionCache(InProcessBackend(max_size=max_size, ttl=ttl))
+    if backend_name == 'redis':
+        return PredictionCache(RedisBackend(redis_url, ttl=ttl))
+    raise ValueError(f"Unknown prediction cache backend '{backend_name}'.")
@@ -0,0 +1,309 @@
+# app/inference.py
+"""
+Pandas-free inference engine for the saved model pipeline.
+
+The pipeline trained in notebooks/model_pipeline_save.ipynb is a
+ColumnTransformer (StandardScaler on the nutrients, OneHotEncoder on the
+PNNS groups) followed by a RandomForest or LogisticRegression. Running it
+on a single product means building a DataFrame and going through sklearn's
+validation machinery, which costs far more than the model itself.
+
+CompiledPipeline reads the fitted parameters out of the pipeline once and
+keeps them as flat NumPy arrays, so a product given as a plain dict can be
+scored without touching pandas. Pipelines using steps it does not know
+about raise UnsupportedPipelineError and the caller keeps using
+Pipeline.predict.
+"""
+
+import math
+
+import numpy as np
+
+
+class UnsupportedPipelineError(Exception):
+    """Raised when a pipeline contains a step the compiler cannot translate."""
+
+
+def _flatten_steps(estimator):
+    """Returns the estimators of a possibly nested Pipeline, in order."""
+    if hasattr(estimator, 'steps'):
+        steps = []
+        for _, step in estimator.steps:
+            if step is not None and step != 'passthrough':
+                steps.extend(_flatten_steps(step))
+        return steps
+    return [estimator]
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+class _NumericBlock:
+    """Imputer fill values and scaler mean/scale for a group of numeric columns."""
+
+    def __init__(self, columns, steps):
+        self.columns = list(columns)
+        n = len(self.columns)
+        self.fill = np.full(n, np.nan)
+        self.mean = np.zeros(n)
+        self.scale = np.ones(n)
+        self.width = n
+
+        for step in steps:
+            kind = type(step).__name__
+            if kind == 'SimpleImputer':
+                if step.add_indicator:
+                    raise UnsupportedPipelineError("SimpleImputer(add_indicator=True) is not supported.")
+                self.fill = np.asarray(step.statistics_, dtype=np.float64)
+            elif kind == 'StandardScaler':
+                # mean_ is fitted even with with_mean=False, but transform does not subtract it
+                if step.with_mean and step.mean_ is not None:
+                    self.mean = np.asarray(step.mean_, dtype=np.float64)
+                if step.with_std and step.scale_ is not None:
+                    self.scale = np.asarray(step.scale_, dtype=np.float64)
+            else:
+                raise UnsupportedPipelineError(f"Numeric step {kind} is not supported.")
+
+    def transform(self, input_data, out, offset):
+        values = np.array([
+            np.nan if _is_missing(input_data.get(col)) else float(input_data.get(col))
+            for col in self.columns
+        ])
+        missing = np.isnan(values)
+        if missing.any():
+            values[missing] = self.fill[missing]
+            if np.isnan(values).any():
+                raise ValueError("Input contains NaN.")
+        values -= self.mean
+        values /= self.scale
+        out[offset:offset + self.width] = values
+
+
+class _CategoricalBlock:
+    """One-hot lookup tables mapping each category to its output position."""
+
+    def __init__(self, columns, steps):
+        self.columns = list(columns)
+        self.fill = [None] * len(self.columns)
+        self.lookups = None
+
+        for step in steps:
+            kind = type(step).__name__
+            if kind == 'SimpleImputer':
+                if step.add_indicator:
+                    raise UnsupportedPipelineError("SimpleImputer(add_indicator=True) is not supported.")
+                self.fill = list(step.statistics_)
+            elif kind == 'OneHotEncoder':
+                if step.drop_idx_ is not None or getattr(step, '_infrequent_enabled', False):
+                    raise UnsupportedPipelineError("OneHotEncoder with drop or infrequent categories is not supported.")
+                if step.handle_unknown == 'error':
+                    raise UnsupportedPipelineError("OneHotEncoder(handle_unknown='error') is not supported.")
+                self.lookups = []
+                self.nan_index = []
+                position = 0
+                for categories in step.categories_:
+                    lookup = {}
+                    nan_index = None
+                    for category in categories:
+                        if _is_missing(category):
+                            nan_index = position
+                        else:
+                            lookup[category] = position
+                        position += 1
+                    self.lookups.append(lookup)
+                    self.nan_index.append(nan_index)
+                self.width = position
+            else:
+                raise UnsupportedPipelineError(f"Categorical step {kind} is not supported.")
+
+        if self.lookups is None:
+            raise UnsupportedPipelineError("Categorical block without a OneHotEncoder is not supported.")
+
+    def transform(self, input_data, out, offset):
+        for i, col in enumerate(self.columns):
+            value = input_data.get(col)
+            if _is_missing(value):
+                value = self.fill[i]
+            if _is_missing(value):
+                position = self.nan_index[i]
+            else:
+                position = self.lookups[i].get(value)
+            # Unknown categories encode as all zeros (handle_unknown='ignore')
+            if position is not None:
+                out[offset + position] = 1.0
+
+
+def _compile_preprocessor(preprocessor):
+    if type(preprocessor).__name__ != 'ColumnTransformer':
+        raise UnsupportedPipelineError(f"Preprocessor {type(preprocessor).__name__} is not supported.")
+
+    blocks = []
+    for _, transformer, columns in preprocessor.transformers_:
+        if transformer == 'drop' or len(columns) == 0:
+            continue
+        if transformer == 'passthrough':
+            raise UnsupportedPipelineError("Passthrough columns are not supported.")
+        steps = _flatten_steps(transformer)
+        if any(type(step).__name__ == 'OneHotEncoder' for step in steps):
+            blocks.append(_CategoricalBlock(columns, steps))
+        else:
+            blocks.append(_NumericBlock(columns, steps))
+    return blocks
+
+
+class _ForestModel:
+    """Tree arrays of a fitted RandomForest/DecisionTree classifier."""
+
+    def __init__(self, estimator):
+        trees = estimator.estimators_ if hasattr(estimator, 'estimators_') else [estimator]
+        if getattr(estimator, 'n_outputs_', 1) != 1:
+            raise UnsupportedPipelineError("Multi-output trees are not supported.")
+        self.classes = estimator.classes_
+        self.trees = []
+        for tree in trees:
+            t = tree.tree_
+            value = t.value[:, 0, :].astype(np.float64)
+            normalizer = value.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            self.trees.append((
+                t.children_left, t.children_right, t.feature,
+                t.threshold, value / normalizer
+            ))
+
+    def predict(self, x):
+        # Trees compare features as float32, exactly like sklearn does
+        x = x.astype(np.float32)
+        proba = np.zeros(len(self.classes))
+        for left, right, feature, threshold, value in self.trees:
+            node = 0
+            while left[node] != -1:
+                if x[feature[node]] <= threshold[node]:
+                    node = left[node]
+                else:
+                    node = right[node]
+            proba += value[node]
+        proba /= len(self.trees)
+        return self.classes[np.argmax(proba)]
+
+
+class _LinearModel:
+    """Coefficients of a fitted LogisticRegression (or other linear classifier)."""
+
+    def __init__(self, estimator):
+        self.classes = estimator.classes_
+        self.coef = np.asarray(estimator.coef_, dtype=np.float64)
+        self.intercept = np.asarray(estimator.intercept_, dtype=np.float64)
+
+    def predict(self, x):
+        scores = self.coef @ x + self.intercept
+        if scores.shape[0] == 1:
+            return self.classes[int(scores[0] > 0)]
+        return self.classes[np.argmax(scores)]
+
+
+def _compile_model(estimator):
+    kind = type(estimator).__name__
+    if kind in ('RandomForestClassifier', 'ExtraTreesClassifier', 'DecisionTreeClassifier', 'ExtraTreeClassifier'):
+        return _ForestModel(estimator)
+    if kind in ('LogisticRegression', 'LinearSVC', 'RidgeClassifier', 'SGDClassifier'):
+        return _LinearModel(estimator)
+    raise UnsupportedPipelineError(f"Model {kind} is not supported.")
+
+
+class CompiledPipeline:
+    """
+    Flat NumPy version of a fitted preprocessing + model Pipeline.
+
+    Args:
+    - pipeline: Fitted sklearn Pipeline (ColumnTransformer followed by a classifier).
+    """
+
+    def __init__(self, pipeline):
+        steps = _flatten_steps(pipeline)
+        if len(steps) != 2:
+            raise UnsupportedPipelineError(
+                f"Expected a preprocessor and a model, got {len(steps)} steps."
+            )
+        self.blocks = _compile_preprocessor(steps[0])
+        self.width = sum(block.width for block in self.blocks)
+        self.model = _compile_model(steps[1])
+
+        n_features = getattr(steps[1], 'n_features_in_', self.width)
+        if n_features != self.width:
+            raise UnsupportedPipelineError(
+                f"Preprocessor produces {self.width} features but the model expects {n_features}."
+            )
+
+    def transform(self, input_data):
+        """Builds the model's feature vector for one product given as a dict."""
+        out = np.zeros(self.width)
+        offset = 0
+        for block in self.blocks:
+            block.transform(input_data, out, offset)
+            offset += block.width
+        return out
+
+    def predict_one(self, input_data):
+        """Predicts the raw class label for one product given as a dict."""
+        return self.model.predict(self.transform(input_data))
+
+    def predict(self, records):
+        """Predicts raw class labels for a list of dicts."""
+        return np.array([self.predict_one(record) for record in records])
+
+
+def check_parity(pipeline, compiled, df):
+    """
+    Compares CompiledPipeline predictions with Pipeline.predict row by row.
+
+    Args:
+    - pipeline: The fitted sklearn Pipeline.
+    - compiled (CompiledPipeline): Engine compiled from that pipeline.
+    - df (pd.DataFrame): Held-out rows containing the model's input columns.
+
+    Returns:
+    - list: Positions of the rows where the two predictions differ.
+    """
+    expected = pipeline.predict(df)
+    records = df.to_dict(orient='records')
+    return [
+        i for i, (record, label) in enumerate(zip(records, expected))
+        if compiled.predict_one(record) != label
+    ]
+
+
+def main():
+    """
+    Checks that the compiled engine reproduces Pipeline.predict on a held-out CSV.
+
+    Usage: python -m app.inference <model.joblib> <data.csv> [--sample N]
+    """
+    import argparse
+
+    import joblib
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description=main.__doc__.strip().splitlines()[0])
+    parser.add_argument('model_path')
+    parser.add_argument('data_path')
+    parser.add_argument('--sample', type=int, default=10000, help="Number of rows to check (default: 10000).")
+    args = parser.parse_args()
+
+    pipeline = joblib.load(args.model_path)
+    compiled = CompiledPipeline(pipeline)
+
+    df = pd.read_csv(args.data_path)
+    if args.sample and len(df) > args.sample:
+        df = df.sample(n=args.sample, random_state=42)
+    df = df[list(pipeline.feature_names_in_)] if hasattr(pipeline, 'feature_names_in_') else df
+
+    mismatches = check_parity(pipeline, compiled, df)
+    print(f"Checked {len(df)} rows: {len(mismatches)} mismatches.")
+    if mismatches:
+        print(f"First mismatching rows: {mismatches[:10]}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
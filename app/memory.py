@@ -0,0 +1,84 @@
+# app/memory.py
+"""
+Per-process memory report, used to check how much of the model is shared
+between worker processes.
+
+Reads /proc/<pid>/smaps_rollup (Linux) so no extra dependency is needed.
+PSS splits every shared page between the processes mapping it, so the sum
+of PSS over all workers is the real memory cost of the pool, while RSS
+counts shared pages once per worker.
+
+Usage: python -m app.memory <master_pid>
+"""
+
+import os
+import sys
+
+_FIELDS = {
+    'Rss': 'rss_kb',
+    'Pss': 'pss_kb',
+    'Shared_Clean': 'shared_clean_kb',
+    'Shared_Dirty': 'shared_dirty_kb',
+    'Private_Clean': 'private_clean_kb',
+    'Private_Dirty': 'private_dirty_kb',
+}
+
+
+def memory_report(pid='self'):
+    """
+    Returns the memory counters of one process.
+
+    Args:
+    - pid (int or str): Process id, or 'self' for the current process.
+
+    Returns:
+    - dict: pid, rss/pss and shared/private sizes in kB (empty counters if
+      /proc is not available).
+    """
+    report = {'pid': os.getpid() if pid == 'self' else int(pid)}
+    path = f"/proc/{pid}/smaps_rollup"
+    if not os.path.exists(path):
+        return report
+
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            key = parts[0].rstrip(':')
+            if key in _FIELDS:
+                report[_FIELDS[key]] = int(parts[1])
+    report['shared_kb'] = report.get('shared_clean_kb', 0) + report.get('shared_dirty_kb', 0)
+    report['private_kb'] = report.get('private_clean_kb', 0) + report.get('private_dirty_kb', 0)
+    return report
+
+
+def child_pids(pid):
+    """Lists the direct children of a process (e.g. the workers of a gunicorn master)."""
+    children = []
+    task_dir = f"/proc/{pid}/task"
+    for tid in os.listdir(task_dir):
+        with open(os.path.join(task_dir, tid, 'children')) as f:
+            children.extend(int(child) for child in f.read().split())
+    return sorted(children)
+
+
+def main():
+    """Prints the memory report of a master process and each of its workers."""
+    if len(sys.argv) != 2:
+        print("Usage: python -m app.memory <master_pid>")
+        raise SystemExit(2)
+
+    master = int(sys.argv[1])
+    reports = [memory_report(master)] + [memory_report(pid) for pid in child_pids(master)]
+
+    print(f"{'pid':>8} {'rss_kb':>10} {'pss_kb':>10} {'shared_kb':>10} {'private_kb':>10}")
+    for report in reports:
+        print(
+            f"{report['pid']:>8} {report.get('rss_kb', 0):>10} {report.get('pss_kb', 0):>10} "
+            f"{report.get('shared_kb', 0):>10} {report.get('private_kb', 0):>10}"
+        )
+    print(f"Total RSS: {sum(r.get('rss_kb', 0) for r in reports)} kB, "
+          f"total PSS: {sum(r.get('pss_kb', 0) for r in reports)} kB")
+
+
+if __name__ == "__main__":
+    main()
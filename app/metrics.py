@@ -0,0 +1,215 @@
+# app/metrics.py
+"""
+Hot-path instrumentation for the prediction routes.
+
+Stage timings (request parsing, DataFrame construction, each named step of
+the sklearn Pipeline, DB commit) are recorded as histograms and rendered
+in the Prometheus text format by the /metrics route. Metrics are kept per
+process; with several gunicorn workers each scrape reports the worker that
+served it.
+
+SlowRequestProfiler optionally runs a sample of requests under cProfile
+and keeps the profiles of the slowest ones on disk.
+"""
+
+import bisect
+import cProfile
+import heapq
+import io
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_app_context
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label value."""
+
+    def __init__(self, name, documentation, label, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, seconds):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, seconds)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_value, (counts, total, count) in sorted(self._series.items()):
+                label = f'{self.label}="{label_value}"'
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+                lines.append(f'{self.name}_sum{{{label}}} {total}')
+                lines.append(f'{self.name}_count{{{label}}} {count}')
+        return lines
+
+
+stage_duration = Histogram(
+    'nutriscore_stage_duration_seconds',
+    'Time spent in each stage of a prediction request.',
+    'stage'
+)
+pipeline_step_duration = Histogram(
+    'nutriscore_pipeline_step_duration_seconds',
+    'Time spent in each named step of the sklearn Pipeline.',
+    'step'
+)
+request_duration = Histogram(
+    'nutriscore_request_duration_seconds',
+    'End-to-end duration of prediction requests.',
+    'endpoint'
+)
+
+
+def _record_for_request(name, seconds):
+    # Per-request breakdown, used by the slow request profiler
+    if has_app_context():
+        timings = g.setdefault('stage_timings', {})
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage_timer(stage):
+    """Times the enclosed block as one stage of the current request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_duration.observe(stage, elapsed)
+        _record_for_request(stage, elapsed)
+
+
+def timed_pipeline_predict(pipeline, X):
+    """
+    Same as pipeline.predict(X), timing each named step of the Pipeline.
+    Estimators that are not Pipelines are timed as a single 'model' step.
+    """
+    if not hasattr(pipeline, 'steps'):
+        with stage_timer('predict'):
+            started = time.perf_counter()
+            predictions = pipeline.predict(X)
+            pipeline_step_duration.observe('model', time.perf_counter() - started)
+        return predictions
+
+    with stage_timer('predict'):
+        Xt = X
+        for name, step in pipeline.steps[:-1]:
+            if step is None or step == 'passthrough':
+                continue
+            started = time.perf_counter()
+            Xt = step.transform(Xt)
+            elapsed = time.perf_counter() - started
+            pipeline_step_duration.observe(name, elapsed)
+            _record_for_request(f"step:{name}", elapsed)
+
+        name, final = pipeline.steps[-1]
+        started = time.perf_counter()
+        predictions = final.predict(Xt)
+        elapsed = time.perf_counter() - started
+        pipeline_step_duration.observe(name, elapsed)
+        _record_for_request(f"step:{name}", elapsed)
+    return predictions
+
+
+def render_metrics(extra_lines=()):
+    """Renders every histogram (plus extra pre-formatted lines) in the Prometheus text format."""
+    lines = []
+    for histogram in (request_duration, stage_duration, pipeline_step_duration):
+        lines.extend(histogram.render())
+    lines.extend(extra_lines)
+    return "\n".join(lines) + "\n"
+
+
+def gauge_lines(name, documentation, value, kind='gauge'):
+    return [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}", f"{name} {value}"]
+
+
+class SlowRequestProfiler:
+    """
+    Profiles a random sample of requests and keeps the slowest ones.
+
+    Args:
+    - sample_rate (float): Fraction of requests to profile (0 disables).
+    - keep (int): Number of slowest profiles kept.
+    - output_dir (str): Where the .prof files of the slowest requests are written.
+    """
+
+    def __init__(self, sample_rate=0.0, keep=10, output_dir='profiles'):
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self.output_dir = output_dir
+        self._slowest = []  # min-heap of (duration, sequence, summary)
+        self._sequence = 0
+        self._lock = threading.Lock()
+        # Only one cProfile session can be active at a time on recent Pythons
+        self._profiling = threading.Lock()
+
+    @contextmanager
+    def profile(self, endpoint):
+        """Profiles the enclosed block if this request is sampled."""
+        if not self.sample_rate or random.random() >= self.sample_rate \
+                or not self._profiling.acquire(blocking=False):
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+            yield
+        finally:
+            profiler.disable()
+            self._profiling.release()
+            duration = time.perf_counter() - started
+            timings = dict(g.get('stage_timings', {})) if has_app_context() else {}
+            self._record(endpoint, duration, profiler, timings)
+
+    def _record(self, endpoint, duration, profiler, timings):
+        with self._lock:
+            if len(self._slowest) >= self.keep and duration <= self._slowest[0][0]:
+                return
+            self._sequence += 1
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, f"request_{self._sequence}_{int(duration * 1000)}ms.prof")
+            profiler.dump_stats(path)
+
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(15)
+            summary = {
+                "endpoint": endpoint,
+                "duration_ms": duration * 1000.0,
+                "stages_ms": {stage: seconds * 1000.0 for stage, seconds in timings.items()},
+                "profile_path": path,
+                "top_functions": stream.getvalue(),
+            }
+            heapq.heappush(self._slowest, (duration, self._sequence, summary))
+            if len(self._slowest) > self.keep:
+                _, _, dropped = heapq.heappop(self._slowest)
+                if os.path.exists(dropped['profile_path']):
+                    os.remove(dropped['profile_path'])
+
+    def slowest(self):
+        with self._lock:
+            return [summary for _, _, summary in sorted(self._slowest, reverse=True)]
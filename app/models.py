@@ -1,3 +1,4 @@
+from config import Config
 from . import db
 
 class Prediction(db.Model):
@@ -16,6 +17,19 @@ class Prediction(db.Model):
     fruits_vegetables_nuts_estimate = db.Column(db.Float)
     prediction = db.Column(db.String(1))
 
-def load_model_pipeline():
+MODEL_PIPELINE_PATH = Config.MODEL_PATH
+
+def load_model_pipeline(path=MODEL_PIPELINE_PATH, mmap_mode=None):
+    """
+    Loads a saved pipeline. With mmap_mode='r', NumPy arrays stored
+    uncompressed in the file are memory-mapped read-only instead of copied,
+    so every worker mapping the same file shares their pages.
+    """
     import joblib
-    return joblib.load("trained_models/best_model_pipeline.joblib")
+    return joblib.load(path, mmap_mode=mmap_mode)
+
+def model_fingerprint(path=MODEL_PIPELINE_PATH):
+    """Identifies the model file on disk by its size and modification time."""
+    import os
+    stat = os.stat(path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
@@ -0,0 +1,187 @@
+# app/persistence.py
+"""
+Write-behind persistence for Prediction rows.
+
+With write-behind enabled, /predict puts the row on a bounded in-process
+queue and responds without waiting for a commit. A background thread
+bulk-inserts queued rows into the predictions table (one executemany per
+flush) when batch_size rows are waiting or flush_interval seconds have
+passed, and drains the queue on shutdown.
+
+Ids are reserved ahead of time from the table's Postgres sequence, in
+blocks, so the response can still carry the row id. On other databases
+the id is left to the database and the response id is null.
+"""
+
+import atexit
+import collections
+import logging
+import os
+import queue
+import threading
+import time
+
+from sqlalchemy import text
+
+from . import db
+from .models import Prediction
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteBehindQueueFull(Exception):
+    """Raised when the write-behind queue stays full longer than the enqueue timeout."""
+
+
+class PredictionWriter:
+    """
+    Background bulk writer for the predictions table.
+
+    Args:
+    - max_queue (int): Maximum number of rows waiting to be written.
+    - batch_size (int): Flush as soon as this many rows are waiting.
+    - flush_interval (float): Maximum seconds a row waits before being flushed.
+    - id_block_size (int): Number of ids reserved from the sequence at once.
+    - enqueue_timeout (float): Seconds submit() waits for room in a full queue.
+    """
+
+    def __init__(self, app=None, max_queue=10000, batch_size=500, flush_interval=0.5,
+                 id_block_size=100, enqueue_timeout=1.0):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.id_block_size = id_block_size
+        self.enqueue_timeout = enqueue_timeout
+
+        self._reset()
+        self._thread = None
+        self._sequence = None
+        self.enqueued = 0
+        self.flushed = 0
+        self.failed = 0
+
+        if app is not None:
+            self.init_app(app)
+
+    def _reset(self):
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._ids = collections.deque()
+        self._id_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name="prediction-writer", daemon=True)
+        self._thread.start()
+
+    def _after_fork(self):
+        # Ids reserved by the parent must not be handed out by every worker
+        self._reset()
+        self._start()
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['prediction_writer'] = self
+        self._start()
+        atexit.register(self.close)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def reserve_id(self):
+        """Returns an id reserved from the predictions sequence, or None if the database has none."""
+        with self._id_lock:
+            if not self._ids:
+                self._ids.extend(self._fetch_id_block())
+            return self._ids.popleft() if self._ids else None
+
+    def _fetch_id_block(self):
+        with self.app.app_context():
+            if db.engine.dialect.name != 'postgresql':
+                return []
+            if self._sequence is None:
+                self._sequence = db.session.execute(
+                    text("SELECT pg_get_serial_sequence(:table, 'id')"),
+                    {"table": Prediction.__tablename__}
+                ).scalar()
+            ids = db.session.execute(
+                text("SELECT nextval(:sequence) FROM generate_series(1, :n)"),
+                {"sequence": self._sequence, "n": self.id_block_size}
+            ).scalars().all()
+            db.session.commit()
+            return ids
+
+    def submit(self, row):
+        """Queues one row (a dict of predictions table columns) for writing."""
+        if row.get('id') is None:
+            row = {key: value for key, value in row.items() if key != 'id'}
+        try:
+            self._queue.put(row, timeout=self.enqueue_timeout)
+        except queue.Full:
+            raise WriteBehindQueueFull(
+                f"Prediction write queue is full ({self.max_queue} rows waiting)."
+            )
+        with self._stats_lock:
+            self.enqueued += 1
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        rows = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(rows) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                row = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if row is _STOP:
+                return rows, True
+            rows.append(row)
+        return rows, False
+
+    def _flush(self, rows):
+        # Rows with and without a reserved id are inserted separately so
+        # each executemany has a consistent set of columns
+        groups = collections.defaultdict(list)
+        for row in rows:
+            groups['id' in row].append(row)
+
+        with self.app.app_context():
+            for group in groups.values():
+                try:
+                    db.session.execute(Prediction.__table__.insert(), group)
+                    db.session.commit()
+                    with self._stats_lock:
+                        self.flushed += len(group)
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Failed to write %d predictions", len(group))
+                    with self._stats_lock:
+                        self.failed += len(group)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            rows, stopping = self._collect()
+            if rows:
+                self._flush(rows)
+
+    def close(self, timeout=30):
+        """Flushes every queued row and stops the background thread."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "queued": self._queue.qsize(),
+                "enqueued": self.enqueued,
+                "flushed": self.flushed,
+                "failed": self.failed,
+            }
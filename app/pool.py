@@ -0,0 +1,115 @@
+# app/pool.py
+"""
+Instrumented SQLAlchemy connection pool.
+
+InstrumentedQueuePool is a QueuePool that records how long each checkout
+waited for a connection, so the pool can be sized against the number of
+workers and threads under load. When no connection frees up within
+pool_timeout it raises PoolExhaustedError, which the routes turn into a
+503 instead of a generic 500.
+
+Only the public Pool.connect() is overridden, so the wait includes opening
+a new connection (and the pre-ping) when the pool has none idle.
+"""
+
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+
+class PoolExhaustedError(exc.TimeoutError):
+    """Raised when no pooled connection became available within pool_timeout."""
+
+
+class PoolStats:
+    """Thread-safe checkout counters and wait-time histogram."""
+
+    wait_buckets_ms = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.wait_histogram = {bucket: 0 for bucket in self.wait_buckets_ms}
+        self.wait_histogram['+Inf'] = 0
+
+    def record_checkout(self, wait_ms):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total_ms += wait_ms
+            self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+            bucket = next((b for b in self.wait_buckets_ms if wait_ms <= b), '+Inf')
+            self.wait_histogram[bucket] += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "mean_wait_ms": self.wait_total_ms / self.checkouts if self.checkouts else 0.0,
+                "max_wait_ms": self.wait_max_ms,
+                "wait_histogram_ms": {str(k): v for k, v in self.wait_histogram.items()},
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool recording checkout wait times and failing fast when exhausted."""
+
+    def __init__(self, *args, max_overflow=10, timeout=30.0, **kwargs):
+        super().__init__(*args, max_overflow=max_overflow, timeout=timeout, **kwargs)
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.stats = PoolStats()
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError as e:
+            self.stats.record_timeout()
+            raise PoolExhaustedError(
+                f"Database connection pool exhausted: {self.size()} connections and "
+                f"{self.max_overflow} overflow all in use after waiting {self.timeout}s. "
+                "Increase DB_POOL_SIZE/DB_MAX_OVERFLOW or reduce workers/threads."
+            ) from e
+        self.stats.record_checkout((time.perf_counter() - started) * 1000.0)
+        return connection
+
+    def report(self):
+        report = self.stats.as_dict()
+        report.update({
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "overflow": self.overflow(),
+            "checked_in": self.checkedin(),
+        })
+        return report
+
+
+def engine_options(config):
+    """Builds SQLALCHEMY_ENGINE_OPTIONS from the DB_* settings of Config."""
+    options = {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    uri = config.get('SQLALCHEMY_DATABASE_URI') or ''
+    if uri.startswith('postgresql') and config['DB_STATEMENT_TIMEOUT_MS']:
+        options['connect_args'] = {
+            'options': f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"
+        }
+    elif uri.startswith('sqlite'):
+        # Pooled SQLite connections are shared between request threads
+        options['connect_args'] = {'check_same_thread': False}
+    return options
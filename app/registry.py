@@ -0,0 +1,218 @@
+# app/registry.py
+"""
+Versioned registry of the model pipelines saved in trained_models/.
+
+Every `<name>.joblib` file in the model directory is a version named
+`<name>`. The active version is held as one immutable LoadedModel and
+replaced by a single reference assignment, so a request that already
+picked up a model keeps using it while a new one is swapped in.
+
+Loading is lazy (first request), in the background (at startup, without
+blocking it) or eager. A watcher thread can reload the active version
+when its file changes on disk.
+
+A version activated through the admin endpoint only swaps the model of the
+worker process that handled the request. It is also written to the
+`active_version` pointer file in the model directory, which the other
+workers load at startup and pick up through their watcher, so every worker
+converges on it within one watch interval (the watcher must be enabled when
+the server runs several workers).
+
+Eager loading combined with a server that imports the app before forking
+its workers (gunicorn --preload) shares the model between workers through
+copy-on-write pages; the loaded objects are moved out of the garbage
+collector's reach with gc.freeze() so collections in the workers do not
+write to those pages. mmap_mode='r' memory-maps the arrays stored in an
+uncompressed joblib file instead.
+"""
+
+import gc
+import logging
+import os
+import threading
+
+import pandas as pd
+
+from .inference import CompiledPipeline, UnsupportedPipelineError
+from .metrics import stage_timer, timed_pipeline_predict
+from .models import load_model_pipeline, model_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Pointer file, in the model directory, naming the version activated by an admin
+ACTIVE_VERSION_FILE = 'active_version'
+
+
+class LoadedModel:
+    """A loaded pipeline together with its version and on-disk fingerprint."""
+
+    def __init__(self, version, path, pipeline, fingerprint, compiled=None):
+        self.version = version
+        self.path = path
+        self.pipeline = pipeline
+        self.fingerprint = fingerprint
+        self.compiled = compiled
+
+    @property
+    def cache_namespace(self):
+        """Changes whenever a different model or a rewritten file is loaded."""
+        return f"{self.version}@{self.fingerprint}"
+
+    def predict_records(self, records):
+        """Raw outputs for a list of product dicts, with the compiled engine when it was built."""
+        if self.compiled is not None:
+            with stage_timer('predict'):
+                return self.compiled.predict(records)
+        with stage_timer('dataframe'):
+            df = pd.DataFrame(records)
+        return timed_pipeline_predict(self.pipeline, df)
+
+
+class ModelRegistry:
+    """
+    Loads, versions and hot-swaps model pipelines.
+
+    Args:
+    - model_path (str): Path of the default model (Config.MODEL_PATH); its
+      directory is scanned for other versions.
+    - load_mode (str): 'lazy', 'background' or 'eager'.
+    - compile (bool): Also build the CompiledPipeline engine for each model.
+    - watch_interval (float): Seconds between checks of the active model file (0 disables).
+    - mmap_mode (str): Passed to joblib.load (e.g. 'r'), None to load in memory.
+    """
+
+    def __init__(self, model_path, load_mode='lazy', compile=False, watch_interval=0, mmap_mode=None):
+        self.model_dir = os.path.dirname(model_path) or '.'
+        self.default_version = os.path.splitext(os.path.basename(model_path))[0]
+        self.compile = compile
+        self.watch_interval = watch_interval
+        self.mmap_mode = mmap_mode
+
+        self._current = None
+        self._load_lock = threading.Lock()
+        self._stop = threading.Event()
+
+        if load_mode == 'eager':
+            self.activate(self.initial_version())
+            gc.freeze()
+        elif load_mode == 'background':
+            threading.Thread(target=self._load_default, name="model-loader", daemon=True).start()
+
+        self._start_watcher()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start_watcher(self):
+        if self.watch_interval:
+            threading.Thread(target=self._watch, name="model-watcher", daemon=True).start()
+
+    def _after_fork(self):
+        # The parent may have forked while holding the lock or running the watcher
+        self._load_lock = threading.Lock()
+        self._start_watcher()
+
+    def path_for(self, version):
+        return os.path.join(self.model_dir, f"{version}.joblib")
+
+    @property
+    def pointer_path(self):
+        return os.path.join(self.model_dir, ACTIVE_VERSION_FILE)
+
+    def published_version(self):
+        """Version named by the pointer file, or None if no version was published."""
+        try:
+            with open(self.pointer_path) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def initial_version(self):
+        """Version loaded at startup: the published one, else the default one."""
+        return self.published_version() or self.default_version
+
+    def _publish(self, version):
+        # Written to a temporary file and renamed, so other workers never read a partial name
+        tmp_path = f"{self.pointer_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(version + '\n')
+        os.replace(tmp_path, self.pointer_path)
+
+    def versions(self):
+        """Lists the model versions available in the model directory."""
+        if not os.path.isdir(self.model_dir):
+            return []
+        return sorted(
+            os.path.splitext(name)[0]
+            for name in os.listdir(self.model_dir)
+            if name.endswith('.joblib')
+        )
+
+    def _build(self, version):
+        available = self.versions()
+        if version not in available:
+            raise ValueError(f"Unknown model version '{version}'. Available: {available}")
+        path = self.path_for(version)
+
+        fingerprint = model_fingerprint(path)
+        pipeline = load_model_pipeline(path, mmap_mode=self.mmap_mode)
+        compiled = None
+        if self.compile:
+            try:
+                compiled = CompiledPipeline(pipeline)
+            except UnsupportedPipelineError as e:
+                logger.warning("Model %s: falling back to Pipeline.predict: %s", version, e)
+        return LoadedModel(version, path, pipeline, fingerprint, compiled)
+
+    def activate(self, version, publish=False):
+        """
+        Loads a version and atomically makes it the active model.
+
+        Args:
+        - version (str): Version to activate.
+        - publish (bool): Also write it to the pointer file, so the other workers switch to it.
+        """
+        with self._load_lock:
+            loaded = self._build(version)
+            if publish:
+                self._publish(version)
+            self._current = loaded
+        logger.info("Activated model %s (%s)", loaded.version, loaded.fingerprint)
+        return loaded
+
+    def _load_default(self):
+        version = self.initial_version()
+        try:
+            self.activate(version)
+        except Exception:
+            # The first request will retry the load and report the error
+            logger.exception("Failed to load model %s", version)
+
+    def current(self):
+        """Returns the active LoadedModel, loading the default version if needed."""
+        current = self._current
+        if current is not None:
+            return current
+        # Waits for a background load in progress, or loads the model itself
+        with self._load_lock:
+            if self._current is None:
+                self._current = self._build(self.initial_version())
+            return self._current
+
+    def _watch(self):
+        while not self._stop.wait(self.watch_interval):
+            current = self._current
+            if current is None:
+                continue
+            try:
+                published = self.published_version()
+                if published is not None and published != current.version:
+                    logger.info("Model %s was published by another worker, switching to it", published)
+                    self.activate(published)
+                elif model_fingerprint(current.path) != current.fingerprint:
+                    logger.info("Model file %s changed, reloading", current.path)
+                    self.activate(current.version)
+            except Exception:
+                logger.exception("Failed to reload model %s; keeping the loaded one", current.version)
+
+    def stop(self):
+        self._stop.set()
@@ -1,13 +1,182 @@
 # app/routes.py
 
-from flask import Blueprint, render_template, jsonify, request
+import json
+import logging
+import time
+
+from flask import Blueprint, Response, render_template, jsonify, request, current_app
 import pandas as pd
-from .models import db, Prediction, load_model_pipeline
+from config import Config
+from .models import db, Prediction
+from .registry import ModelRegistry
+from .batching import PredictionCoalescer
+from .persistence import WriteBehindQueueFull
+from .cache import create_cache
+from .memory import memory_report
+from .pool import PoolExhaustedError
+from .metrics import (
+    SlowRequestProfiler, gauge_lines, render_metrics, request_duration,
+    stage_timer, timed_pipeline_predict
+)
 
 api = Blueprint('api', __name__)
+logger = logging.getLogger(__name__)
+
+# Registry of the saved model pipelines; the active one is loaded lazily,
+# in the background or eagerly depending on MODEL_LOAD_MODE
+model_registry = ModelRegistry(
+    Config.MODEL_PATH,
+    load_mode=Config.MODEL_LOAD_MODE,
+    compile=Config.INFERENCE_ENGINE == 'compiled',
+    watch_interval=Config.MODEL_WATCH_INTERVAL,
+    mmap_mode=Config.MODEL_MMAP_MODE
+)
+
+# Optionally coalesce concurrent single-row predictions into batched calls
+coalescer = None
+if Config.PREDICT_COALESCE_ENABLED:
+    coalescer = PredictionCoalescer(
+        window_ms=Config.PREDICT_COALESCE_WINDOW_MS,
+        max_rows=Config.PREDICT_COALESCE_MAX_ROWS
+    )
+
+# Optional cache of grades for products that were already scored
+prediction_cache = create_cache(
+    Config.PREDICTION_CACHE,
+    max_size=Config.PREDICTION_CACHE_SIZE,
+    ttl=Config.PREDICTION_CACHE_TTL,
+    redis_url=Config.PREDICTION_CACHE_REDIS_URL
+)
+
+# Optional profiling of a sample of requests, keeping the slowest ones
+profiler = SlowRequestProfiler(
+    sample_rate=Config.PROFILE_SAMPLE_RATE,
+    keep=Config.PROFILE_KEEP,
+    output_dir=Config.PROFILE_DIR
+)
+
+prediction_mapping = {
+    1: 'A', 2: 'B', 3: 'C', 4: 'D', 5: 'E',
+    'a': 'A', 'b': 'B', 'c': 'C', 'd': 'D', 'e': 'E'
+}
+
+
+def to_grade(prediction):
+    """Maps a raw model output (class index or lowercase letter) to a NutriScore grade."""
+    return prediction_mapping.get(prediction, prediction)
+
+
+def prediction_row(input_data, prediction_grade):
+    """Maps one scored product to the columns of the predictions table."""
+    return dict(
+        pnns_groups_1=input_data.get('pnns_groups_1'),
+        pnns_groups_2=input_data.get('pnns_groups_2'),
+        energy_kcal_100g=input_data.get('energy-kcal_100g'),
+        fat_100g=input_data.get('fat_100g'),
+        saturated_fat_100g=input_data.get('saturated-fat_100g'),
+        carbohydrates_100g=input_data.get('carbohydrates_100g'),
+        sugars_100g=input_data.get('sugars_100g'),
+        fiber_100g=input_data.get('fiber_100g'),
+        proteins_100g=input_data.get('proteins_100g'),
+        salt_100g=input_data.get('salt_100g'),
+        fruits_vegetables_nuts_estimate=input_data.get('fruits-vegetables-nuts-estimate-from-ingredients_100g'),
+        prediction=prediction_grade
+    )
+
+
+def build_prediction(input_data, prediction_grade):
+    """Builds the Prediction row stored for one scored product."""
+    return Prediction(**prediction_row(input_data, prediction_grade))
+
+
+def predict_one(model, input_data):
+    """Returns the raw output of the given LoadedModel for one product using the configured engine."""
+    if coalescer is not None:
+        # Includes the wait for the batch; the batch itself is timed by predict_records
+        with stage_timer('coalesced_predict'):
+            return coalescer.predict(input_data, predict_fn=model.predict_records)
+    if model.compiled is not None:
+        with stage_timer('predict'):
+            return model.compiled.predict_one(input_data)
+    with stage_timer('dataframe'):
+        df = pd.DataFrame([input_data])
+    return timed_pipeline_predict(model.pipeline, df)[0]
+
+
+def parse_batch_payload():
+    """
+    Reads the products of a batch request, either as a JSON array or as
+    NDJSON (one JSON object per line, Content-Type application/x-ndjson).
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/jsonlines'):
+        lines = request.get_data(as_text=True).splitlines()
+        return [json.loads(line) for line in lines if line.strip()]
+
+    payload = request.get_json()
+    if not isinstance(payload, list):
+        raise ValueError("Expected a JSON array of products.")
+    return payload
+
+
+def score_and_store(input_data):
+    """
+    Predicts the grade of one product and saves it, as /predict does.
+    Needs an application context; used by the Flask route and by the ASGI app.
+
+    Returns:
+    - tuple: (response body dict, HTTP status)
+    """
+    try:
+        model = model_registry.current()
+
+        prediction_grade = None
+        if prediction_cache is not None:
+            prediction_grade = prediction_cache.get(input_data, model.cache_namespace)
+        if prediction_grade is None:
+            prediction = predict_one(model, input_data)
+            prediction_grade = to_grade(prediction)
+            if prediction_cache is not None:
+                prediction_cache.set(input_data, model.cache_namespace, prediction_grade)
+
+        # Queue the prediction for the background writer if write-behind is enabled
+        writer = current_app.extensions.get('prediction_writer')
+        if writer is not None:
+            row = prediction_row(input_data, prediction_grade)
+            with stage_timer('db_enqueue'):
+                row['id'] = writer.reserve_id()
+                writer.submit(row)
+            return {"prediction": prediction_grade, "id": row['id'], "model_version": model.version}, 200
+
+        # Save prediction to the database
+        new_prediction = build_prediction(input_data, prediction_grade)
+        with stage_timer('db_commit'):
+            db.session.add(new_prediction)
+            db.session.commit()
+
+        return {"prediction": prediction_grade, "id": new_prediction.id, "model_version": model.version}, 200
+
+    except (WriteBehindQueueFull, PoolExhaustedError) as e:
+        db.session.rollback()
+        return {"error": str(e)}, 503
+    except Exception as e:
+        db.session.rollback()
+        return {"error": str(e)}, 500
+
+
+def timed_score_and_store(input_data, started):
+    """
+    score_and_store under the slow request profiler, recording the duration of the
+    /predict request that started at `started` (time.perf_counter()). Used by the
+    Flask route and by the ASGI app, so both report the same /metrics.
+
+    Returns:
+    - tuple: (response body dict, HTTP status)
+    """
+    with profiler.profile('/predict'):
+        body, status = score_and_store(input_data)
+    request_duration.observe('/predict', time.perf_counter() - started)
+    return body, status
 
-# Load the saved model pipeline
-model_pipeline = load_model_pipeline()
 
 @api.route("/", methods=["GET"])
 def home():
@@ -15,36 +184,147 @@ def home():
 
 @api.route("/predict", methods=["POST"])
 def predict():
+    started = time.perf_counter()
     try:
-        input_data = request.json
-        df = pd.DataFrame([input_data])
-        prediction = model_pipeline.predict(df)[0]
+        with stage_timer('parse'):
+            input_data = request.json
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    body, status = timed_score_and_store(input_data, started)
+    return jsonify(body), status
 
-        prediction_mapping = {
-            1: 'A', 2: 'B', 3: 'C', 4: 'D', 5: 'E', 
-            'a': 'A', 'b': 'B', 'c': 'C', 'd': 'D', 'e': 'E'
-        }
-        prediction_grade = prediction_mapping.get(prediction, prediction)
+@api.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    started = time.perf_counter()
+    try:
+        with stage_timer('parse'):
+            products = parse_batch_payload()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        # Save prediction to the database
-        new_prediction = Prediction(
-            pnns_groups_1=input_data.get('pnns_groups_1'),
-            pnns_groups_2=input_data.get('pnns_groups_2'),
-            energy_kcal_100g=input_data.get('energy-kcal_100g'),
-            fat_100g=input_data.get('fat_100g'),
-            saturated_fat_100g=input_data.get('saturated-fat_100g'),
-            carbohydrates_100g=input_data.get('carbohydrates_100g'),
-            sugars_100g=input_data.get('sugars_100g'),
-            fiber_100g=input_data.get('fiber_100g'),
-            proteins_100g=input_data.get('proteins_100g'),
-            salt_100g=input_data.get('salt_100g'),
-            fruits_vegetables_nuts_estimate=input_data.get('fruits-vegetables-nuts-estimate-from-ingredients_100g'),
-            prediction=prediction_grade
-        )
-        db.session.add(new_prediction)
-        db.session.commit()
-
-        return jsonify({"prediction": prediction_grade, "id": new_prediction.id}), 200
+    if not products:
+        return jsonify({"error": "Batch is empty."}), 400
+    if not all(isinstance(product, dict) for product in products):
+        return jsonify({"error": "Every batch item must be a JSON object."}), 400
+
+    max_size = current_app.config['PREDICT_BATCH_MAX_SIZE']
+    if len(products) > max_size:
+        return jsonify({"error": f"Batch of {len(products)} products exceeds the limit of {max_size}."}), 413
+
+    try:
+        model = model_registry.current()
+        grades = [None] * len(products)
+        if prediction_cache is not None:
+            grades = [prediction_cache.get(product, model.cache_namespace) for product in products]
+        missing = [i for i, grade in enumerate(grades) if grade is None]
 
+        # Score the uncached products with a single vectorized predict call
+        if missing:
+            with stage_timer('dataframe'):
+                df = pd.DataFrame([products[i] for i in missing])
+            predictions = timed_pipeline_predict(model.pipeline, df)
+            for i, prediction in zip(missing, predictions):
+                grades[i] = to_grade(prediction)
+                if prediction_cache is not None:
+                    prediction_cache.set(products[i], model.cache_namespace, grades[i])
+
+        # Save all predictions in one flush and one commit
+        new_predictions = [build_prediction(product, grade) for product, grade in zip(products, grades)]
+        with stage_timer('db_commit'):
+            db.session.add_all(new_predictions)
+            db.session.commit()
+
+        request_duration.observe('/predict/batch', time.perf_counter() - started)
+        return jsonify({
+            "predictions": [
+                {"prediction": grade, "id": row.id}
+                for grade, row in zip(grades, new_predictions)
+            ],
+            "model_version": model.version
+        }), 200
+
+    except PoolExhaustedError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
+        db.session.rollback()
         return jsonify({"error": str(e)}), 500
+
+@api.route("/predict/stats", methods=["GET"])
+def predict_stats():
+    writer = current_app.extensions.get('prediction_writer')
+    return jsonify({
+        "coalescer": coalescer.stats.as_dict() if coalescer is not None else None,
+        "writer": writer.stats() if writer is not None else None,
+        "cache": prediction_cache.stats() if prediction_cache is not None else None,
+        "db_pool": db.engine.pool.report() if hasattr(db.engine.pool, 'report') else None
+    }), 200
+
+def admin_authorized():
+    """Admin endpoints require the X-Admin-Token header to match ADMIN_TOKEN."""
+    token = current_app.config.get('ADMIN_TOKEN')
+    return bool(token) and request.headers.get('X-Admin-Token') == token
+
+@api.route("/admin/model", methods=["GET"])
+def admin_model():
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    model = model_registry.current()
+    return jsonify({
+        "active": model.version,
+        "fingerprint": model.fingerprint,
+        "available": model_registry.versions()
+    }), 200
+
+@api.route("/admin/model", methods=["POST"])
+def admin_activate_model():
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    version = (request.get_json(silent=True) or {}).get('version')
+    if not version:
+        return jsonify({"error": "Missing 'version'."}), 400
+    # Without the watcher, the other workers would keep serving their current model
+    if Config.SERVER_WORKERS > 1 and not model_registry.watch_interval:
+        return jsonify({
+            "error": "Activating a version with several workers needs MODEL_WATCH_INTERVAL > 0."
+        }), 409
+    try:
+        model = model_registry.activate(version, publish=True)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"active": model.version, "fingerprint": model.fingerprint}), 200
+
+@api.route("/admin/memory", methods=["GET"])
+def admin_memory():
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    report = memory_report()
+    report['model_version'] = model_registry.current().version
+    report['model_mmap_mode'] = model_registry.mmap_mode
+    return jsonify(report), 200
+
+@api.route("/metrics", methods=["GET"])
+def metrics():
+    extra = []
+    if prediction_cache is not None:
+        stats = prediction_cache.stats()
+        extra += gauge_lines('nutriscore_cache_hits_total', 'Prediction cache hits.', stats['hits'], 'counter')
+        extra += gauge_lines('nutriscore_cache_misses_total', 'Prediction cache misses.', stats['misses'], 'counter')
+    if coalescer is not None:
+        stats = coalescer.stats.as_dict()
+        extra += gauge_lines('nutriscore_coalescer_mean_batch_size', 'Mean coalesced batch size.', stats['mean_batch_size'])
+        extra += gauge_lines('nutriscore_coalescer_mean_queue_delay_ms', 'Mean coalescer queueing delay.', stats['mean_queue_delay_ms'])
+    pool = db.engine.pool
+    if hasattr(pool, 'report'):
+        stats = pool.report()
+        extra += gauge_lines('nutriscore_db_pool_checked_out', 'Connections currently checked out.', stats['checked_out'])
+        extra += gauge_lines('nutriscore_db_pool_timeouts_total', 'Pool checkouts that timed out.', stats['timeouts'], 'counter')
+    return Response(render_metrics(extra), mimetype='text/plain; version=0.0.4')
+
+@api.route("/admin/profiles", methods=["GET"])
+def admin_profiles():
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify({"sample_rate": profiler.sample_rate, "slowest": profiler.slowest()}), 200
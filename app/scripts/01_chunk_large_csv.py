@@ -2,17 +2,47 @@
 
 import pandas as pd
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def chunk_large_csv(input_file, output_folder, chunk_size=50000, sep='\t'):
+from byte_ranges import copy_range, line_aligned_ranges, parse_range, read_header
+from compressed_io import COMPRESSION_SUFFIXES, compression_of, find_input, open_input
+from memory_budget import MB, ChunkSizeTuner, current_rss, format_mb, peak_rss, reset_peak_rss, sample_bytes_per_row
+from pipeline_io import PARQUET, write_table
+from pipeline_manifest import MANIFEST_NAME, Manifest
+from pipeline_schema import raw_read_options
+
+STAGE = '01_chunk_large_csv'
+
+def chunk_file_name(chunk_key, output_format, compression=None):
+    """File name of a chunk; compressed CSV chunks get a .gz / .zst suffix (Parquet compresses internally)."""
+    suffix = COMPRESSION_SUFFIXES[compression] if output_format == 'csv' and compression else ''
+    return f"{chunk_key}.{output_format}{suffix}"
+
+def chunk_large_csv(input_file, output_folder, chunk_size=50000, sep='\t', output_format=PARQUET, use_schema=True,
+                    extra_columns=(), manifest=None, memory_budget_mb=None, compression=None):
     """
-    Reads a large CSV file in chunks and saves each chunk into separate CSV files.
+    Reads a large CSV file in chunks and saves each chunk into separate Parquet (or CSV) files.
+    A .gz or .zst input is decompressed on the fly in a separate process or thread.
     Skips any bad lines that have inconsistent field counts using `on_bad_lines='skip'`.
+    Only the columns declared in pipeline_schema are read, with their compact dtypes.
+    With a memory budget, the chunk size is picked from a sample of the file and adapted
+    after every chunk so that the peak RSS of the process stays under the budget.
+    The rows/s, MB/s and peak RSS of every chunk are reported.
     
     Parameters:
-    - input_file (str): Path to the large CSV file.
-    - output_folder (str): Folder where the chunked CSV files will be saved.
-    - chunk_size (int): Number of rows per chunk (default is 50,000 rows).
+    - input_file (str): Path to the large CSV file (.csv, .csv.gz or .csv.zst).
+    - output_folder (str): Folder where the chunk files will be saved.
+    - chunk_size (int): Number of rows per chunk (default is 50,000 rows), when no memory budget is given.
     - sep (str): Separator used in the CSV files (default is tab '\t').
+    - output_format (str): 'parquet' (default) or 'csv' for the chunk files.
+    - use_schema (bool): Read only the schema columns and dtypes (default is True); False keeps every column.
+    - extra_columns (list): Columns read in addition to the schema ones (e.g. ['code', 'last_modified_t']).
+    - manifest (Manifest): When given, the run is skipped if the input and parameters did not change,
+      and an interrupted run resumes after the last saved chunk.
+    - memory_budget_mb (float): Target peak RSS in MB; replaces the fixed chunk_size (default is None).
+    - compression (str): 'gzip' or 'zstd' to compress the chunk files: Parquet codec, or .csv.gz / .csv.zst
+      files (default is None: snappy for Parquet, plain CSV).
     
     Returns:
     - None
@@ -26,16 +56,48 @@ def chunk_large_csv(input_file, output_folder, chunk_size=50000, sep='\t'):
             print(f"Failed to create output folder '{output_folder}': {e}")
             return
     
-    # Attempt to read and chunk the CSV file
+    # Skip the whole stage if the dump and parameters did not change since the last run
+    params = {'chunk_size': chunk_size if memory_budget_mb is None else None, 'memory_budget_mb': memory_budget_mb,
+              'sep': sep, 'output_format': output_format, 'use_schema': use_schema,
+              'extra_columns': list(extra_columns), 'compression': compression}
+    if manifest is not None:
+        if manifest.is_current(STAGE, [input_file], params, manifest.outputs(STAGE)):
+            print(f"'{input_file}' and the parameters did not change since the last run. Skipping chunking.")
+            return
+        manifest.begin_stage(STAGE, [input_file], params)
+    
+    # Attempt to read the CSV file; chunks are pulled one at a time so their size can change
     try:
-        chunk_iter = pd.read_csv(
-            input_file,
-            chunksize=chunk_size,
-            on_bad_lines='skip',
-            sep=sep,
-            low_memory=False
-        )
-        print(f"Started processing '{input_file}' in chunks of {chunk_size} rows.")
+        read_options = raw_read_options(input_file, sep=sep, extra_columns=extra_columns) if use_schema else {}
+        tuner = None
+        if memory_budget_mb is not None:
+            memory_per_row, file_bytes_per_row = sample_bytes_per_row(
+                input_file, sep=sep, on_bad_lines='skip', low_memory=False, **read_options
+            )
+            if memory_per_row is None:
+                print(f"Error: The input file '{input_file}' has no data rows.")
+                return
+            tuner = ChunkSizeTuner(memory_budget_mb, memory_per_row)
+            print(f"Sampled rows: {memory_per_row:.0f} bytes per row in memory, {file_bytes_per_row:.0f} bytes per row "
+                  f"in the file.")
+        # Compressed input is decompressed by a separate process or thread while the chunks are parsed
+        input_handle = open_input(input_file)
+        try:
+            reader = pd.read_csv(
+                input_handle,
+                iterator=True,
+                on_bad_lines='skip',
+                sep=sep,
+                low_memory=False,
+                **read_options
+            )
+        except Exception:
+            input_handle.close()
+            raise
+        if tuner is not None:
+            print(f"Started processing '{input_file}' with a memory budget of {memory_budget_mb} MB.")
+        else:
+            print(f"Started processing '{input_file}' in chunks of {chunk_size} rows.")
     except FileNotFoundError:
         print(f"Error: The input file '{input_file}' does not exist. Please check the path.")
         return
@@ -48,25 +110,212 @@ def chunk_large_csv(input_file, output_folder, chunk_size=50000, sep='\t'):
     
     # Process each chunk
     chunk_count = 0
-    for i, chunk in enumerate(chunk_iter):
-        chunk_count += 1
-        output_file = os.path.join(output_folder, f"chunk_{i + 1}.csv")
-        try:
-            chunk.to_csv(output_file, index=False, sep=sep)
-            print(f"Chunk {i + 1} saved to {output_file}")
-        except PermissionError:
-            # If permission error occurs, save to a different file
-            alt_output_file = output_file.replace(".csv", "_backup.csv")
+    saved_files = []
+    total_rows = 0
+    max_peak = None
+    started = time.perf_counter()
+    with input_handle, reader:
+        while True:
+            chunk_key = f"chunk_{chunk_count + 1}"
+            # Resume: chunks saved by an interrupted run of the same dump are not written again
+            resumed = manifest is not None and manifest.chunk_is_current(STAGE, chunk_key)
+            rss_before = current_rss()
+            if resumed and manifest.chunk_rows(STAGE, chunk_key) is not None:
+                # Read the same rows as the previous run, whatever chunk size the tuner would pick now
+                size = manifest.chunk_rows(STAGE, chunk_key)
+            elif tuner is not None:
+                size = tuner.next_size(rss_before)
+            else:
+                size = chunk_size
+            chunk_peak_known = reset_peak_rss()
+            chunk_started = time.perf_counter()
+            position = input_handle.tell()
+            try:
+                chunk = reader.get_chunk(size)
+            except StopIteration:
+                break
+            chunk_count += 1
+            i = chunk_count - 1
+            total_rows += len(chunk)
+    
+            if resumed:
+                saved_files.append(manifest.chunk_output(STAGE, chunk_key))
+                print(f"Chunk {i + 1} already saved by a previous run. Skipping.")
+                del chunk
+                continue
+            output_file = os.path.join(output_folder, chunk_file_name(chunk_key, output_format, compression))
+            saved_file = None
             try:
-                chunk.to_csv(alt_output_file, index=False, sep=sep)
-                print(f"PermissionError: Chunk {i + 1} saved to {alt_output_file} instead.")
+                write_table(chunk, output_file, sep=sep, compression=compression)
+                saved_file = output_file
+                print(f"Chunk {i + 1} saved to {output_file}")
+            except PermissionError:
+                # If permission error occurs, save to a different file
+                alt_output_file = output_file.replace(f".{output_format}", f"_backup.{output_format}")
+                try:
+                    write_table(chunk, alt_output_file, sep=sep, compression=compression)
+                    saved_file = alt_output_file
+                    print(f"PermissionError: Chunk {i + 1} saved to {alt_output_file} instead.")
+                except Exception as e:
+                    print(f"Failed to save chunk {i + 1} to both '{output_file}' and '{alt_output_file}': {e}")
             except Exception as e:
-                print(f"Failed to save chunk {i + 1} to both '{output_file}' and '{alt_output_file}': {e}")
-        except Exception as e:
-            print(f"An error occurred while saving chunk {i + 1} to '{output_file}': {e}")
+                print(f"An error occurred while saving chunk {i + 1} to '{output_file}': {e}")
+            if saved_file is not None:
+                saved_files.append(saved_file)
+                if manifest is not None:
+                    manifest.complete_chunk(STAGE, chunk_key, saved_file, rows=len(chunk))
+    
+            # Report the throughput and peak memory of the chunk (read and write)
+            elapsed = max(time.perf_counter() - chunk_started, 1e-9)
+            # Approximate (the parser reads ahead in blocks), and in decompressed bytes for .gz / .zst input
+            bytes_read = input_handle.tell() - position
+            chunk_peak = peak_rss()
+            max_peak = chunk_peak if max_peak is None else max(max_peak, chunk_peak or 0)
+            print(f"Chunk {i + 1}: {len(chunk)} rows in {elapsed:.2f} s ({len(chunk) / elapsed:,.0f} rows/s, "
+                  f"{bytes_read / MB / elapsed:.1f} MB/s), peak RSS {format_mb(chunk_peak)}")
+            if tuner is not None:
+                tuner.update(len(chunk), chunk.memory_usage(deep=True, index=False).sum(), rss_before,
+                             chunk_peak if chunk_peak_known else None)
+            # Free the chunk before the next one is parsed
+            del chunk
+        total_bytes = input_handle.tell()
     
+    elapsed = max(time.perf_counter() - started, 1e-9)
     print(f"All chunks have been processed and saved. Total chunks created: {chunk_count}")
+    print(f"Read {total_rows} rows in {elapsed:.1f} s ({total_rows / elapsed:,.0f} rows/s, "
+          f"{total_bytes / MB / elapsed:.1f} MB/s), peak RSS {format_mb(max_peak)}")
+    if tuner is not None and tuner.over_budget_chunks:
+        print(f"Warning: the peak RSS exceeded the {memory_budget_mb} MB budget during {tuner.over_budget_chunks} chunks.")
+    
+    if manifest is not None and len(saved_files) == chunk_count:
+        # Chunks of a previous, longer dump would otherwise be picked up by the next stages
+        for stale_file in manifest.complete_stage(STAGE, saved_files, chunk_keys={f"chunk_{i + 1}" for i in range(chunk_count)}):
+            if os.path.exists(stale_file):
+                os.remove(stale_file)
+                print(f"Removed stale chunk file {stale_file}")
+
+def split_large_csv_parallel(input_file, output_folder, chunk_size=50000, sep='\t', output_format=PARQUET,
+                             use_schema=True, extra_columns=(), manifest=None, n_jobs=-1, raw_copy=False):
+    """
+    Splits a large CSV file into byte ranges aligned to line boundaries and parses the ranges
+    in parallel worker processes, each range being saved as one chunk file. The header is put
+    in front of every range and bad lines are skipped with `on_bad_lines='skip'`, as in
+    chunk_large_csv. The range size is picked from a sample of the file so that chunks have
+    about chunk_size rows.
 
+    With raw_copy=True the ranges are not parsed: each chunk is a byte copy of its range with
+    the header prepended, saved as a CSV file in the input format (every column kept, bad lines
+    included; they are skipped when 02_process_and_clean_csv_chunks.py parses the chunks).
+
+    Parameters:
+    - input_file (str): Path to the large CSV file (uncompressed: ranges need random access).
+    - output_folder (str): Folder where the chunk files will be saved.
+    - chunk_size (int): Approximate number of rows per chunk (default is 50,000 rows).
+    - sep (str): Separator used in the CSV files (default is tab '\t').
+    - output_format (str): 'parquet' (default) or 'csv' for the chunk files; raw copies are always CSV.
+    - use_schema (bool): Read only the schema columns and dtypes (default is True).
+    - extra_columns (list): Columns read in addition to the schema ones.
+    - manifest (Manifest): When given, the run is skipped if the input and parameters did not change,
+      and an interrupted run resumes with the ranges that were not saved yet.
+    - n_jobs (int): Number of worker processes (default is -1, all CPUs).
+    - raw_copy (bool): Copy the ranges without parsing them (default is False).
+
+    Returns:
+    - None
+    """
+    if compression_of(input_file) is not None:
+        # Byte ranges need random access, which a compressed stream does not have
+        print(f"Error: '{input_file}' is compressed; split it with chunk_large_csv, which streams compressed input.")
+        return
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    if raw_copy:
+        output_format = 'csv'
+    os.makedirs(output_folder, exist_ok=True)
+
+    # Skip the whole stage if the dump and parameters did not change since the last run
+    params = {'chunk_size': chunk_size, 'sep': sep, 'output_format': output_format, 'use_schema': use_schema,
+              'extra_columns': list(extra_columns), 'split': 'raw' if raw_copy else 'parallel'}
+    if manifest is not None:
+        if manifest.is_current(STAGE, [input_file], params, manifest.outputs(STAGE)):
+            print(f"'{input_file}' and the parameters did not change since the last run. Skipping chunking.")
+            return
+        manifest.begin_stage(STAGE, [input_file], params)
+
+    # Step 1: Size the ranges from the bytes per row of a sample, and align them to line boundaries
+    try:
+        read_options = {}
+        if use_schema and not raw_copy:
+            read_options = raw_read_options(input_file, sep=sep, extra_columns=extra_columns)
+        _, file_bytes_per_row = sample_bytes_per_row(input_file, sep=sep, on_bad_lines='skip', low_memory=False,
+                                                     **read_options)
+        if file_bytes_per_row is None:
+            print(f"Error: The input file '{input_file}' has no data rows.")
+            return
+        header = read_header(input_file)
+        ranges = line_aligned_ranges(input_file, chunk_size * file_bytes_per_row)
+    except FileNotFoundError:
+        print(f"Error: The input file '{input_file}' does not exist. Please check the path.")
+        return
+    except pd.errors.EmptyDataError:
+        print(f"Error: The input file '{input_file}' is empty.")
+        return
+    except Exception as e:
+        print(f"An unexpected error occurred while reading '{input_file}': {e}")
+        return
+    print(f"Split '{input_file}' into {len(ranges)} byte ranges of about {chunk_size * file_bytes_per_row / MB:.0f} MB.")
+
+    # Step 2: Parse (or copy) the ranges that are not saved yet, in worker processes
+    chunk_keys = [f"chunk_{i + 1}" for i in range(len(ranges))]
+    output_files = {key: os.path.join(output_folder, f"{key}.{output_format}") for key in chunk_keys}
+    saved_files = {}
+    to_split = []
+    for key, (start, end) in zip(chunk_keys, ranges):
+        if manifest is not None and manifest.chunk_is_current(STAGE, key):
+            saved_files[key] = manifest.chunk_output(STAGE, key)
+        else:
+            to_split.append((key, start, end))
+    print(f"{len(to_split)} of {len(ranges)} ranges to {'copy' if raw_copy else 'parse'} with {n_jobs} worker processes.")
+
+    started = time.perf_counter()
+    total_rows = 0
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        if raw_copy:
+            futures = {executor.submit(copy_range, input_file, start, end, header, output_files[key]): key
+                       for key, start, end in to_split}
+        else:
+            futures = {executor.submit(parse_range, input_file, start, end, header, output_files[key], sep,
+                                       read_options): key
+                       for key, start, end in to_split}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"An error occurred while saving {key} to '{output_files[key]}': {e}")
+                continue
+            saved_files[key] = output_files[key]
+            if raw_copy:
+                print(f"{key} copied to {output_files[key]} ({result / MB:.1f} MB)")
+            else:
+                total_rows += result
+                print(f"{key} saved to {output_files[key]} ({result} rows)")
+            # Record each range as it completes so an interrupted run resumes after it
+            if manifest is not None:
+                manifest.complete_chunk(STAGE, key, output_files[key], rows=None if raw_copy else result)
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    split_bytes = sum(end - start for _, start, end in to_split)
+    print(f"All ranges have been processed and saved. Total chunks created: {len(saved_files)} of {len(ranges)}")
+    print(f"Processed {split_bytes / MB:.0f} MB in {elapsed:.1f} s ({split_bytes / MB / elapsed:.1f} MB/s"
+          + ("" if raw_copy else f", {total_rows / elapsed:,.0f} rows/s") + ")")
+
+    if manifest is not None and len(saved_files) == len(ranges):
+        # Chunks of a previous, longer dump would otherwise be picked up by the next stages
+        for stale_file in manifest.complete_stage(STAGE, [saved_files[key] for key in chunk_keys], chunk_keys=set(chunk_keys)):
+            if os.path.exists(stale_file):
+                os.remove(stale_file)
+                print(f"Removed stale chunk file {stale_file}")
 
 def main():
     """
@@ -78,12 +327,17 @@ def main():
     data_dir = os.path.join(project_root, 'data')
     
     # Define input and output file paths
-    input_file = os.path.join(data_dir, 'big', 'big.csv')
+    input_file = find_input(os.path.join(data_dir, 'big', 'big.csv'))  # Or the published big.csv.gz / .zst
     output_folder = os.path.join(data_dir, 'big', 'output_chunks')
     
     # Define chunk size and separator
     chunk_size = 50000  # Modify if you want a different chunk size
+    memory_budget_mb = None  # Set a target peak RSS in MB (e.g. 2048) to pick and adapt the chunk size instead
+    split_mode = 'sequential'  # 'parallel' to parse byte ranges in worker processes, 'raw' to copy them unparsed
+    n_jobs = -1  # Worker processes of the parallel and raw modes (-1 uses all CPUs)
     sep = '\t'  # Modify if your CSVs use a different separator (e.g., ',' for CSV)
+    output_format = 'parquet'  # Set to 'csv' to write the chunks as CSV files
+    compression = None  # Set to 'gzip' or 'zstd' to compress the chunk files
     
     # Debugging: Print the calculated paths
     print(f"Current Directory: {current_dir}")
@@ -92,7 +346,11 @@ def main():
     print(f"Input File Path: {input_file}")
     print(f"Output Folder Path: {output_folder}")
     print(f"Chunk Size: {chunk_size}")
+    print(f"Memory Budget: {f'{memory_budget_mb} MB' if memory_budget_mb is not None else 'none'}")
     print(f"Separator Used: '{sep}'")
+    print(f"Output Format: {output_format}")
+    print(f"Output Compression: {compression or 'none'}")
+    print(f"Split Mode: {split_mode}")
     
     # Check if the input file exists
     if not os.path.isfile(input_file):
@@ -100,7 +358,13 @@ def main():
         return
     
     # Execute the chunking process
-    chunk_large_csv(input_file, output_folder, chunk_size=chunk_size, sep=sep)
+    manifest = Manifest(os.path.join(data_dir, MANIFEST_NAME))
+    if split_mode in ('parallel', 'raw'):
+        split_large_csv_parallel(input_file, output_folder, chunk_size=chunk_size, sep=sep, output_format=output_format,
+                                 manifest=manifest, n_jobs=n_jobs, raw_copy=split_mode == 'raw')
+        return
+    chunk_large_csv(input_file, output_folder, chunk_size=chunk_size, sep=sep, output_format=output_format,
+                    manifest=manifest, memory_budget_mb=memory_budget_mb, compression=compression)
 
 
 if __name__ == "__main__":
@@ -1,137 +1,252 @@
 # Filename: process_and_clean_csv_chunks.py
 
-import pandas as pd
 import os
-import numpy as np
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 
-def process_and_clean_csv_chunks(input_folder, output_file, nan_threshold=0.3):
+from pipeline_io import CSV, TableWriter, format_of, is_table_file, read_table, write_table
+from pipeline_manifest import MANIFEST_NAME, Manifest
+from pipeline_stages import NonNullCounter, NormalizeSentinels
+from pipeline_schema import raw_read_options
+
+STAGE = '02_process_and_clean_csv_chunks'
+
+def chunk_sort_key(file_name):
+    """Sorts chunk files by their number (chunk_2 before chunk_10), then by name."""
+    digits = ''.join(c for c in os.path.splitext(file_name)[0] if c.isdigit())
+    return (int(digits) if digits else -1, file_name)
+
+def clean_chunk(file_path):
+    """
+    Cleans one chunk file (Steps 1 to 6 of process_and_clean_csv_chunks).
+    Runs in a worker process in parallel mode, so it only takes picklable arguments.
+
+    Args:
+    - file_path (str): Path to the chunk file (Parquet or CSV).
+
+    Returns:
+    - pd.DataFrame: The cleaned chunk, or None if the file could not be read.
+    """
+    file_name = os.path.basename(file_path)
+    print(f"Processing {file_name}")
+
+    # Step 1: Read the chunk (CSV chunks are read with the schema columns and dtypes)
+    try:
+        if format_of(file_path) == CSV:
+            read_options = raw_read_options(file_path, sep='\t')
+            chunk = read_table(file_path, columns=read_options['usecols'], sep='\t',
+                               on_bad_lines='skip', dtype=read_options['dtype'])
+        else:
+            chunk = read_table(file_path)
+        print(f"Loaded {file_name} successfully.")
+    except Exception as e:
+        print(f"Failed to load {file_name}: {e}")
+        return None
+
+    # Step 2: Replace sentinels ('unknown', 'not-applicable', ...) in nutriscore_grade with NaN.
+    # Other columns keep theirs until 04, so they count as non-null for the Step 7 threshold.
+    if 'nutriscore_grade' in chunk.columns:
+        normalizer = NormalizeSentinels(columns=['nutriscore_grade'])
+        chunk = normalizer(chunk)
+        print(f"Replaced {normalizer.replacements.get('nutriscore_grade', 0)} sentinel values in 'nutriscore_grade' for {file_name}.")
+    else:
+        print(f"'nutriscore_grade' column not found in {file_name}. Skipping replacement.")
+
+    # Step 3: Filter rows with valid Nutri-Score grade (a, b, c, d, or e)
+    valid_grades = ['a', 'b', 'c', 'd', 'e']
+    if 'nutriscore_grade' in chunk.columns:
+        initial_rows = chunk.shape[0]
+        chunk = chunk[chunk['nutriscore_grade'].isin(valid_grades)]
+        filtered_rows = initial_rows - chunk.shape[0]
+        print(f"Filtered {filtered_rows} rows with invalid 'nutriscore_grade' in {file_name}.")
+    else:
+        print(f"'nutriscore_grade' column not present in {file_name}. Skipping grade filtering.")
+
+    # Step 4: Remove rows where all nutrient-related columns are NaN (those ending in '_100g')
+    nutrient_columns = [col for col in chunk.columns if col.endswith('_100g')]
+    if nutrient_columns:
+        initial_rows = chunk.shape[0]
+        chunk_cleaned = chunk.dropna(subset=nutrient_columns, how='all')
+        removed_rows = initial_rows - chunk_cleaned.shape[0]
+        print(f"Dropped {removed_rows} rows with all nutrient columns NaN in {file_name}.")
+    else:
+        print(f"No nutrient columns found in {file_name}. Skipping row removal.")
+        chunk_cleaned = chunk.copy()
+
+    # Step 5: Remove duplicates based on 'brands' and 'product_name'
+    if 'brands' in chunk_cleaned.columns and 'product_name' in chunk_cleaned.columns:
+        before_duplicates = chunk_cleaned.shape[0]
+        chunk_cleaned = chunk_cleaned.drop_duplicates(subset=['brands', 'product_name'])
+        after_duplicates = chunk_cleaned.shape[0]
+        duplicates_removed = before_duplicates - after_duplicates
+        print(f"Removed {duplicates_removed} duplicate rows based on 'brands' and 'product_name' in {file_name}.")
+    else:
+        print(f"'brands' and/or 'product_name' columns not found in {file_name}. Skipping duplicate removal.")
+
+    # Step 6: Remove redundant columns (those ending with '_tags' or '_en')
+    redundant_columns = [col for col in chunk_cleaned.columns if col.endswith('_tags') or col.endswith('_en')]
+    if redundant_columns:
+        chunk_cleaned = chunk_cleaned.drop(columns=redundant_columns, errors='ignore')
+        print(f"Removed {len(redundant_columns)} redundant columns from {file_name}.")
+    else:
+        print(f"No redundant columns to remove in {file_name}.")
+    
+    if chunk_cleaned.empty:
+        print(f"No data left in {file_name} after cleaning.")
+    return chunk_cleaned
+
+def clean_chunk_to_part(file_path, part_path):
+    """
+    Cleans one chunk file and saves the cleaned chunk to part_path (Parquet).
+
+    Returns:
+    - tuple: (part_path, or None if the chunk has no data left; False if the chunk could not be read).
     """
-    Loops through all CSV chunks in the input folder, cleans the data according to the following steps:
+    chunk_cleaned = clean_chunk(file_path)
+    if chunk_cleaned is None:
+        return None, False
+    if chunk_cleaned.empty:
+        return None, True
+    write_table(chunk_cleaned, part_path)
+    return part_path, True
+
+def process_and_clean_csv_chunks(input_folder, output_file, nan_threshold=0.3, n_jobs=1, parts_dir=None,
+                                 manifest=None):
+    """
+    Loops through all chunk files (Parquet or CSV) in the input folder, cleans the data according to the following steps:
     - Cleans 'nutriscore_grade' by replacing 'unknown' and invalid values with NaN
     - Removes rows where all nutrient-related columns are NaN
     - Removes duplicates based on 'brands' and 'product_name'
     - Removes redundant columns (those ending with '_tags', '_en')
-    - Removes columns with more than a specified percentage of NaN values (default: 70%) after concatenating the chunks.
+    - Removes columns with more than a specified percentage of NaN values (default: 70%) over all the cleaned chunks.
+
+    Chunks are processed in chunk order (chunk_1, chunk_2, ...). With n_jobs > 1 the
+    per-chunk steps run in a process pool and the results are merged in the same
+    order, so the output does not depend on the number of workers. Duplicates are only
+    removed within each chunk here: the global removal runs in
+    06_process_and_save_cleaned_df.py, after the rows without nutrients are dropped.
+
+    The chunks are never concatenated: each cleaned chunk is saved as a part file, a
+    first pass over the parts counts the non-null values per column, and a second pass
+    appends only the kept columns to the output. Peak memory is bounded by the chunk
+    size.
+
+    With a manifest, only new or modified chunks are cleaned again (the parts of the
+    others are reused from parts_dir), each cleaned chunk is recorded as it completes so
+    an interrupted run resumes, and the stage is skipped if no chunk changed.
 
     Args:
-    - input_folder (str): Folder where the chunked CSV files are saved.
-    - output_file (str): Path to save the cleaned DataFrame.
+    - input_folder (str): Folder where the chunk files are saved.
+    - output_file (str): Path to save the cleaned DataFrame (.parquet, or .csv to export CSV).
     - nan_threshold (float): Proportion of NaN values in columns (default is 70%, meaning 0.3 threshold).
+    - n_jobs (int): Number of worker processes cleaning chunks (default is 1, sequential; -1 uses all CPUs).
+    - parts_dir (str): Directory keeping the cleaned chunks between runs (default: a temporary directory).
+    - manifest (Manifest): Stage manifest making the run incremental and resumable (default: None).
 
     Returns:
-    - cleaned_df (pd.DataFrame): A DataFrame containing the cleaned data.
+    - TableWriter: The written table (its shape and first rows), or None if no data was saved or the stage was skipped.
     """
-    # List to store data from each chunk
-    chunks_list = []
-
-    # Loop through all CSV files in the input folder
-    for file_name in os.listdir(input_folder):
-        if file_name.endswith('.csv'):
-            file_path = os.path.join(input_folder, file_name)
-            print(f"Processing {file_name}")
-            
-            # Step 1: Read the chunk without removing any columns
-            try:
-                chunk = pd.read_csv(file_path, sep='\t', on_bad_lines='skip', low_memory=False)
-                print(f"Loaded {file_name} successfully.")
-            except Exception as e:
-                print(f"Failed to load {file_name}: {e}")
-                continue
-            
-            # Step 2: Replace 'unknown' and 'not-applicable' in nutriscore_grade with NaN
-            if 'nutriscore_grade' in chunk.columns:
-                chunk['nutriscore_grade'].replace(['unknown', 'not-applicable'], np.nan, inplace=True)
-                print(f"Replaced 'unknown' and 'not-applicable' in 'nutriscore_grade' for {file_name}.")
-            else:
-                print(f"'nutriscore_grade' column not found in {file_name}. Skipping replacement.")
-            
-            # Step 3: Filter rows with valid Nutri-Score grade (a, b, c, d, or e)
-            valid_grades = ['a', 'b', 'c', 'd', 'e']
-            if 'nutriscore_grade' in chunk.columns:
-                initial_rows = chunk.shape[0]
-                chunk = chunk[chunk['nutriscore_grade'].isin(valid_grades)]
-                filtered_rows = initial_rows - chunk.shape[0]
-                print(f"Filtered {filtered_rows} rows with invalid 'nutriscore_grade' in {file_name}.")
-            else:
-                print(f"'nutriscore_grade' column not present in {file_name}. Skipping grade filtering.")
-            
-            # Step 4: Remove rows where all nutrient-related columns are NaN (those ending in '_100g')
-            nutrient_columns = [col for col in chunk.columns if col.endswith('_100g')]
-            if nutrient_columns:
-                initial_rows = chunk.shape[0]
-                chunk_cleaned = chunk.dropna(subset=nutrient_columns, how='all')
-                removed_rows = initial_rows - chunk_cleaned.shape[0]
-                print(f"Dropped {removed_rows} rows with all nutrient columns NaN in {file_name}.")
-            else:
-                print(f"No nutrient columns found in {file_name}. Skipping row removal.")
-                chunk_cleaned = chunk.copy()
-            
-            # Step 5: Remove duplicates based on 'brands' and 'product_name'
-            if 'brands' in chunk_cleaned.columns and 'product_name' in chunk_cleaned.columns:
-                before_duplicates = chunk_cleaned.shape[0]
-                chunk_cleaned = chunk_cleaned.drop_duplicates(subset=['brands', 'product_name'])
-                after_duplicates = chunk_cleaned.shape[0]
-                duplicates_removed = before_duplicates - after_duplicates
-                print(f"Removed {duplicates_removed} duplicate rows based on 'brands' and 'product_name' in {file_name}.")
-            else:
-                print(f"'brands' and/or 'product_name' columns not found in {file_name}. Skipping duplicate removal.")
-            
-            # Step 6: Remove redundant columns (those ending with '_tags' or '_en')
-            redundant_columns = [col for col in chunk_cleaned.columns if col.endswith('_tags') or col.endswith('_en')]
-            if redundant_columns:
-                chunk_cleaned = chunk_cleaned.drop(columns=redundant_columns, errors='ignore')
-                print(f"Removed {len(redundant_columns)} redundant columns from {file_name}.")
-            else:
-                print(f"No redundant columns to remove in {file_name}.")
-            
-            # Append the cleaned chunk to the list if it's not empty
-            if not chunk_cleaned.empty:
-                chunks_list.append(chunk_cleaned)
-                print(f"Appended cleaned data from {file_name} to chunks list.")
+    # List the chunk files in chunk order so the merged result is deterministic
+    file_names = sorted((f for f in os.listdir(input_folder) if is_table_file(f)), key=chunk_sort_key)
+    file_paths = [os.path.join(input_folder, file_name) for file_name in file_names]
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    params = {'nan_threshold': nan_threshold}
+
+    # Skip the stage if no chunk changed since the last completed run
+    if manifest is not None:
+        if manifest.is_current(STAGE, [], params, [output_file]) \
+                and manifest.chunk_keys(STAGE) == set(file_names) \
+                and all(manifest.chunk_is_current(STAGE, name, path) for name, path in zip(file_names, file_paths)):
+            print(f"No chunk changed since the last run. Skipping, {output_file} is up to date.")
+            return None
+        manifest.begin_stage(STAGE, [], params)
+
+    with tempfile.TemporaryDirectory(prefix='cleaned_parts_') as tmp_dir:
+        # Cleaned chunks are kept in parts_dir so that re-runs only clean new or modified chunks
+        parts_dir = parts_dir or tmp_dir
+        os.makedirs(parts_dir, exist_ok=True)
+        part_paths = {}
+        to_clean = []
+        for file_name, file_path in zip(file_names, file_paths):
+            if manifest is not None and manifest.chunk_is_current(STAGE, file_name, file_path):
+                part_paths[file_name] = manifest.chunk_output(STAGE, file_name)
             else:
-                print(f"No data to append from {file_name} after cleaning.")
-    
-    # Concatenate all cleaned chunks into a single DataFrame
-    if chunks_list:
+                to_clean.append((file_name, file_path))
+        print(f"{len(to_clean)} of {len(file_paths)} chunks are new or modified and will be cleaned.")
+
+        # Steps 1 to 6 are independent per chunk: run them sequentially or in a process pool
+        clean_paths = [file_path for _, file_path in to_clean]
+        target_paths = [os.path.join(parts_dir, f"{name.split('.')[0]}.parquet") for name, _ in to_clean]
+        if n_jobs > 1 and len(to_clean) > 1:
+            print(f"Cleaning {len(to_clean)} chunks with {n_jobs} worker processes.")
+            executor = ProcessPoolExecutor(max_workers=n_jobs)
+            # map() returns the results in the order of to_clean
+            results = executor.map(clean_chunk_to_part, clean_paths, target_paths)
+        else:
+            executor = None
+            results = map(clean_chunk_to_part, clean_paths, target_paths)
         try:
-            cleaned_df = pd.concat(chunks_list, ignore_index=True)
-            print(f"Concatenated {len(chunks_list)} chunks successfully.")
-        except Exception as e:
-            print(f"Failed to concatenate chunks: {e}")
-            cleaned_df = pd.DataFrame()
-    else:
-        cleaned_df = pd.DataFrame()  # Return empty DataFrame if no valid data
-        print("No valid data found to concatenate.")
-    
-    # Step 7: Remove columns with more than specified proportion of NaN values after concatenating the chunks
-    if not cleaned_df.empty:
-        col_threshold = len(cleaned_df) * nan_threshold
-        initial_columns = cleaned_df.shape[1]
-        cleaned_df = cleaned_df.dropna(axis=1, thresh=col_threshold)
-        removed_columns = initial_columns - cleaned_df.shape[1]
-        print(f"Removed {removed_columns} columns with more than {nan_threshold*100}% NaN values.")
-    else:
-        print("Cleaned DataFrame is empty. Skipping column removal based on NaN threshold.")
-    
-    # Save the cleaned DataFrame to a CSV file with a unique name to avoid conflicts
-    if not cleaned_df.empty:
+            for (file_name, file_path), (part_path, loaded) in zip(to_clean, results):
+                part_paths[file_name] = part_path
+                # A chunk that could not be read is not recorded, so the next run retries it
+                if not loaded:
+                    print(f"{file_name} could not be read; it will be retried on the next run.")
+                    continue
+                # Record each chunk as it completes so an interrupted run resumes after it
+                if manifest is not None:
+                    manifest.complete_chunk(STAGE, file_name, part_path, input_path=file_path)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        parts = [part_paths[name] for name in file_names if part_paths.get(name) is not None]
+        print(f"{len(parts)} of {len(file_paths)} chunks contain data after cleaning.")
+        if not parts:
+            print("No data available to save.")
+            return None
+
+        # Pass 1: Count the non-null values of every column (for Step 7)
+        counter = NonNullCounter()
+        for part_path in parts:
+            counter.update(read_table(part_path))
+
+        # Step 7: Remove columns with more than specified proportion of NaN values, using the
+        # non-null counts of every cleaned chunk instead of concatenating them
+        kept_columns = counter.columns_above(nan_threshold)
+        removed_columns = len(counter.counts) - len(kept_columns)
+        print(f"Removed {removed_columns} columns with more than {(1 - nan_threshold)*100}% NaN values.")
+
+        # Pass 2: Keep only the kept columns of each part and append them to the output, in chunk order
+        def write_parts(path):
+            with TableWriter(path) as writer:
+                for part_path in parts:
+                    writer.write(read_table(part_path, columns=kept_columns))
+            return writer
+
+        # Save the cleaned data with a unique name to avoid conflicts
         try:
-            cleaned_df.to_csv(output_file, index=False)
+            writer = write_parts(output_file)
             print(f"Cleaned DataFrame saved to {output_file}.")
         except PermissionError:
             # If permission error occurs, save to a different file
-            alt_output_file = output_file.replace(".csv", "_backup.csv")
+            base, ext = os.path.splitext(output_file)
+            alt_output_file = f"{base}_backup{ext}"
             try:
-                cleaned_df.to_csv(alt_output_file, index=False)
+                writer = write_parts(alt_output_file)
                 print(f"PermissionError occurred. DataFrame saved to {alt_output_file}.")
+                return writer
             except Exception as e:
                 print(f"Failed to save to backup file '{alt_output_file}': {e}")
+                return None
         except Exception as e:
             print(f"An error occurred while saving the cleaned data: {e}")
-    else:
-        print("No data available to save.")
-    
-    return cleaned_df
+            return None
+
+    if manifest is not None:
+        manifest.complete_stage(STAGE, [output_file], chunk_keys=set(file_names))
+    return writer
 
 def main():
     """
@@ -144,7 +259,10 @@ def main():
     
     # Define input and output file paths
     input_folder = os.path.join(data_dir, 'big', 'output_chunks')
-    output_file = os.path.join(data_dir, 'cleaned_df.csv')
+    output_format = 'parquet'  # Set to 'csv' to export the cleaned data as CSV
+    output_file = os.path.join(data_dir, f'cleaned_df.{output_format}')
+    n_jobs = 1  # Set to the number of worker processes (-1 for all CPUs) to clean chunks in parallel
+    parts_dir = os.path.join(data_dir, 'big', 'cleaned_chunks')
     
     # Debugging: Print the calculated paths
     print(f"Current Directory: {current_dir}")
@@ -152,6 +270,7 @@ def main():
     print(f"Data Directory: {data_dir}")
     print(f"Input Folder Path: {input_folder}")
     print(f"Output File Path: {output_file}")
+    print(f"Worker Processes: {n_jobs}")
     
     # Check if the data directory exists
     if not os.path.isdir(data_dir):
@@ -163,16 +282,18 @@ def main():
         print(f"Error: The input folder '{input_folder}' does not exist. Please check the path.")
         return
     
-    # Process the chunks, clean the data, and get the final cleaned DataFrame
-    cleaned_df = process_and_clean_csv_chunks(input_folder, output_file)
+    # Process the chunks, clean the data, and save the final cleaned table
+    manifest = Manifest(os.path.join(data_dir, MANIFEST_NAME))
+    cleaned = process_and_clean_csv_chunks(input_folder, output_file, n_jobs=n_jobs, parts_dir=parts_dir,
+                                           manifest=manifest)
     
-    if not cleaned_df.empty:
+    if cleaned is not None:
         print("DataFrame processing completed successfully.")
-        print(f"Cleaned DataFrame Shape: {cleaned_df.shape}")
+        print(f"Cleaned DataFrame Shape: {cleaned.shape}")
         print("Preview of the Cleaned DataFrame:")
-        print(cleaned_df.head())
+        print(cleaned.head)
     else:
-        print("DataFrame processing resulted in an empty DataFrame.")
+        print("No cleaned DataFrame was written (no data, or already up to date).")
 
 if __name__ == "__main__":
     main()
@@ -1,30 +1,38 @@
 # Filename: remove_metadata_and_serving_columns.py
 
-import pandas as pd
 import os
 
+from pipeline_io import find_table, read_table, table_path, write_table
+from pipeline_manifest import MANIFEST_NAME, Manifest
+
+STAGE = '03_remove_metadata_and_serving_columns'
+
+# List of columns to remove, leaving 'last_updated_datetime'
+COLUMNS_TO_REMOVE = [
+    'code', 'url', 'creator', 'last_modified_by', 'last_updated_t',
+    'image_url', 'image_small_url', 'image_ingredients_url',
+    'image_ingredients_small_url', 'image_nutrition_url', 'image_nutrition_small_url',
+    'completeness', 'unique_scans_n', 'states', 'serving_size', 'serving_quantity'
+]
+
 def remove_metadata_and_serving_columns(df):
     """
     Removes unnecessary metadata, image-related, and serving-related columns
     except for 'last_updated_datetime'.
 
+    The product code and last-modified timestamp needed by delta ingestion are
+    not kept here: 10_delta_ingest.py reads them from the raw dump itself
+    (pipeline_schema.KEY_COLUMNS).
+
     Args:
     - df (pd.DataFrame): DataFrame from which the columns should be removed.
 
     Returns:
     - pd.DataFrame: Cleaned DataFrame with specified columns removed.
     """
-    # List of columns to remove, leaving 'last_updated_datetime'
-    columns_to_remove = [
-        'code', 'url', 'creator', 'last_modified_by', 'last_updated_t',
-        'image_url', 'image_small_url', 'image_ingredients_url',
-        'image_ingredients_small_url', 'image_nutrition_url', 'image_nutrition_small_url',
-        'completeness', 'unique_scans_n', 'states', 'serving_size', 'serving_quantity'
-    ]
-    
     # Remove the columns
-    df_cleaned = df.drop(columns=columns_to_remove, errors='ignore')
-    print(f"Removed {len(columns_to_remove)} columns from the DataFrame.")
+    df_cleaned = df.drop(columns=COLUMNS_TO_REMOVE, errors='ignore')
+    print(f"Removed {len(COLUMNS_TO_REMOVE)} columns from the DataFrame.")
     
     return df_cleaned
 
@@ -36,8 +44,9 @@ def main():
     current_dir = os.path.dirname(os.path.abspath(__file__))
     project_root = os.path.abspath(os.path.join(current_dir, '..', '..'))  # Navigate up to project root
     data_dir = os.path.join(project_root, 'data')
-    input_file = os.path.join(data_dir, 'cleaned_df_2.csv')
-    output_file = os.path.join(data_dir, 'cleaned_df_3.csv')
+    output_format = 'parquet'  # Set to 'csv' to export the cleaned data as CSV
+    input_file = find_table(data_dir, 'cleaned_df_2')
+    output_file = table_path(data_dir, 'cleaned_df_3', output_format)
     
     # Debugging: Print the calculated paths
     print(f"Current Directory: {current_dir}")
@@ -56,9 +65,17 @@ def main():
         print(f"Error: The input file '{input_file}' does not exist. Please check the path.")
         return
     
-    # Load the cleaned_df_2.csv
+    # Skip the stage if its input and parameters did not change since the last run
+    manifest = Manifest(os.path.join(data_dir, MANIFEST_NAME))
+    params = {'columns_to_remove': COLUMNS_TO_REMOVE}
+    if manifest.is_current(STAGE, [input_file], params, [output_file]):
+        print(f"{STAGE}: input and parameters unchanged since the last run. Skipping.")
+        return
+    manifest.begin_stage(STAGE, [input_file], params)
+    
+    # Load cleaned_df_2
     try:
-        df_cleaned_2 = pd.read_csv(input_file)
+        df_cleaned_2 = read_table(input_file)
         print(f"Data loaded successfully from {input_file}.")
     except Exception as e:
         print(f"An error occurred while loading the data: {e}")
@@ -67,14 +84,15 @@ def main():
     # Apply the function to remove specified columns
     df_cleaned_3 = remove_metadata_and_serving_columns(df_cleaned_2)
     
-    # Save the cleaned DataFrame to a new CSV file
+    # Save the cleaned DataFrame to a new file
     try:
-        df_cleaned_3.to_csv(output_file, index=False)
+        write_table(df_cleaned_3, output_file)
         print(f"Cleaned DataFrame saved to {output_file}.")
     except Exception as e:
         print(f"An error occurred while saving the cleaned data: {e}")
         return
     
+    manifest.complete_stage(STAGE, [output_file])
     print("Column removal process completed successfully.")
 
 if __name__ == "__main__":
@@ -1,44 +1,48 @@
 # Filename: convert_unknown_to_nan.py
 
-import pandas as pd
-import numpy as np
 import os
 
-def convert_unknown_to_nan(input_file, output_file):
+from pipeline_io import TableWriter, find_table, iter_table, table_path
+from pipeline_stages import DEFAULT_SENTINELS, NormalizeSentinels
+from pipeline_manifest import MANIFEST_NAME, Manifest
+
+STAGE = '04_convert_unknown_to_nan'
+
+def convert_unknown_to_nan(input_file, output_file, sentinels=DEFAULT_SENTINELS, chunk_size=50000):
     """
-    Converts 'unknown' values to NaN in the DataFrame and saves the cleaned DataFrame.
+    Converts 'unknown' and the other sentinel values to NaN in the DataFrame and saves the cleaned DataFrame.
+
+    The table is streamed chunk by chunk through NormalizeSentinels, which only
+    scans text and categorical columns.
 
     Args:
-    - input_file (str): Path to the input CSV file (cleaned_df_3.csv).
-    - output_file (str): Path to save the cleaned CSV file (cleaned_df_4.csv).
+    - input_file (str): Path to the input file (cleaned_df_3.parquet or .csv).
+    - output_file (str): Path to save the cleaned file (cleaned_df_4.parquet, or .csv to export CSV).
+    - sentinels (iterable): Values replaced by NaN (default: 'unknown', 'not-applicable', '', 'en:unknown').
+    - chunk_size (int): Number of rows processed at a time (default is 50,000 rows).
 
     Returns:
-    - df_cleaned_4 (pd.DataFrame): DataFrame with 'unknown' values replaced by NaN.
+    - TableWriter: The written table (its shape and first rows), or None on error.
     """
+    normalizer = NormalizeSentinels(sentinels)
     try:
-        # Load the DataFrame
-        df_cleaned_3 = pd.read_csv(input_file)
+        # Load, normalize and save the table chunk by chunk
+        with TableWriter(output_file) as writer:
+            for chunk in iter_table(input_file, chunk_size=chunk_size):
+                writer.write(normalizer(chunk))
         print(f"Data loaded successfully from {input_file}.")
+        print(f"Cleaned DataFrame saved to {output_file}.")
     except FileNotFoundError:
         print(f"Error: The file '{input_file}' does not exist. Please check the path.")
         return
     except Exception as e:
-        print(f"An error occurred while loading the data: {e}")
+        print(f"An error occurred while converting the data: {e}")
         return
 
-    # Replace 'unknown' with NaN
-    df_cleaned_4 = df_cleaned_3.replace('unknown', np.nan)
-    print("Replaced 'unknown' values with NaN.")
-
-    try:
-        # Save the cleaned DataFrame
-        df_cleaned_4.to_csv(output_file, index=False)
-        print(f"Cleaned DataFrame saved to {output_file}.")
-    except Exception as e:
-        print(f"An error occurred while saving the cleaned data: {e}")
-        return
+    # Report the replacements made in each column
+    print(normalizer.report())
 
-    return df_cleaned_4
+    return writer
 
 def main():
     """
@@ -50,8 +54,9 @@ def main():
     data_dir = os.path.join(project_root, 'data')
 
     # Define input and output file paths
-    input_file = os.path.join(data_dir, 'cleaned_df_3.csv')
-    output_file = os.path.join(data_dir, 'cleaned_df_4.csv')
+    output_format = 'parquet'  # Set to 'csv' to export the cleaned data as CSV
+    input_file = find_table(data_dir, 'cleaned_df_3')
+    output_file = table_path(data_dir, 'cleaned_df_4', output_format)
 
     # Debugging: Print the calculated paths
     print(f"Current Directory: {current_dir}")
@@ -65,10 +70,21 @@ def main():
         print(f"Error: The data directory '{data_dir}' does not exist.")
         return
 
+    sentinels = DEFAULT_SENTINELS  # Values replaced by NaN in text and categorical columns
+
+    # Skip the stage if its input and parameters did not change since the last run
+    manifest = Manifest(os.path.join(data_dir, MANIFEST_NAME))
+    params = NormalizeSentinels(sentinels).params()
+    if manifest.is_current(STAGE, [input_file], params, [output_file]):
+        print(f"{STAGE}: input and parameters unchanged since the last run. Skipping.")
+        return
+    manifest.begin_stage(STAGE, [input_file], params)
+
     # Perform the conversion
-    df_cleaned_4 = convert_unknown_to_nan(input_file, output_file)
+    df_cleaned_4 = convert_unknown_to_nan(input_file, output_file, sentinels=sentinels)
 
     if df_cleaned_4 is not None:
+        manifest.complete_stage(STAGE, [output_file])
         print("Conversion completed successfully.")
     else:
         print("Conversion failed.")
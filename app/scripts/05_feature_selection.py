@@ -3,18 +3,24 @@
 import pandas as pd
 import os
 
-def load_data(file_path):
+from pipeline_io import find_table, read_columns, read_table, table_path, write_table
+from pipeline_manifest import MANIFEST_NAME, Manifest
+
+STAGE = '05_feature_selection'
+
+def load_data(file_path, columns=None):
     """
-    Loads the cleaned DataFrame from a CSV file.
+    Loads the cleaned DataFrame from a Parquet or CSV file.
 
     Parameters:
-        file_path (str): Path to the cleaned CSV file.
+        file_path (str): Path to the cleaned file.
+        columns (list): Columns to load (default: all). With Parquet only these columns are read from disk.
 
     Returns:
         pd.DataFrame: Loaded DataFrame.
     """
     try:
-        df = pd.read_csv(file_path)
+        df = read_table(file_path, columns=columns)
         print(f"Data loaded successfully from {file_path}.")
         return df
     except FileNotFoundError:
@@ -130,18 +136,19 @@ def save_column_lists(keep_cols, remove_cols, doubt_cols, output_dir):
     df_doubt.to_csv(doubt_path, index=False)
     print(f"Columns with doubt saved to {doubt_path}.")
 
-def save_selected_features(df, keep_cols, output_dir):
+def save_selected_features(df, keep_cols, output_dir, output_format='parquet'):
     """
-    Saves the DataFrame with only the selected columns to a new CSV file.
+    Saves the DataFrame with only the selected columns to a new file.
 
     Parameters:
         df (pd.DataFrame): The original DataFrame.
         keep_cols (list): Columns to keep.
-        output_dir (str): Directory where the CSV will be saved.
+        output_dir (str): Directory where the file will be saved.
+        output_format (str): 'parquet' (default) or 'csv' to export CSV.
     """
     df_selected = df[keep_cols].copy()
-    selected_features_path = os.path.join(output_dir, 'selected_features.csv')
-    df_selected.to_csv(selected_features_path, index=False)
+    selected_features_path = table_path(output_dir, 'selected_features', output_format)
+    write_table(df_selected, selected_features_path)
     print(f"Selected features saved to {selected_features_path}.")
 
 def main():
@@ -150,20 +157,34 @@ def main():
     """
     # Define file paths
     current_dir = os.path.dirname(os.path.abspath(__file__))
-    input_file = os.path.join(current_dir, '..', 'data', 'cleaned_df_4.csv')
     output_directory = os.path.join(current_dir, '..', 'data')
+    input_file = find_table(output_directory, 'cleaned_df_4')
+    output_format = 'parquet'  # Set to 'csv' to export the selected features as CSV
+    outputs = [table_path(output_directory, 'selected_features', output_format)] + [
+        os.path.join(output_directory, name)
+        for name in ('columns_to_keep.csv', 'columns_to_remove.csv', 'columns_with_doubt.csv')
+    ]
+
+    # Skip the stage if its input and parameters did not change since the last run
+    manifest = Manifest(os.path.join(output_directory, MANIFEST_NAME))
+    params = {'output_format': output_format}
+    if manifest.is_current(STAGE, [input_file], params, outputs):
+        print(f"{STAGE}: input and parameters unchanged since the last run. Skipping.")
+        return
+    manifest.begin_stage(STAGE, [input_file], params)
 
-    # Load data
-    df = load_data(input_file)
+    # Define column lists from the header only
+    keep_cols, remove_cols, doubt_cols = define_column_lists(pd.DataFrame(columns=read_columns(input_file)))
 
-    # Define column lists
-    keep_cols, remove_cols, doubt_cols = define_column_lists(df)
+    # Load only the columns to keep
+    df = load_data(input_file, columns=keep_cols)
 
     # Save column lists as CSVs
     save_column_lists(keep_cols, remove_cols, doubt_cols, output_directory)
 
-    # Save the selected features as a new CSV
-    save_selected_features(df, keep_cols, output_directory)
+    # Save the selected features
+    save_selected_features(df, keep_cols, output_directory, output_format)
+    manifest.complete_stage(STAGE, outputs)
 
 if __name__ == "__main__":
     main()
@@ -1,24 +1,44 @@
 # Filename: process_and_save_cleaned_df.py
 
-import pandas as pd
-import numpy as np
 import os
 
-def process_and_save_cleaned_df(input_file, output_file):
+from pipeline_io import TableWriter, find_table, iter_table, table_path
+from pipeline_manifest import MANIFEST_NAME, Manifest
+from pipeline_stages import NonNullCounter
+from streaming_dedup import StreamingDeduplicator
+
+STAGE = '06_process_and_save_cleaned_df'
+
+def process_and_save_cleaned_df(input_file, output_file, chunk_size=50000, nan_threshold=0.3):
     """
-    Process the cleaned DataFrame by performing additional cleaning steps and saving it to a new CSV.
+    Process the cleaned DataFrame by performing additional cleaning steps and saving it to a new file.
+    
+    The input is streamed twice, chunk by chunk, so the whole table is never loaded:
+    the first pass counts the non-null values of every column (Step 1), the second
+    reads only the kept columns and applies Steps 2 to 4 before appending each chunk
+    to the output.
+    
+    Step 3 remembers the 64-bit hash of each 'brands'/'product_name' pair instead of
+    the pair itself (see streaming_dedup.py). Two distinct products whose hashes
+    collide across chunks are not told apart, and the later one is dropped as a
+    duplicate. This loss is accepted: for the ~3 million products of the dump the
+    probability of any collision is below 1e-6, and it is printed with Step 3.
     
     Args:
-    - input_file (str): Path to the cleaned CSV file (cleaned_df.csv).
-    - output_file (str): Path to save the newly cleaned CSV file (cleaned_df_2.csv).
+    - input_file (str): Path to the cleaned file (cleaned_df.parquet or .csv).
+    - output_file (str): Path to save the newly cleaned file (cleaned_df_2.parquet, or .csv to export CSV).
+    - chunk_size (int): Number of rows read at a time (default is 50,000 rows).
+    - nan_threshold (float): Minimum proportion of non-null values to keep a column (default is 0.3).
     
     Returns:
-    - pd.DataFrame: The DataFrame after the second cleaning process.
+    - TableWriter: The written table (its shape and first rows), or None on error.
     """
+    # Pass 1: Count the non-null values of every column
+    counter = NonNullCounter()
     try:
-        # Load the CSV with low_memory=False to suppress dtype warnings
-        df = pd.read_csv(input_file, low_memory=False)
-        print(f"Data loaded successfully from {input_file}.")
+        for chunk in iter_table(input_file, chunk_size=chunk_size):
+            counter.update(chunk)
+        print(f"Data scanned successfully from {input_file} ({counter.rows} rows).")
     except FileNotFoundError:
         print(f"Error: The file '{input_file}' does not exist. Please check the path.")
         return
@@ -27,10 +47,8 @@ def process_and_save_cleaned_df(input_file, output_file):
         return
     
     # Step 1: Drop columns with more than 70% missing values
-    threshold = len(df) * 0.3  # Keep columns with at least 30% non-null values
-    initial_columns = df.shape[1]
-    df_cleaned_2 = df.dropna(axis=1, thresh=threshold)
-    removed_columns_step1 = initial_columns - df_cleaned_2.shape[1]
+    kept_columns = counter.columns_above(nan_threshold)  # Keep columns with at least 30% non-null values
+    removed_columns_step1 = len(counter.counts) - len(kept_columns)
     print(f"Step 1: Dropped {removed_columns_step1} columns with more than 70% missing values.")
     
     # Step 2: Drop rows where all nutrient columns are NaN
@@ -39,34 +57,42 @@ def process_and_save_cleaned_df(input_file, output_file):
         'sugars_100g', 'fiber_100g', 'proteins_100g', 'salt_100g', 'sodium_100g'
     ]
     # Check if nutrient columns exist in the DataFrame
-    existing_nutrient_columns = [col for col in nutrient_columns if col in df_cleaned_2.columns]
-    df_cleaned_2 = df_cleaned_2.dropna(subset=existing_nutrient_columns, how='all')
-    print(f"Step 2: Dropped rows where all nutrient columns {existing_nutrient_columns} are NaN.")
-    
-    # Step 3: Remove duplicates based on 'brands' and 'product_name'
-    if 'brands' in df_cleaned_2.columns and 'product_name' in df_cleaned_2.columns:
-        before_duplicates = df_cleaned_2.shape[0]
-        df_cleaned_2 = df_cleaned_2.drop_duplicates(subset=['brands', 'product_name'])
-        after_duplicates = df_cleaned_2.shape[0]
-        duplicates_removed = before_duplicates - after_duplicates
-        print(f"Step 3: Removed {duplicates_removed} duplicate rows based on 'brands' and 'product_name'.")
-    else:
-        print("Step 3: Columns 'brands' and/or 'product_name' not found. Skipping duplicate removal.")
+    existing_nutrient_columns = [col for col in nutrient_columns if col in kept_columns]
+    
+    # Step 3: Remove duplicates based on 'brands' and 'product_name' (exact keys, as drop_duplicates)
+    dedup = 'brands' in kept_columns and 'product_name' in kept_columns
+    deduplicator = StreamingDeduplicator(['brands', 'product_name'], normalize=False)
     
     # Step 4: Remove redundant columns that end with '_tags' or '_en'
-    redundant_columns = [col for col in df_cleaned_2.columns if col.endswith('_tags') or col.endswith('_en')]
-    df_cleaned_2 = df_cleaned_2.drop(columns=redundant_columns, errors='ignore')
-    print(f"Step 4: Removed {len(redundant_columns)} redundant columns ending with '_tags' or '_en'.")
+    redundant_columns = [col for col in kept_columns if col.endswith('_tags') or col.endswith('_en')]
+    projected_columns = [col for col in kept_columns if col not in redundant_columns]
     
+    # Pass 2: Read only the kept columns and clean each chunk
+    rows_before_dedup = 0
     try:
-        # Save the cleaned DataFrame to a new CSV file
-        df_cleaned_2.to_csv(output_file, index=False)
+        with TableWriter(output_file) as writer:
+            for chunk in iter_table(input_file, columns=projected_columns, chunk_size=chunk_size):
+                if existing_nutrient_columns:
+                    chunk = chunk.dropna(subset=existing_nutrient_columns, how='all')
+                rows_before_dedup += len(chunk)
+                if dedup:
+                    chunk = deduplicator(chunk)
+                if not chunk.empty:
+                    writer.write(chunk)
         print(f"Cleaned DataFrame saved successfully to {output_file}.")
     except Exception as e:
         print(f"An error occurred while saving the cleaned data: {e}")
         return
     
-    return df_cleaned_2
+    print(f"Step 2: Dropped {counter.rows - rows_before_dedup} rows where all nutrient columns {existing_nutrient_columns} are NaN.")
+    if dedup:
+        print(f"Step 3: Removed {deduplicator.duplicates} duplicate rows based on 'brands' and 'product_name' "
+              f"(hash collision probability <= {deduplicator.collision_probability():.2e}).")
+    else:
+        print("Step 3: Columns 'brands' and/or 'product_name' not found. Skipping duplicate removal.")
+    print(f"Step 4: Removed {len(redundant_columns)} redundant columns ending with '_tags' or '_en'.")
+    
+    return writer
 
 def main():
     """
@@ -78,8 +104,9 @@ def main():
     data_dir = os.path.join(project_root, 'data')
     
     # Define input and output file paths
-    input_file = os.path.join(data_dir, 'cleaned_df.csv')
-    output_file = os.path.join(data_dir, 'cleaned_df_2.csv')
+    output_format = 'parquet'  # Set to 'csv' to export the cleaned data as CSV
+    input_file = find_table(data_dir, 'cleaned_df')
+    output_file = table_path(data_dir, 'cleaned_df_2', output_format)
     
     # Debugging: Print the calculated paths
     print(f"Current Directory: {current_dir}")
@@ -98,14 +125,23 @@ def main():
         print(f"Error: The input file '{input_file}' does not exist. Please check the path.")
         return
     
+    # Skip the stage if its input and parameters did not change since the last run
+    manifest = Manifest(os.path.join(data_dir, MANIFEST_NAME))
+    params = {'nan_threshold': 0.3}
+    if manifest.is_current(STAGE, [input_file], params, [output_file]):
+        print(f"{STAGE}: input and parameters unchanged since the last run. Skipping.")
+        return
+    manifest.begin_stage(STAGE, [input_file], params)
+    
     # Process and save the second cleaned DataFrame
-    df_cleaned_2 = process_and_save_cleaned_df(input_file, output_file)
+    df_cleaned_2 = process_and_save_cleaned_df(input_file, output_file, nan_threshold=params['nan_threshold'])
     
     if df_cleaned_2 is not None:
+        manifest.complete_stage(STAGE, [output_file])
         print("DataFrame processing completed successfully.")
         print(f"Second Cleaned DataFrame Shape: {df_cleaned_2.shape}")
         print("Preview of the Second Cleaned DataFrame:")
-        print(df_cleaned_2.head())
+        print(df_cleaned_2.head)
     else:
         print("DataFrame processing failed.")
 
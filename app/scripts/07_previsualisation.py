@@ -1,6 +1,8 @@
-import pandas as pd
 import os
 
+from dataset_profiler import DatasetProfiler, save_html_report, save_json_report
+from pipeline_io import is_table_file, read_table
+
 def previsualisation(df, num_rows=5):
     """
     Function to display a clear and structured preview of a DataFrame.
@@ -49,17 +51,17 @@ def previsualisation(df, num_rows=5):
 
 def process_all_chunks_in_folder(folder_path, sep='\t'):
     """
-    Loop over all CSV files in a folder and apply the previsualisation function on each.
+    Loop over all Parquet/CSV files in a folder and apply the previsualisation function on each.
     
     Args:
-    - folder_path (str): Path to the folder containing CSV chunks.
+    - folder_path (str): Path to the folder containing the chunks.
     - sep (str): Separator used in the CSV files (default: '\t').
     """
-    # List all CSV files in the folder
-    files = [f for f in os.listdir(folder_path) if f.endswith('.csv')]
+    # List all chunk files in the folder
+    files = [f for f in os.listdir(folder_path) if is_table_file(f)]
     
     if not files:
-        print(f"No CSV files found in the folder: {folder_path}")
+        print(f"No Parquet or CSV files found in the folder: {folder_path}")
         return
     
     # Loop through each file and apply previsualisation
@@ -67,24 +69,62 @@ def process_all_chunks_in_folder(folder_path, sep='\t'):
         file_path = os.path.join(folder_path, file)
         print(f"\nProcessing file: {file}")
         
-        # Read the CSV file
+        # Read the chunk
         try:
-            df = pd.read_csv(file_path, sep=sep, on_bad_lines='skip', low_memory=False)
+            df = read_table(file_path, sep=sep, on_bad_lines='skip')
             # Call the previsualisation function
             previsualisation(df)
         except Exception as e:
             print(f"Error processing file {file}: {e}")
 
 
+def profile_all_chunks_in_folder(folder_path, report_dir, sep='\t'):
+    """
+    Profiles all the chunks of a folder in one streaming pass (one chunk in memory at a time)
+    and saves the report as JSON and HTML.
+    
+    Args:
+    - folder_path (str): Path to the folder containing the chunks.
+    - report_dir (str): Folder where chunks_profile.json and chunks_profile.html are saved.
+    - sep (str): Separator used in the CSV files (default: '\t').
+    
+    Returns:
+    - dict: The profile report, or None if no chunk was found.
+    """
+    files = sorted(f for f in os.listdir(folder_path) if is_table_file(f))
+    if not files:
+        print(f"No Parquet or CSV files found in the folder: {folder_path}")
+        return
+    
+    profiler = DatasetProfiler()
+    for file in files:
+        try:
+            profiler.update(read_table(os.path.join(folder_path, file), sep=sep, on_bad_lines='skip'))
+            print(f"Profiled {file} ({profiler.rows} rows so far).")
+        except Exception as e:
+            print(f"Error processing file {file}: {e}")
+    
+    report = profiler.report(source=folder_path)
+    os.makedirs(report_dir, exist_ok=True)
+    json_path = os.path.join(report_dir, 'chunks_profile.json')
+    html_path = os.path.join(report_dir, 'chunks_profile.html')
+    save_json_report(report, json_path)
+    save_html_report(report, html_path)
+    print(f"Profile of {report['rows']} rows and {len(report['columns'])} columns saved to {json_path} and {html_path}.")
+    return report
+
+
 def main():
     """
-    Main function to execute the previsualisation on all CSV chunks in a specified folder.
+    Main function to profile all the chunks in a specified folder.
     """
     # Define the path to the data directory relative to this script
     current_dir = os.path.dirname(os.path.abspath(__file__))
     project_root = os.path.abspath(os.path.join(current_dir, '..', '..'))  # Navigate up to project root
     data_dir = os.path.join(project_root, 'data')
     input_folder = os.path.join(data_dir, 'big', 'output_chunks')
+    report_dir = os.path.join(data_dir, 'reports')
+    full_preview = False  # Set to True to also print the in-memory preview of every chunk
     
     # Define separator
     sep = '\t'  # Modify if your CSVs use a different separator
@@ -106,8 +146,11 @@ def main():
         print(f"Error: The input folder '{input_folder}' does not exist. Please check the path.")
         return
     
-    # Process all chunks in the input folder
-    process_all_chunks_in_folder(input_folder, sep=sep)
+    # Profile all chunks in the input folder in one streaming pass
+    profile_all_chunks_in_folder(input_folder, report_dir, sep=sep)
+    
+    if full_preview:
+        process_all_chunks_in_folder(input_folder, sep=sep)
 
 
 if __name__ == "__main__":
@@ -4,6 +4,9 @@ import pandas as pd
 from IPython.display import display
 import os
 
+from dataset_profiler import DatasetProfiler, save_html_report, save_json_report
+from pipeline_io import find_table, iter_table, read_table
+
 def comprehensive_dataframe_overview(df):
     """
     Provides a comprehensive overview of the given DataFrame, including:
@@ -50,23 +53,70 @@ def comprehensive_dataframe_overview(df):
         print(f"Unique values in '{col}' (showing up to 5): {unique_vals[:display_count]}")
         print(f"Total unique values in '{col}': {unique_count}\n")
 
+def profile_table(file_path, report_dir, chunk_size=50000):
+    """
+    Profiles a table in one streaming pass, chunk by chunk, and saves the report
+    as JSON and HTML (<table name>_profile.json / .html).
+    
+    Covers the same ground as comprehensive_dataframe_overview (counts, missing values,
+    numeric summary, distinct and example values) in bounded memory; quantiles and
+    distinct counts are approximate.
+    
+    Args:
+    - file_path (str): Path to the Parquet or CSV table.
+    - report_dir (str): Folder where the reports are saved.
+    - chunk_size (int): Number of rows read at a time (default is 50,000 rows).
+    
+    Returns:
+    - dict: The profile report.
+    """
+    profiler = DatasetProfiler()
+    for chunk in iter_table(file_path, chunk_size=chunk_size):
+        profiler.update(chunk)
+    report = profiler.report(source=file_path)
+    
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    os.makedirs(report_dir, exist_ok=True)
+    json_path = os.path.join(report_dir, f"{name}_profile.json")
+    html_path = os.path.join(report_dir, f"{name}_profile.html")
+    save_json_report(report, json_path)
+    save_html_report(report, html_path)
+    print(f"Profile of {report['rows']} rows and {len(report['columns'])} columns saved to {json_path} and {html_path}.")
+    
+    print("\n### Missing Values in Each Column ###")
+    for col, profile in report['columns'].items():
+        print(f"{col}: {profile['null_count']} ({profile['null_percentage'] or 0:.1f}%), ~{profile['approx_distinct']} distinct values")
+    return report
+
 def main():
     """
-    Main function to load the DataFrame and run the comprehensive overview.
+    Main function to profile the cleaned table (and optionally run the in-memory overview).
     """
-    # Define the path to the cleaned CSV file relative to this script
+    # Define the path to the cleaned file (Parquet, or CSV if exported) relative to this script
     current_dir = os.path.dirname(os.path.abspath(__file__))
     data_dir = os.path.join(current_dir, '..', '..', 'data')
-    file_path = os.path.join(data_dir, 'cleaned_df_4.csv')
+    file_path = find_table(data_dir, 'cleaned_df_4')
+    report_dir = os.path.join(data_dir, 'reports')
+    full_overview = False  # Set to True to also load the table and print the in-memory overview
     
     # Check if the file exists
     if not os.path.exists(file_path):
         print(f"Error: The file '{file_path}' does not exist. Please check the path.")
         return
     
-    # Load the cleaned CSV
+    # Profile the cleaned data in one streaming pass
+    try:
+        profile_table(file_path, report_dir)
+    except Exception as e:
+        print(f"An error occurred while profiling the data: {e}")
+        return
+    
+    if not full_overview:
+        return
+    
+    # Load the cleaned data
     try:
-        cleaned_df_4 = pd.read_csv(file_path)
+        cleaned_df_4 = read_table(file_path)
         print(f"Data loaded successfully from {file_path}.")
     except Exception as e:
         print(f"An error occurred while loading the data: {e}")
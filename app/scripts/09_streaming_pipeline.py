@@ -0,0 +1,170 @@
+# Filename: streaming_pipeline.py
+
+import pandas as pd
+import os
+import tempfile
+
+from compressed_io import find_input, open_input
+from pipeline_stages import (
+    DEDUP_SUBSET, FEATURE_COLUMNS, METADATA_COLUMNS, NUTRIENT_COLUMNS,
+    DropColumns, DropDuplicates, DropEmptyRows, GlobalDropDuplicates, GradeFilter,
+    NonNullCounter, NormalizeSentinels, SelectColumns,
+    apply_stages, is_nutrient_column, is_redundant_column
+)
+from pipeline_io import TableWriter, iter_table, table_path
+from pipeline_schema import raw_read_options
+
+def run_streaming_pipeline(input_file, output_file, chunk_size=50000, sep='\t', nan_threshold=0.3):
+    """
+    Runs the cleaning done by scripts 01, 02, 06, 03, 04 and 05 in one streaming pass
+    over the raw Open Food Facts dump, without the intermediate files of every script.
+
+    Stages applied to every chunk of the raw file, as in 02_process_and_clean_csv_chunks.py:
+    - Keep rows with a valid 'nutriscore_grade'
+    - Drop rows where all '_100g' columns are NaN
+    - Drop duplicates on 'brands'/'product_name' within the chunk
+    - Drop redundant ('_tags', '_en') and metadata columns, keep the feature columns
+
+    The cleaned chunks are appended to a temporary Parquet file. Once the
+    non-null counts of every column are known (the 30% threshold of 02 Step 7
+    and 06 Step 1), that file is read back chunk by chunk, and each chunk goes
+    through the following stages before being appended to the output:
+    - Drop rows where all nutrient columns of 06 Step 2 are NaN
+    - Drop duplicates on 'brands'/'product_name' across all chunks (06 Step 3)
+    - Replace sentinel values ('unknown', 'not-applicable', '', 'en:unknown') of text columns with NaN (04)
+    - Select the columns kept by 05_feature_selection.py
+
+    Chunks are read in file order, so duplicates keep their first occurrence in
+    the dump. Only the columns declared in pipeline_schema are parsed, and only
+    the feature and dedup columns of cleaned rows are written to the temporary
+    file, so the memory used is bounded by the chunk size (plus the dedup keys).
+
+    Args:
+    - input_file (str): Path to the raw Open Food Facts TSV dump (.csv, or .gz / .zst decompressed on the fly).
+    - output_file (str): Path to save the selected features (.parquet, or .csv to export CSV).
+    - chunk_size (int): Number of rows per chunk (default is 50,000 rows, as in 01).
+    - sep (str): Separator of the raw dump (default is tab '\t').
+    - nan_threshold (float): Minimum proportion of non-null values to keep a column (default is 0.3).
+
+    Returns:
+    - TableWriter: The written table (its shape and first rows), or None if the input
+      could not be read or no data was left.
+    """
+    try:
+        read_options = raw_read_options(input_file, sep=sep)
+        # Compressed input is decompressed by a separate process or thread while the chunks are parsed
+        input_handle = open_input(input_file)
+        chunk_iter = pd.read_csv(
+            input_handle,
+            chunksize=chunk_size,
+            on_bad_lines='skip',
+            sep=sep,
+            low_memory=False,
+            **read_options
+        )
+        print(f"Started streaming '{input_file}' in chunks of {chunk_size} rows.")
+    except FileNotFoundError:
+        print(f"Error: The input file '{input_file}' does not exist. Please check the path.")
+        return
+    except Exception as e:
+        print(f"An unexpected error occurred while reading '{input_file}': {e}")
+        return
+
+    # First pass over the raw dump: per-chunk cleaning and non-null counts
+    chunk_stages = [
+        GradeFilter(),
+        DropEmptyRows(is_nutrient_column),
+        DropDuplicates(DEDUP_SUBSET),
+        DropColumns(is_redundant_column),
+        DropColumns(METADATA_COLUMNS),
+        SelectColumns(FEATURE_COLUMNS + DEDUP_SUBSET),
+    ]
+    counter = NonNullCounter()
+    with tempfile.TemporaryDirectory(prefix='streaming_pipeline_') as tmp_dir:
+        cleaned_path = os.path.join(tmp_dir, 'cleaned.parquet')
+        with input_handle, chunk_iter, TableWriter(cleaned_path) as cleaned_writer:
+            for i, chunk in enumerate(chunk_iter):
+                cleaned = apply_stages(chunk, chunk_stages)
+                counter.update(cleaned)
+                if not cleaned.empty:
+                    cleaned_writer.write(cleaned)
+                print(f"Chunk {i + 1}: kept {len(cleaned)} of {len(chunk)} rows.")
+
+        for stage in chunk_stages:
+            print(stage.report())
+
+        if cleaned_writer.rows == 0:
+            print("No valid data found in the input file.")
+            return None
+
+        # Columns with at least nan_threshold non-null values survive 02 Step 7 / 06 Step 1
+        kept_columns = counter.columns_above(nan_threshold)
+        dropped = [col for col in counter.counts if col not in kept_columns]
+        print(f"Dropped {len(dropped)} columns with more than {(1 - nan_threshold) * 100}% NaN values: {dropped}")
+
+        read_columns = [col for col in FEATURE_COLUMNS + DEDUP_SUBSET if col in kept_columns]
+        final_stages = [
+            DropEmptyRows([col for col in NUTRIENT_COLUMNS if col in kept_columns]),
+            # Exact keys, as drop_duplicates in 06 Step 3
+            GlobalDropDuplicates(DEDUP_SUBSET, normalize=False),
+            NormalizeSentinels(),
+            SelectColumns(FEATURE_COLUMNS),
+        ]
+        # Second pass over the cleaned rows: each finished chunk is appended to the output
+        try:
+            with TableWriter(output_file) as writer:
+                for chunk in iter_table(cleaned_path, columns=read_columns, chunk_size=chunk_size):
+                    selected = apply_stages(chunk, final_stages)
+                    if not selected.empty:
+                        writer.write(selected)
+        except Exception as e:
+            print(f"An error occurred while saving the selected features: {e}")
+            return None
+
+    for stage in final_stages:
+        print(stage.report())
+    if writer.rows == 0:
+        print("No data left after the final stages.")
+        return None
+    print(f"Selected features saved to {output_file}.")
+    return writer
+
+
+def main():
+    """
+    Main function to execute the streaming pipeline on the raw dump.
+    """
+    # Define the path to the data directory relative to this script
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.abspath(os.path.join(current_dir, '..', '..'))  # Navigate up to project root
+    data_dir = os.path.join(project_root, 'data')
+
+    # Define input and output file paths
+    output_format = 'parquet'  # Set to 'csv' to export the selected features as CSV
+    input_file = find_input(os.path.join(data_dir, 'big', 'big.csv'))  # Or the published big.csv.gz / .zst
+    output_file = table_path(data_dir, 'selected_features', output_format)
+
+    # Debugging: Print the calculated paths
+    print(f"Current Directory: {current_dir}")
+    print(f"Project Root: {project_root}")
+    print(f"Data Directory: {data_dir}")
+    print(f"Input File Path: {input_file}")
+    print(f"Output File Path: {output_file}")
+
+    # Check if the input file exists
+    if not os.path.isfile(input_file):
+        print(f"Error: The input file '{input_file}' does not exist. Please check the path.")
+        return
+
+    writer = run_streaming_pipeline(input_file, output_file)
+
+    if writer is not None:
+        print("Streaming pipeline completed successfully.")
+        print(f"Selected Features Shape: {writer.shape}")
+        print(writer.head)
+    else:
+        print("Streaming pipeline produced no data.")
+
+
+if __name__ == "__main__":
+    main()
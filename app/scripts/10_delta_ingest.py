@@ -0,0 +1,264 @@
+# Filename: delta_ingest.py
+
+import pandas as pd
+import os
+import sqlite3
+import time
+
+from compressed_io import find_input, open_input
+from pipeline_io import TableWriter, table_path
+from pipeline_schema import KEY_COLUMNS, raw_read_options
+from pipeline_stages import (
+    FEATURE_COLUMNS, NUTRIENT_COLUMNS,
+    DropEmptyRows, GradeFilter, NormalizeSentinels, SelectColumns,
+    apply_stages, is_nutrient_column
+)
+
+def open_store(store_path):
+    """
+    Opens (and creates if needed) the local product store.
+
+    The 'products' table is keyed by the product code (primary key, so lookups
+    by code use its index) and keeps the last modification time of each product,
+    whether its row passes the cleaning steps, and its features. 'ingest_runs'
+    keeps one row per ingestion.
+
+    Args:
+    - store_path (str): Path to the SQLite database file.
+
+    Returns:
+    - sqlite3.Connection: Connection to the store.
+    """
+    conn = sqlite3.connect(store_path)
+    feature_columns = ", ".join(f'"{col}"' for col in FEATURE_COLUMNS)
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS products ("
+        f"code TEXT PRIMARY KEY, last_modified_t INTEGER, valid INTEGER NOT NULL, run_id INTEGER, "
+        f"{feature_columns})"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS products_last_modified_t ON products (last_modified_t)")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS ingest_runs ("
+        "run_id INTEGER PRIMARY KEY AUTOINCREMENT, source TEXT, started_at REAL, finished_at REAL, "
+        "rows_read INTEGER, new_products INTEGER, updated_products INTEGER, invalid_products INTEGER, delta_file TEXT)"
+    )
+    conn.commit()
+    return conn
+
+def stored_timestamps(conn, codes):
+    """
+    Returns the stored last_modified_t of the given product codes that are already in the store.
+
+    Args:
+    - conn (sqlite3.Connection): Connection to the store.
+    - codes (list): Product codes of the current chunk.
+
+    Returns:
+    - dict: Mapping code -> last_modified_t.
+    """
+    # Join against a temporary table of the chunk codes, using the primary key index of 'products'
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS chunk_codes (code TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM chunk_codes")
+    conn.executemany("INSERT OR IGNORE INTO chunk_codes (code) VALUES (?)", ((code,) for code in codes))
+    rows = conn.execute(
+        "SELECT p.code, p.last_modified_t FROM products p JOIN chunk_codes c ON p.code = c.code"
+    ).fetchall()
+    return dict(rows)
+
+def to_records(df, columns):
+    """Converts DataFrame rows to tuples of plain Python values (NaN -> None) for sqlite3."""
+    values = df[columns].astype(object)
+    values = values.where(values.notna(), None)
+    return list(values.itertuples(index=False, name=None))
+
+def delta_ingest(input_file, store_path, delta_file, chunk_size=50000, sep='\t'):
+    """
+    Applies the products of an Open Food Facts dump (full dump or delta export) that are
+    new or changed since the last run to the local store, and writes them to a delta
+    feature file for retraining.
+
+    A product is new if its code is not in the store, and changed if its last_modified_t
+    is more recent than the stored one; every other row is skipped without further work.
+    New and changed rows go through the row-level cleaning of the pipeline:
+    - Keep rows with a valid 'nutriscore_grade' (02 Step 3)
+    - Drop rows where all '_100g' columns are NaN (02 Step 4) or all nutrient columns of 06 Step 2 are NaN
+    - Replace sentinel values ('unknown', 'not-applicable', '', 'en:unknown') of text columns with NaN (04)
+    - Keep the columns selected by 05_feature_selection.py
+    Products failing the cleaning are kept in the store as invalid (so they are not
+    reprocessed until they change again) and are not written to the delta file.
+
+    The store is updated in one transaction, committed only once the delta file is
+    complete: if the run fails or is killed, no product is recorded as ingested, and
+    the next run selects them again (a delta file may then repeat some products, but
+    none is lost). A failed run keeps finished_at empty in 'ingest_runs'.
+
+    Unlike the batch pipeline, products are identified by their code, so there is no
+    deduplication on 'brands'/'product_name', and the 30% non-null column threshold
+    (a property of the full dataset) is not applied.
+
+    Args:
+    - input_file (str): Path to the Open Food Facts TSV dump or delta export (.gz / .zst decompressed on the fly).
+    - store_path (str): Path to the SQLite product store.
+    - delta_file (str): Path to save the new and changed products (.parquet, or .csv to export CSV).
+    - chunk_size (int): Number of rows per chunk (default is 50,000 rows).
+    - sep (str): Separator of the dump (default is tab '\t').
+
+    Returns:
+    - dict: Statistics of the run, or None if the input could not be read.
+    """
+    try:
+        read_options = raw_read_options(input_file, sep=sep, extra_columns=KEY_COLUMNS)
+        missing_keys = [col for col in KEY_COLUMNS if col not in read_options['usecols']]
+        if missing_keys:
+            print(f"Error: The input file '{input_file}' has no {missing_keys} columns, which delta ingestion needs.")
+            return
+        # Compressed input is decompressed by a separate process or thread while the chunks are parsed
+        input_handle = open_input(input_file)
+        chunk_iter = pd.read_csv(
+            input_handle,
+            chunksize=chunk_size,
+            on_bad_lines='skip',
+            sep=sep,
+            low_memory=False,
+            **read_options
+        )
+        print(f"Started reading '{input_file}' in chunks of {chunk_size} rows.")
+    except FileNotFoundError:
+        print(f"Error: The input file '{input_file}' does not exist. Please check the path.")
+        return
+    except Exception as e:
+        print(f"An unexpected error occurred while reading '{input_file}': {e}")
+        return
+
+    conn = open_store(store_path)
+    started_at = time.time()
+    run_id = conn.execute(
+        "INSERT INTO ingest_runs (source, started_at) VALUES (?, ?)", (os.path.abspath(input_file), started_at)
+    ).lastrowid
+    conn.commit()
+
+    stats = {'rows_read': 0, 'new_products': 0, 'updated_products': 0, 'unchanged_rows': 0, 'invalid_products': 0}
+    cleaning_stages = [
+        GradeFilter(),
+        DropEmptyRows(is_nutrient_column),
+        DropEmptyRows(NUTRIENT_COLUMNS),
+        NormalizeSentinels(),
+    ]
+    store_columns = ['code', 'last_modified_t', 'valid', 'run_id'] + FEATURE_COLUMNS
+    quoted_columns = ", ".join(f'"{col}"' for col in store_columns)
+    upsert = (
+        f"INSERT INTO products ({quoted_columns}) VALUES ({', '.join('?' for _ in store_columns)}) "
+        f"ON CONFLICT(code) DO UPDATE SET "
+        + ", ".join(f'"{col}" = excluded."{col}"' for col in store_columns[1:])
+    )
+
+    try:
+        with input_handle, chunk_iter, TableWriter(delta_file) as writer:
+            for i, chunk in enumerate(chunk_iter):
+                stats['rows_read'] += len(chunk)
+                chunk = chunk.dropna(subset=['code'])
+                # Within a chunk, keep the most recent version of each product (undated versions sort first)
+                chunk = chunk.sort_values('last_modified_t', kind='stable', na_position='first') \
+                    .drop_duplicates('code', keep='last')
+
+                # Step 1: Keep products that are new or modified since they were stored
+                stored = stored_timestamps(conn, chunk['code'].tolist())
+                stored_t = chunk['code'].map(stored)
+                is_new = ~chunk['code'].isin(list(stored))
+                is_updated = ~is_new & (chunk['last_modified_t'].fillna(-1) > stored_t.fillna(-1))
+                changed = chunk[is_new | is_updated]
+                stats['new_products'] += int(is_new.sum())
+                stats['updated_products'] += int(is_updated.sum())
+                stats['unchanged_rows'] += len(chunk) - len(changed)
+                if changed.empty:
+                    print(f"Chunk {i + 1}: no new or changed products.")
+                    continue
+
+                # Step 2: Clean the changed rows like the batch pipeline
+                cleaned = apply_stages(changed, cleaning_stages)
+                valid_codes = set(cleaned['code'])
+                features = SelectColumns(KEY_COLUMNS + FEATURE_COLUMNS)(cleaned)
+
+                # Step 3: Upsert the changed products (committed at the end of the run); those failing
+                # the cleaning are stored as invalid
+                records = changed[KEY_COLUMNS].copy()
+                records['valid'] = records['code'].isin(valid_codes).astype(int)
+                records['run_id'] = run_id
+                records = records.merge(features.drop(columns=['last_modified_t']), on='code', how='left')
+                records = records.reindex(columns=store_columns)
+                conn.executemany(upsert, to_records(records, store_columns))
+                stats['invalid_products'] += len(changed) - len(valid_codes)
+
+                # Step 4: Append the valid changed products to the delta feature file
+                if not features.empty:
+                    writer.write(features.reindex(columns=KEY_COLUMNS + FEATURE_COLUMNS))
+                print(f"Chunk {i + 1}: {len(changed)} new or changed products, {len(features)} valid.")
+        # The delta file is closed: record the products and the run together
+        conn.execute(
+            "UPDATE ingest_runs SET finished_at = ?, rows_read = ?, new_products = ?, updated_products = ?, "
+            "invalid_products = ?, delta_file = ? WHERE run_id = ?",
+            (time.time(), stats['rows_read'], stats['new_products'], stats['updated_products'],
+             stats['invalid_products'], os.path.abspath(delta_file), run_id)
+        )
+        conn.commit()
+    except BaseException:
+        # Nothing of a failed run is stored, so its products are selected again next time
+        conn.rollback()
+        conn.execute("UPDATE ingest_runs SET rows_read = ? WHERE run_id = ?", (stats['rows_read'], run_id))
+        conn.commit()
+        raise
+    finally:
+        conn.close()
+
+    stats['delta_rows'] = writer.rows
+    stats['duration_s'] = time.time() - started_at
+    if writer.rows:
+        print(f"Delta features saved to {delta_file}.")
+    else:
+        print("No new or changed valid products: no delta file written.")
+    return stats
+
+def main():
+    """
+    Main function to execute the delta ingestion of the latest dump.
+    """
+    # Define the path to the data directory relative to this script
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.abspath(os.path.join(current_dir, '..', '..'))  # Navigate up to project root
+    data_dir = os.path.join(project_root, 'data')
+
+    # Define input, store and output paths
+    input_file = find_input(os.path.join(data_dir, 'big', 'big.csv'))  # Full dump or a delta export, possibly .gz / .zst
+    store_path = os.path.join(data_dir, 'products.db')
+    output_format = 'parquet'  # Set to 'csv' to export the delta as CSV
+    delta_dir = os.path.join(data_dir, 'delta')
+    delta_file = table_path(delta_dir, f"selected_features_delta_{time.strftime('%Y%m%d_%H%M%S')}", output_format)
+
+    # Debugging: Print the calculated paths
+    print(f"Current Directory: {current_dir}")
+    print(f"Project Root: {project_root}")
+    print(f"Data Directory: {data_dir}")
+    print(f"Input File Path: {input_file}")
+    print(f"Store Path: {store_path}")
+    print(f"Delta File Path: {delta_file}")
+
+    # Check if the input file exists
+    if not os.path.isfile(input_file):
+        print(f"Error: The input file '{input_file}' does not exist. Please check the path.")
+        return
+
+    os.makedirs(delta_dir, exist_ok=True)
+    stats = delta_ingest(input_file, store_path, delta_file)
+
+    if stats is not None:
+        print("Delta ingestion completed successfully.")
+        print(f"Rows read: {stats['rows_read']}, new products: {stats['new_products']}, "
+              f"updated products: {stats['updated_products']}, unchanged rows: {stats['unchanged_rows']}, "
+              f"invalid products: {stats['invalid_products']}, delta rows: {stats['delta_rows']}")
+        print(f"Duration: {stats['duration_s']:.1f} s")
+    else:
+        print("Delta ingestion failed.")
+
+
+if __name__ == "__main__":
+    main()
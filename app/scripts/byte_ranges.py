@@ -0,0 +1,153 @@
+# Filename: byte_ranges.py
+
+"""
+Splits a large delimited file into byte ranges aligned to line boundaries, so
+that the ranges can be parsed (or copied) by several worker processes.
+
+Every range starts right after a newline and ends right after one, so each
+line of the file belongs to exactly one range, and the header line is put in
+front of every range. Parsing a range with `on_bad_lines='skip'` then keeps
+and skips the same lines as one sequential parse of the whole file, since
+each line is checked against the same header on its own. This holds as long
+as no quoted field spans several lines, which is the case for the Open Food
+Facts TSV export (its text fields have no raw newlines).
+"""
+
+import io
+import os
+
+import pandas as pd
+
+from pipeline_io import write_table
+
+BLOCK_SIZE = 1 << 20
+
+
+def read_header(input_file):
+    """Returns the first line of the file (the header), newline included."""
+    with open(input_file, 'rb') as f:
+        return f.readline()
+
+
+def next_line_start(f, offset):
+    """Offset of the first line starting at or after offset (the file size if there is none)."""
+    if offset == 0:
+        return 0
+    # Start one byte early: if offset is already the start of a line, the newline before it is found
+    f.seek(offset - 1)
+    position = offset - 1
+    while True:
+        block = f.read(BLOCK_SIZE)
+        if not block:
+            return position
+        newline = block.find(b'\n')
+        if newline != -1:
+            return position + newline + 1
+        position += len(block)
+
+
+def line_aligned_ranges(input_file, range_bytes):
+    """
+    Splits the data lines of a file (header excluded) into ranges of about range_bytes bytes.
+
+    Args:
+    - input_file (str): Path to the file.
+    - range_bytes (int): Target size of each range in bytes.
+
+    Returns:
+    - list: (start, end) byte offsets; each range starts at the beginning of a line
+      and ends after a newline (or at the end of the file).
+    """
+    file_size = os.path.getsize(input_file)
+    header_size = len(read_header(input_file))
+    range_bytes = max(1, int(range_bytes))
+    boundaries = [header_size]
+    with open(input_file, 'rb') as f:
+        target = header_size + range_bytes
+        while target < file_size:
+            boundary = next_line_start(f, target)
+            if boundary >= file_size:
+                break
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+            # A line longer than range_bytes pushes the next target past it
+            target = max(target, boundary) + range_bytes
+    boundaries.append(file_size)
+    return [(start, end) for start, end in zip(boundaries[:-1], boundaries[1:]) if end > start]
+
+
+class ByteRangeReader(io.RawIOBase):
+    """
+    Read-only file object over the header followed by bytes [start, end) of a file,
+    so pd.read_csv can stream a range without loading it in memory.
+    """
+
+    def __init__(self, input_file, start, end, header):
+        super().__init__()
+        self._file = open(input_file, 'rb')
+        self._file.seek(start)
+        self._remaining = end - start
+        self._header = header
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._header:
+            n = min(len(buffer), len(self._header))
+            buffer[:n] = self._header[:n]
+            self._header = self._header[n:]
+            return n
+        if self._remaining <= 0:
+            return 0
+        data = self._file.read(min(len(buffer), self._remaining))
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def parse_range(input_file, start, end, header, output_file, sep='\t', read_options=None):
+    """
+    Parses one byte range of the file (with the header in front) and saves it as a table.
+    Runs in a worker process, so it only takes picklable arguments.
+
+    Args:
+    - input_file (str): Path to the delimited file.
+    - start, end (int): Byte range of the lines to parse.
+    - header (bytes): Header line of the file.
+    - output_file (str): Path of the output table (.parquet or .csv).
+    - sep (str): Separator used in the file (default is tab '\t').
+    - read_options (dict): `usecols` and `dtype` arguments of pd.read_csv (see pipeline_schema.raw_read_options).
+
+    Returns:
+    - int: Number of rows saved.
+    """
+    with io.BufferedReader(ByteRangeReader(input_file, start, end, header), BLOCK_SIZE) as f:
+        df = pd.read_csv(f, sep=sep, on_bad_lines='skip', low_memory=False, **(read_options or {}))
+    write_table(df, output_file, sep=sep)
+    return len(df)
+
+
+def copy_range(input_file, start, end, header, output_file):
+    """
+    Copies one byte range of the file to output_file with the header in front, without parsing it.
+    Bad lines are copied as they are; they are skipped when the chunk is parsed.
+
+    Returns:
+    - int: Number of bytes written.
+    """
+    with open(input_file, 'rb') as src, open(output_file, 'wb') as dst:
+        dst.write(header)
+        src.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = src.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            dst.write(block)
+            remaining -= len(block)
+    return len(header) + end - start
@@ -0,0 +1,164 @@
+# Filename: compressed_io.py
+
+"""
+Streaming reads of the compressed Open Food Facts dump (.gz or .zst).
+
+The dump is published gzip-compressed. Instead of decompressing it to disk
+first, open_input returns a file object that pd.read_csv can read directly,
+while the decompression runs in parallel with the parsing:
+- in a separate process (pigz, gzip or zstd command) when one is installed,
+- otherwise in a thread (gzip module, or the zstandard package for .zst),
+  writing to a pipe; zlib and zstd release the GIL while decompressing.
+
+Uncompressed files are opened as regular binary files. Decompressed streams
+are wrapped in an io.BufferedReader, so the small reads of readline and of
+the CSV parser are served from a buffer instead of one pipe read each.
+"""
+
+import gzip
+import io
+import os
+import shutil
+import subprocess
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP = 'gzip'
+ZSTD = 'zstd'
+COMPRESSION_SUFFIXES = {GZIP: '.gz', ZSTD: '.zst'}
+
+# Decompression commands, in order of preference (pigz decompresses gzip faster than gzip)
+DECOMPRESS_COMMANDS = {
+    GZIP: [['pigz', '-dc'], ['gzip', '-dc']],
+    ZSTD: [['zstd', '-dc', '-q']],
+}
+
+BLOCK_SIZE = 1 << 20
+
+
+def compression_of(path):
+    """Returns 'gzip' or 'zstd' from the extension of path, or None for an uncompressed file."""
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if path.endswith(suffix):
+            return compression
+    return None
+
+
+def find_input(path):
+    """Returns path, or its .gz / .zst version if only that one exists (path if none exists)."""
+    for candidate in [path] + [path + suffix for suffix in COMPRESSION_SUFFIXES.values()]:
+        if os.path.isfile(candidate):
+            return candidate
+    return path
+
+
+class DecompressedStream(io.RawIOBase):
+    """
+    Read-only stream of the decompressed content of a .gz or .zst file, produced by
+    a separate process or thread. tell() returns the number of decompressed bytes read.
+
+    Args:
+    - path (str): Path to the compressed file.
+    - compression (str): 'gzip' or 'zstd'.
+    - use_subprocess (bool): Decompress with a command-line tool when one is installed (default is True).
+    """
+
+    def __init__(self, path, compression, use_subprocess=True):
+        super().__init__()
+        if not os.path.isfile(path):
+            raise FileNotFoundError(path)
+        self.path = path
+        self.bytes_read = 0
+        self._process = None
+        self._thread = None
+        self._error = None
+
+        command = None
+        if use_subprocess:
+            command = next((cmd for cmd in DECOMPRESS_COMMANDS[compression] if shutil.which(cmd[0])), None)
+        if command is not None:
+            self._process = subprocess.Popen(command + [path], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                             bufsize=BLOCK_SIZE)
+            self._stream = self._process.stdout
+        else:
+            if compression == ZSTD and zstandard is None:
+                raise ImportError("Reading .zst files needs the zstd command or the 'zstandard' package.")
+            read_fd, write_fd = os.pipe()
+            self._stream = os.fdopen(read_fd, 'rb', buffering=BLOCK_SIZE)
+            self._thread = threading.Thread(target=self._decompress, args=(compression, write_fd), daemon=True)
+            self._thread.start()
+
+    def _decompress(self, compression, write_fd):
+        try:
+            with open(self.path, 'rb') as raw, os.fdopen(write_fd, 'wb') as pipe:
+                if compression == GZIP:
+                    source = gzip.GzipFile(fileobj=raw)
+                else:
+                    source = zstandard.ZstdDecompressor().stream_reader(raw)
+                with source:
+                    for block in iter(lambda: source.read(BLOCK_SIZE), b''):
+                        pipe.write(block)
+        except BrokenPipeError:
+            pass  # The reader was closed before the end of the file
+        except Exception as e:
+            self._error = e
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = self._stream.readinto(buffer)
+        if n:
+            self.bytes_read += n
+            return n
+        self._check_finished()
+        return 0
+
+    def tell(self):
+        return self.bytes_read
+
+    def _check_finished(self):
+        # At the end of the stream, report a corrupt or truncated file instead of silently stopping
+        if self._process is not None:
+            if self._process.wait() != 0:
+                message = self._process.stderr.read().decode(errors='replace').strip()
+                raise OSError(f"Decompressing '{self.path}' failed: {message}")
+        elif self._thread is not None:
+            self._thread.join()
+            if self._error is not None:
+                raise OSError(f"Decompressing '{self.path}' failed: {self._error}")
+
+    def close(self):
+        if self.closed:
+            return
+        self._stream.close()
+        if self._process is not None:
+            # The reader may stop early (e.g. after the header): stop the decompression
+            if self._process.poll() is None:
+                self._process.terminate()
+            self._process.wait()
+            self._process.stderr.close()
+        super().close()
+
+
+def open_input(path, use_subprocess=True):
+    """
+    Opens a file for binary streaming reads, decompressing .gz and .zst files on the fly.
+
+    Args:
+    - path (str): Path to the file.
+    - use_subprocess (bool): Decompress in a separate process when a command-line tool is installed,
+      otherwise in a thread (default is True).
+
+    Returns:
+    - file object: Buffered binary file object; its tell() is the number of (decompressed) bytes read.
+    """
+    compression = compression_of(path)
+    if compression is None:
+        return open(path, 'rb')
+    # BufferedReader.tell() is the raw tell() minus the bytes still buffered, so it stays exact
+    return io.BufferedReader(DecompressedStream(path, compression, use_subprocess=use_subprocess), BLOCK_SIZE)
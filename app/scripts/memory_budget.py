@@ -0,0 +1,164 @@
+# Filename: memory_budget.py
+
+"""
+Memory measurements and chunk-size autotuning for the chunked readers.
+
+A fixed chunk size is either too large for wide rows on a small host (the
+process runs out of memory) or too small on a large one (per-chunk overhead
+dominates). In memory-budget mode the reader is given a target peak RSS
+instead: a sample of the file gives the in-memory bytes per row, the first
+chunk size is derived from the budget left after the current RSS, and every
+following chunk size is corrected with the bytes per row and the peak RSS
+actually observed.
+
+Memory is read from the standard library only:
+- current RSS from /proc/self/statm (Linux), else the peak RSS
+- peak RSS from VmHWM in /proc/self/status (Linux), which can be reset
+  between chunks, else from resource.getrusage (a process-wide maximum)
+"""
+
+import os
+import sys
+
+import pandas as pd
+
+from compressed_io import open_input
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MB = 1024 * 1024
+
+
+def current_rss():
+    """Resident set size of this process in bytes (None if it cannot be measured)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return peak_rss()
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes (since the last reset_peak_rss on Linux)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def reset_peak_rss():
+    """
+    Resets the peak RSS to the current RSS, so the next peak_rss() is the peak of one chunk.
+    Only possible on Linux; returns whether the reset worked.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def format_mb(n_bytes):
+    return 'n/a' if n_bytes is None else f"{n_bytes / MB:.0f} MB"
+
+
+def sample_bytes_per_row(input_file, sample_rows=2000, **read_options):
+    """
+    Estimates the size of a row from the first rows of a file.
+
+    Args:
+    - input_file (str): Path to the file (.gz and .zst files are decompressed on the fly).
+    - sample_rows (int): Number of rows parsed for the estimate (default is 2,000).
+    - read_options: Other arguments of read_csv (sep, usecols, dtype, ...).
+
+    Returns:
+    - tuple: (in-memory bytes per row of the parsed DataFrame, bytes per row in the file),
+      or (None, None) if the sample is empty.
+    """
+    with open_input(input_file) as f:
+        sample = pd.read_csv(f, nrows=sample_rows, **read_options)
+    if sample.empty:
+        return None, None
+    memory_per_row = sample.memory_usage(deep=True, index=False).sum() / len(sample)
+
+    # Size in the (decompressed) file of the same number of lines (header included)
+    with open_input(input_file) as f:
+        file_bytes = 0
+        for n_lines, line in enumerate(f):
+            if n_lines > len(sample):
+                break
+            file_bytes += len(line)
+    return float(memory_per_row), file_bytes / (len(sample) + 1)
+
+
+class ChunkSizeTuner:
+    """
+    Picks the number of rows of the next chunk so that the peak RSS stays under a budget.
+
+    A chunk of n rows is expected to raise the RSS by about n * bytes_per_row * overhead:
+    the parsed DataFrame plus the parser buffers and the copy made when writing it
+    (e.g. the Arrow table of a Parquet file). After each chunk the bytes per row are
+    re-measured on the DataFrame, and the overhead is raised when the observed peak
+    exceeded the budget, or slowly lowered when it stayed well below it.
+
+    Args:
+    - memory_budget_mb (float): Target peak RSS of the process, in MB.
+    - bytes_per_row (float): Initial in-memory bytes per row (from sample_bytes_per_row).
+    - overhead (float): Initial ratio between the peak memory of a chunk and its DataFrame size (default is 3).
+    - min_rows (int): Smallest chunk size (default is 1,000 rows).
+    - max_rows (int): Largest chunk size (default is 2,000,000 rows).
+    - headroom (float): Fraction of the budget targeted, to absorb estimation errors (default is 0.8).
+    """
+
+    def __init__(self, memory_budget_mb, bytes_per_row, overhead=3.0, min_rows=1000, max_rows=2_000_000,
+                 headroom=0.8):
+        self.budget = memory_budget_mb * MB
+        self.bytes_per_row = bytes_per_row
+        self.overhead = overhead
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        self.headroom = headroom
+        self.over_budget_chunks = 0
+
+    def next_size(self, rss=None):
+        """Number of rows of the next chunk, given the current RSS (measured if not given)."""
+        rss = current_rss() if rss is None else rss
+        available = self.budget * self.headroom - (rss or 0)
+        rows = int(available / (self.bytes_per_row * self.overhead)) if available > 0 else 0
+        return max(self.min_rows, min(self.max_rows, rows))
+
+    def update(self, rows, chunk_bytes, rss_before, chunk_peak_rss):
+        """
+        Corrects the estimates after a chunk.
+
+        Args:
+        - rows (int): Rows of the chunk.
+        - chunk_bytes (int): In-memory size of its DataFrame.
+        - rss_before (int): RSS before the chunk was read.
+        - chunk_peak_rss (int): Peak RSS while it was read and written (None if unknown).
+        """
+        if rows:
+            # Moving average, so one unusual chunk does not swing the chunk size
+            self.bytes_per_row = 0.5 * self.bytes_per_row + 0.5 * chunk_bytes / rows
+        if chunk_peak_rss is None or rss_before is None or not rows:
+            return
+        if chunk_peak_rss > self.budget:
+            self.over_budget_chunks += 1
+        # Overhead implied by this chunk: growth of the RSS per byte of DataFrame
+        observed = (chunk_peak_rss - rss_before) / max(chunk_bytes, 1)
+        if observed > self.overhead:
+            self.overhead = observed
+        elif chunk_peak_rss < self.budget * self.headroom * 0.75:
+            self.overhead = max(1.0, 0.5 * (self.overhead + observed))
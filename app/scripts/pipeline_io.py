@@ -0,0 +1,206 @@
+# Filename: pipeline_io.py
+
+"""
+Reading and writing of the pipeline's intermediate and output tables.
+
+Parquet is the default format: it keeps the dtypes between stages, avoids
+re-parsing text, and lets a stage load only the columns it needs. CSV is
+still available for export by choosing the 'csv' format (or a .csv path).
+Columns are stored with the dtypes of pipeline_schema (float32 nutrients,
+categorical grade and PNNS groups).
+
+iter_table and TableWriter read and write a table chunk by chunk, so that a
+stage can stream over data that does not fit in memory.
+
+CSV tables may be compressed (.csv.gz or .csv.zst); pandas infers the
+compression from the extension. Parquet files are compressed internally.
+"""
+
+import os
+
+import pandas as pd
+
+from pipeline_schema import apply_schema_dtypes
+
+PARQUET = 'parquet'
+CSV = 'csv'
+FORMATS = (PARQUET, CSV)
+
+
+def table_path(directory, name, fmt=PARQUET):
+    """Builds the path of a table from its base name and format (e.g. cleaned_df.parquet)."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown table format '{fmt}', expected one of {FORMATS}.")
+    return os.path.join(directory, f"{name}.{fmt}")
+
+
+def find_table(directory, name):
+    """Returns the path of an existing table, preferring Parquet over CSV (Parquet path if neither exists)."""
+    for fmt in FORMATS:
+        path = table_path(directory, name, fmt)
+        if os.path.exists(path):
+            return path
+    return table_path(directory, name, PARQUET)
+
+
+def format_of(path):
+    """Returns the format of a table file from its extension."""
+    return PARQUET if path.endswith('.parquet') else CSV
+
+
+def is_table_file(file_name):
+    return file_name.endswith(('.parquet', '.csv', '.csv.gz', '.csv.zst'))
+
+
+def _prepare_for_parquet(df):
+    # Parquet columns need one type: object columns mixing strings and
+    # numbers are stored as strings (missing values stay null)
+    for col in df.columns:
+        if df[col].dtype == object:
+            values = df[col].dropna()
+            if not values.map(lambda value: isinstance(value, str)).all():
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def write_table(df, path, sep=',', compression=None):
+    """
+    Saves a DataFrame as Parquet or CSV depending on the path extension.
+
+    Args:
+    - df (pd.DataFrame): Data to save.
+    - path (str): Output path ending in .parquet or .csv (.csv.gz / .csv.zst for compressed CSV).
+    - sep (str): Separator used for CSV output (default is ',').
+    - compression (str): Parquet codec, e.g. 'zstd' or 'gzip' (default is pyarrow's 'snappy');
+      CSV compression follows the path extension.
+    """
+    df = apply_schema_dtypes(df.copy())
+    if format_of(path) == PARQUET:
+        _prepare_for_parquet(df).to_parquet(path, index=False, compression=compression or 'snappy')
+    else:
+        df.to_csv(path, index=False, sep=sep)
+
+
+def read_columns(path, sep=','):
+    """Returns the column names of a table without loading its data."""
+    if format_of(path) == PARQUET:
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    return pd.read_csv(path, sep=sep, nrows=0).columns.tolist()
+
+
+def read_table(path, columns=None, sep=',', **csv_kwargs):
+    """
+    Loads a Parquet or CSV table, optionally only some of its columns.
+
+    Args:
+    - path (str): Path ending in .parquet or .csv.
+    - columns (list): Columns to load (default: all).
+    - sep (str): Separator used for CSV input (default is ',').
+    - csv_kwargs: Extra arguments passed to pd.read_csv.
+
+    Returns:
+    - pd.DataFrame: Loaded table with the schema dtypes.
+    """
+    if format_of(path) == PARQUET:
+        df = pd.read_parquet(path, columns=columns)
+    else:
+        csv_kwargs.setdefault('low_memory', False)
+        df = pd.read_csv(path, sep=sep, usecols=columns, **csv_kwargs)
+    return apply_schema_dtypes(df)
+
+
+def iter_table(path, columns=None, chunk_size=50000, sep=','):
+    """
+    Reads a Parquet or CSV table chunk by chunk, optionally only some of its columns.
+
+    Args:
+    - path (str): Path ending in .parquet or .csv.
+    - columns (list): Columns to load (default: all).
+    - chunk_size (int): Number of rows per chunk (default is 50,000 rows).
+    - sep (str): Separator used for CSV input (default is ',').
+
+    Yields:
+    - pd.DataFrame: Chunks with the schema dtypes.
+    """
+    if format_of(path) == PARQUET:
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield apply_schema_dtypes(batch.to_pandas())
+    else:
+        for chunk in pd.read_csv(path, sep=sep, usecols=columns, chunksize=chunk_size, low_memory=False):
+            yield apply_schema_dtypes(chunk)
+
+
+class TableWriter:
+    """
+    Writes a table chunk by chunk: row groups of one Parquet file, or appends to a CSV file.
+
+    The columns and their types are fixed by the first chunk; later chunks are
+    aligned to them. In Parquet, numeric columns other than float32 are stored
+    as float64 and the other columns as strings, so that chunks whose inferred
+    dtypes differ (an all-NaN chunk, other categories) share one schema.
+
+    Args:
+    - path (str): Output path ending in .parquet or .csv.
+    - sep (str): Separator used for CSV output (default is ',').
+    """
+
+    def __init__(self, path, sep=','):
+        self.path = path
+        self.sep = sep
+        self.columns = None
+        self.rows = 0
+        self.head = None
+        self._schema = None
+        self._writer = None
+
+    @property
+    def shape(self):
+        return (self.rows, len(self.columns or []))
+
+    def write(self, df):
+        if self.columns is None:
+            self.columns = list(df.columns)
+            self.head = df.head()
+        df = apply_schema_dtypes(df.reindex(columns=self.columns))
+        if format_of(self.path) == PARQUET:
+            self._write_parquet(df)
+        else:
+            df.to_csv(self.path, index=False, sep=self.sep, mode='w' if self.rows == 0 else 'a', header=self.rows == 0)
+        self.rows += len(df)
+
+    def _write_parquet(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._schema is None:
+            fields = []
+            for col in self.columns:
+                if df[col].dtype == 'float32':
+                    fields.append(pa.field(col, pa.float32()))
+                elif pd.api.types.is_numeric_dtype(df[col].dtype) and not pd.api.types.is_bool_dtype(df[col].dtype):
+                    fields.append(pa.field(col, pa.float64()))
+                else:
+                    fields.append(pa.field(col, pa.string()))
+            self._schema = pa.schema(fields)
+            self._writer = pq.ParquetWriter(self.path, self._schema)
+
+        for field in self._schema:
+            if field.type == pa.string():
+                values = df[field.name].astype(object)
+                df[field.name] = values.where(values.isna(), values.astype(str))
+            elif field.type == pa.float64():
+                df[field.name] = pd.to_numeric(df[field.name], errors='coerce').astype('float64')
+        self._writer.write_table(pa.Table.from_pandas(df, schema=self._schema, preserve_index=False))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,163 @@
+# Filename: pipeline_manifest.py
+
+"""
+Manifest of the pipeline runs, used to make re-runs incremental and resumable.
+
+For every stage (script) the manifest records the parameters it ran with,
+the fingerprints of its inputs (size, mtime and SHA-256 of each file), its
+outputs, and, for stages working chunk by chunk, each completed chunk. A
+re-run can then:
+- skip a stage whose parameters, inputs and outputs have not changed
+- reprocess only the chunks that are new or whose content changed
+- resume an interrupted stage after the last completed chunk
+
+File hashes are only recomputed when the size or mtime of a file changed,
+and a file rewritten with the same content still counts as unchanged.
+"""
+
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = 'pipeline_manifest.json'
+
+
+def file_hash(path, block_size=1 << 20):
+    """SHA-256 of a file, read in blocks of 1 MB."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    Stage manifest stored as JSON (by default data/pipeline_manifest.json).
+
+    Args:
+    - path (str): Path of the manifest file; it is created on the first save.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.data = {'stages': {}, 'files': {}}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Could not read the manifest '{path}', starting a new one: {e}")
+
+    def save(self):
+        # Write to a temporary file first so an interrupted run never leaves a truncated manifest
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def fingerprint(self, path):
+        """Size, mtime and SHA-256 of a file; the hash is reused while size and mtime are unchanged."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        cached = self.data['files'].get(path)
+        if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+            return cached
+        fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': file_hash(path)}
+        self.data['files'][path] = fingerprint
+        return fingerprint
+
+    def _input_hashes(self, inputs):
+        # A missing input never matches a recorded hash, so the stage runs and reports the error
+        return {
+            os.path.abspath(path): self.fingerprint(path)['sha256'] if os.path.exists(path) else None
+            for path in inputs
+        }
+
+    def is_current(self, stage, inputs, params, outputs):
+        """
+        Whether a stage completed with the same parameters and input contents,
+        and its outputs still exist.
+        """
+        entry = self.data['stages'].get(stage)
+        if not entry or not entry.get('completed') or entry['params'] != params:
+            return False
+        if not all(os.path.exists(path) for path in outputs):
+            return False
+        if sorted(entry['outputs']) != sorted(os.path.abspath(path) for path in outputs):
+            return False
+        return entry['inputs'] == self._input_hashes(inputs)
+
+    def begin_stage(self, stage, inputs, params):
+        """
+        Marks a stage as running. Completed chunks are kept when the parameters
+        and inputs are the ones of the previous (possibly interrupted) run, so it
+        can resume; otherwise they are discarded.
+        """
+        input_hashes = self._input_hashes(inputs)
+        entry = self.data['stages'].get(stage)
+        if entry is None or entry['params'] != params or entry['inputs'] != input_hashes:
+            previous_outputs = entry['outputs'] if entry else []
+            entry = {'params': params, 'inputs': input_hashes, 'outputs': previous_outputs, 'chunks': {}}
+            self.data['stages'][stage] = entry
+        entry['completed'] = False
+        self.save()
+
+    def complete_stage(self, stage, outputs, chunk_keys=None):
+        """
+        Marks a stage as completed with its outputs. When chunk_keys is given,
+        records of chunks that are no longer part of the stage are dropped.
+
+        Returns:
+        - list: Outputs of the previous run that this run did not produce (stale files).
+        """
+        entry = self.data['stages'][stage]
+        outputs = sorted(os.path.abspath(path) for path in outputs)
+        stale = [path for path in entry['outputs'] if path not in outputs]
+        entry['outputs'] = outputs
+        if chunk_keys is not None:
+            entry['chunks'] = {key: chunk for key, chunk in entry['chunks'].items() if key in chunk_keys}
+        entry['completed'] = True
+        self.save()
+        return stale
+
+    def outputs(self, stage):
+        """Outputs recorded for the last completed run of a stage."""
+        entry = self.data['stages'].get(stage)
+        return list(entry['outputs']) if entry else []
+
+    def chunk_is_current(self, stage, key, input_path=None):
+        """
+        Whether a chunk was completed by the current run of the stage (see
+        begin_stage), from the same input content, and its output still exists.
+        """
+        entry = self.data['stages'].get(stage)
+        chunk = entry['chunks'].get(key) if entry else None
+        if chunk is None:
+            return False
+        if chunk['output'] is not None and not os.path.exists(chunk['output']):
+            return False
+        if input_path is not None and chunk['input'] != self.fingerprint(input_path)['sha256']:
+            return False
+        return True
+
+    def chunk_output(self, stage, key):
+        """Output recorded for a completed chunk (None if the chunk produced no data)."""
+        return self.data['stages'][stage]['chunks'][key]['output']
+
+    def chunk_rows(self, stage, key):
+        """Rows recorded for a completed chunk (None if not recorded)."""
+        return self.data['stages'][stage]['chunks'][key].get('rows')
+
+    def complete_chunk(self, stage, key, output, input_path=None, rows=None):
+        """Records a completed chunk and saves the manifest, so an interrupted run resumes after it."""
+        self.data['stages'][stage]['chunks'][key] = {
+            'input': self.fingerprint(input_path)['sha256'] if input_path is not None else None,
+            'output': os.path.abspath(output) if output is not None else None,
+            'rows': rows,
+        }
+        self.save()
+
+    def chunk_keys(self, stage):
+        entry = self.data['stages'].get(stage)
+        return set(entry['chunks']) if entry else set()
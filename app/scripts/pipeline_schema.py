@@ -0,0 +1,85 @@
+# Filename: pipeline_schema.py
+
+"""
+Columns of the raw Open Food Facts dump that the pipeline uses, and their dtypes.
+
+The dump has about 200 columns; scripts 02 to 05 only ever keep the
+nutrient ('_100g') columns, the features selected by 05_feature_selection.py
+and the 'brands'/'product_name' key used to drop duplicates. Reading only
+those, with compact dtypes, cuts parse time and peak memory of the raw reads:
+- '_100g' nutrient columns as float32
+- 'pnns_groups_1', 'pnns_groups_2' and 'nutriscore_grade' as category
+"""
+
+import pandas as pd
+
+from compressed_io import open_input
+from pipeline_stages import DEDUP_SUBSET, FEATURE_COLUMNS, is_nutrient_column
+
+NUTRIENT_DTYPE = 'float32'
+
+CATEGORY_COLUMNS = ['nutriscore_grade', 'pnns_groups_1', 'pnns_groups_2']
+
+# Product key and last modification time, read on request (delta ingestion, 10_delta_ingest.py).
+# Barcodes are kept as strings so leading zeros survive.
+KEY_COLUMNS = ['code', 'last_modified_t']
+KEY_DTYPES = {'code': 'str', 'last_modified_t': 'Int64'}
+
+# Non-nutrient columns read from the raw dump (every '_100g' column is read as well)
+USED_COLUMNS = [col for col in FEATURE_COLUMNS + DEDUP_SUBSET if not is_nutrient_column(col)]
+
+
+def is_used_column(col):
+    """Whether the pipeline needs this column of the raw dump."""
+    return col in USED_COLUMNS or is_nutrient_column(col)
+
+
+def column_dtypes(columns):
+    """Maps the given column names to their schema dtype (columns without one are left out)."""
+    dtypes = {}
+    for col in columns:
+        if is_nutrient_column(col):
+            dtypes[col] = NUTRIENT_DTYPE
+        elif col in CATEGORY_COLUMNS:
+            dtypes[col] = 'category'
+        elif col in KEY_DTYPES:
+            dtypes[col] = KEY_DTYPES[col]
+    return dtypes
+
+
+def raw_read_options(input_file, sep='\t', extra_columns=()):
+    """
+    Returns the `usecols` and `dtype` arguments of pd.read_csv for the raw dump.
+
+    The header is read first so that the nutrient columns present in this
+    dump are resolved to explicit names.
+
+    Args:
+    - input_file (str): Path to the raw dump (or a CSV chunk of it), possibly .gz or .zst compressed.
+    - sep (str): Separator used in the file (default is tab '\t').
+    - extra_columns (list): Other columns to read as well (e.g. KEY_COLUMNS).
+
+    Returns:
+    - dict: Keyword arguments {'usecols': [...], 'dtype': {...}}.
+    """
+    with open_input(input_file) as f:
+        header = pd.read_csv(f, sep=sep, nrows=0).columns
+    usecols = [col for col in header if is_used_column(col) or col in extra_columns]
+    return {'usecols': usecols, 'dtype': column_dtypes(usecols)}
+
+
+def apply_schema_dtypes(df):
+    """
+    Casts the nutrient and category columns of df to their schema dtype.
+    Nutrient values that cannot be parsed become NaN. Used after concatenating
+    chunks, where categories that differ between chunks fall back to object.
+    Key columns are left as they are (they are only typed when parsing).
+    """
+    for col, dtype in column_dtypes(df.columns).items():
+        if col in KEY_DTYPES or df[col].dtype == dtype:
+            continue
+        if dtype == NUTRIENT_DTYPE:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(NUTRIENT_DTYPE)
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
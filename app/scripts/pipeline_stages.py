@@ -0,0 +1,291 @@
+# Filename: pipeline_stages.py
+
+"""
+Composable chunk-level stages of the cleaning pipeline.
+
+Each stage is a callable taking a DataFrame chunk and returning the cleaned
+chunk, and keeps counters of what it removed so a runner can report them.
+The stages reproduce the steps of scripts 02, 06, 03, 04 and 05 so that
+they can be chained over a single streaming read of the raw dump
+(see 09_streaming_pipeline.py).
+"""
+
+from streaming_dedup import StreamingDeduplicator
+
+# Valid Nutri-Score grades (02_process_and_clean_csv_chunks.py, Step 3)
+VALID_GRADES = ['a', 'b', 'c', 'd', 'e']
+
+# Placeholder values meaning "no value" in the text columns of the dump (02 Step 2, 04)
+DEFAULT_SENTINELS = ('unknown', 'not-applicable', '', 'en:unknown')
+
+# Key used to identify duplicate products (02 Step 5, 06 Step 3)
+DEDUP_SUBSET = ['brands', 'product_name']
+
+# Nutrient columns checked by 06_process_and_save_cleaned_df.py, Step 2
+NUTRIENT_COLUMNS = [
+    'energy-kcal_100g', 'fat_100g', 'saturated-fat_100g', 'carbohydrates_100g',
+    'sugars_100g', 'fiber_100g', 'proteins_100g', 'salt_100g', 'sodium_100g'
+]
+
+# Metadata, image and serving columns dropped by 03_remove_metadata_and_serving_columns.py
+METADATA_COLUMNS = [
+    'code', 'url', 'creator', 'last_modified_by', 'last_updated_t',
+    'image_url', 'image_small_url', 'image_ingredients_url',
+    'image_ingredients_small_url', 'image_nutrition_url', 'image_nutrition_small_url',
+    'completeness', 'unique_scans_n', 'states', 'serving_size', 'serving_quantity'
+]
+
+# Columns kept by 05_feature_selection.py, in output order
+FEATURE_COLUMNS = [
+    'nutriscore_grade',
+    'nutriscore_score',
+    'nutrition-score-fr_100g',
+    'nova_group',
+    'ecoscore_score',
+    'energy-kcal_100g',
+    'fat_100g',
+    'saturated-fat_100g',
+    'carbohydrates_100g',
+    'sugars_100g',
+    'fiber_100g',
+    'proteins_100g',
+    'salt_100g',
+    'sodium_100g',
+    'fruits-vegetables-nuts-estimate-from-ingredients_100g',
+    'pnns_groups_1',
+    'pnns_groups_2',
+    'food_groups',
+    'main_category'
+]
+
+
+def is_nutrient_column(col):
+    return col.endswith('_100g')
+
+
+def is_redundant_column(col):
+    return col.endswith('_tags') or col.endswith('_en')
+
+
+class Stage:
+    """Base class of a chunk-level stage; counts the rows it removes."""
+
+    name = 'stage'
+
+    def __init__(self):
+        self.rows_in = 0
+        self.rows_out = 0
+
+    def __call__(self, chunk):
+        self.rows_in += len(chunk)
+        chunk = self.apply(chunk)
+        self.rows_out += len(chunk)
+        return chunk
+
+    def apply(self, chunk):
+        raise NotImplementedError
+
+    def report(self):
+        return f"{self.name}: removed {self.rows_in - self.rows_out} of {self.rows_in} rows"
+
+
+class GradeFilter(Stage):
+    """Keeps rows with a valid Nutri-Score grade (a to e)."""
+
+    name = 'grade_filter'
+
+    def __init__(self, column='nutriscore_grade', valid_grades=VALID_GRADES):
+        super().__init__()
+        self.column = column
+        self.valid_grades = valid_grades
+
+    def apply(self, chunk):
+        if self.column not in chunk.columns:
+            return chunk
+        return chunk[chunk[self.column].isin(self.valid_grades)]
+
+
+class DropEmptyRows(Stage):
+    """
+    Drops rows where every selected column is NaN.
+
+    Args:
+    - columns (list or callable): Column names, or a predicate selecting them.
+    """
+
+    name = 'drop_empty_rows'
+
+    def __init__(self, columns):
+        super().__init__()
+        self.columns = columns
+
+    def apply(self, chunk):
+        if callable(self.columns):
+            subset = [col for col in chunk.columns if self.columns(col)]
+        else:
+            subset = [col for col in self.columns if col in chunk.columns]
+        if not subset:
+            return chunk
+        return chunk.dropna(subset=subset, how='all')
+
+
+class DropDuplicates(Stage):
+    """Drops duplicate rows on `subset`, keeping the first, within each chunk only."""
+
+    name = 'drop_duplicates_chunk'
+
+    def __init__(self, subset=DEDUP_SUBSET):
+        super().__init__()
+        self.subset = subset
+
+    def apply(self, chunk):
+        if not all(col in chunk.columns for col in self.subset):
+            return chunk
+        return chunk.drop_duplicates(subset=self.subset)
+
+
+class GlobalDropDuplicates(Stage):
+    """
+    Drops duplicate rows on `subset` across every chunk seen so far, keeping
+    the first occurrence, like drop_duplicates on the concatenated data.
+    Keys are tracked by a StreamingDeduplicator (64-bit hashes of the
+    normalized key); dedup_options are passed to it.
+    """
+
+    name = 'drop_duplicates_global'
+
+    def __init__(self, subset=DEDUP_SUBSET, **dedup_options):
+        super().__init__()
+        self.subset = subset
+        self.deduplicator = StreamingDeduplicator(subset, **dedup_options)
+
+    def apply(self, chunk):
+        return self.deduplicator(chunk)
+
+    def report(self):
+        return f"{super().report()} ({self.deduplicator.report()})"
+
+
+class DropColumns(Stage):
+    """
+    Drops columns by name or predicate.
+
+    Args:
+    - columns (list or callable): Column names, or a predicate selecting them.
+    """
+
+    name = 'drop_columns'
+
+    def __init__(self, columns):
+        super().__init__()
+        self.columns = columns
+
+    def apply(self, chunk):
+        if callable(self.columns):
+            to_drop = [col for col in chunk.columns if self.columns(col)]
+        else:
+            to_drop = self.columns
+        return chunk.drop(columns=to_drop, errors='ignore')
+
+
+class SelectColumns(Stage):
+    """Keeps the listed columns that exist in the chunk, in the listed order."""
+
+    name = 'select_columns'
+
+    def __init__(self, columns):
+        super().__init__()
+        self.columns = columns
+
+    def apply(self, chunk):
+        return chunk[[col for col in self.columns if col in chunk.columns]]
+
+
+class NormalizeSentinels(Stage):
+    """
+    Replaces sentinel strings such as 'unknown' with NaN, by dtype: only text
+    (object/string) and categorical columns are scanned, with one vectorized
+    isin mask per column; categorical columns just drop the sentinel categories.
+    Counts the replacements made in each column.
+
+    Args:
+    - sentinels (iterable): Sentinel values replaced in every scanned column (default: DEFAULT_SENTINELS).
+    - columns (list): Only scan these columns (default: all text and categorical columns).
+    - column_sentinels (dict): Per-column sentinel sets overriding `sentinels`.
+    """
+
+    name = 'normalize_sentinels'
+    # Column kinds scanned by apply; any other column is left untouched
+    scanned_kinds = ['object', 'string', 'category']
+
+    def __init__(self, sentinels=DEFAULT_SENTINELS, columns=None, column_sentinels=None):
+        super().__init__()
+        self.sentinels = list(sentinels)
+        self.columns = columns
+        self.column_sentinels = {col: list(values) for col, values in (column_sentinels or {}).items()}
+        self.replacements = {}
+
+    def apply(self, chunk):
+        replaced = {}
+        for col in chunk.columns:
+            if self.columns is not None and col not in self.columns:
+                continue
+            sentinels = self.column_sentinels.get(col, self.sentinels)
+            series = chunk[col]
+            if not sentinels:
+                continue
+            if series.dtype.name == 'category':
+                present = [value for value in sentinels if value in series.cat.categories]
+                if not present:
+                    continue
+                count = int(series.isin(present).sum())
+                replaced[col] = series.cat.remove_categories(present)
+            elif series.dtype == object or series.dtype.name == 'string':
+                mask = series.isin(sentinels)
+                count = int(mask.sum())
+                if not count:
+                    continue
+                replaced[col] = series.mask(mask)
+            else:
+                continue
+            self.replacements[col] = self.replacements.get(col, 0) + count
+        return chunk.assign(**replaced) if replaced else chunk
+
+    def params(self):
+        """Settings that change the output, as recorded in a stage manifest (JSON types only)."""
+        return {
+            'sentinels': self.sentinels,
+            'columns': list(self.columns) if self.columns is not None else None,
+            'column_sentinels': self.column_sentinels,
+            'scanned_kinds': list(self.scanned_kinds),
+        }
+
+    def report(self):
+        total = sum(self.replacements.values())
+        per_column = ', '.join(f"{col}: {count}" for col, count in sorted(self.replacements.items()))
+        return f"{self.name}: replaced {total} sentinel values with NaN ({per_column or 'none'})"
+
+
+class NonNullCounter:
+    """Accumulates the number of rows and non-null values per column across chunks."""
+
+    def __init__(self):
+        self.rows = 0
+        self.counts = {}
+
+    def update(self, chunk):
+        self.rows += len(chunk)
+        for col, count in chunk.count().items():
+            self.counts[col] = self.counts.get(col, 0) + int(count)
+
+    def columns_above(self, min_fraction):
+        """Columns with at least min_fraction non-null values, as dropna(axis=1, thresh=...)."""
+        threshold = self.rows * min_fraction
+        return [col for col, count in self.counts.items() if count >= threshold]
+
+
+def apply_stages(chunk, stages):
+    """Runs a chunk through a list of stages, in order."""
+    for stage in stages:
+        chunk = stage(chunk)
+    return chunk
@@ -0,0 +1,170 @@
+# Filename: streaming_dedup.py
+
+"""
+Global deduplication of a stream of chunks with a compact hash index.
+
+Instead of keeping every (brands, product_name) pair seen so far, the
+deduplicator keeps the 64-bit hash of each normalized key in a sorted numpy
+array (8 bytes per product). When the index grows past a limit it can be
+spilled to disk as sorted runs that are memory-mapped for lookups, so memory
+stays bounded however large the dump is.
+
+Two different keys only collide (and a product is wrongly dropped) if their
+64-bit hashes are equal; stats() reports the collisions seen within chunks
+and the birthday bound on the probability of any collision.
+"""
+
+import math
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Stands for a missing value in a key, so that NaN keys compare equal as in drop_duplicates
+NULL_MARKER = '\x00'
+
+
+class StreamingDeduplicator:
+    """
+    Drops rows whose key was already seen in this chunk or in a previous one,
+    keeping the first occurrence.
+
+    Args:
+    - subset (list): Columns forming the key (e.g. ['brands', 'product_name']).
+    - normalize (bool): Compare keys case-insensitively, ignoring surrounding and repeated whitespace (default is True).
+    - max_keys_in_memory (int): Number of hashes kept in memory before spilling them to disk (default is 5,000,000, about 40 MB).
+    - spill_dir (str): Directory for the spilled runs; None keeps every hash in memory (default).
+    - check_collisions (bool): Count hash collisions between different keys of a same chunk (default is True).
+    """
+
+    def __init__(self, subset, normalize=True, max_keys_in_memory=5_000_000, spill_dir=None, check_collisions=True):
+        self.subset = list(subset)
+        self.normalize = normalize
+        self.max_keys_in_memory = max_keys_in_memory
+        self.spill_dir = spill_dir
+        self.check_collisions = check_collisions
+        self._keys = np.empty(0, dtype=np.uint64)  # sorted, unique
+        self._runs = []  # (path, memory-mapped sorted array) of spilled hashes
+        self.rows_in = 0
+        self.duplicates = 0
+        self.detected_collisions = 0
+
+    def normalized_keys(self, chunk):
+        """Returns the key columns of chunk as strings, normalized if enabled."""
+        keys = {}
+        for col in self.subset:
+            values = chunk[col].astype('string')
+            if self.normalize:
+                values = values.str.strip().str.lower().str.replace(r'\s+', ' ', regex=True)
+            keys[col] = values.fillna(NULL_MARKER)
+        return pd.DataFrame(keys, index=chunk.index)
+
+    def hash_keys(self, keys):
+        return pd.util.hash_pandas_object(keys, index=False).to_numpy(dtype=np.uint64)
+
+    def contains(self, hashes):
+        """Whether each hash is already in the index (in memory or spilled)."""
+        found = np.zeros(len(hashes), dtype=bool)
+        for keys in [self._keys] + [run for _, run in self._runs]:
+            if len(keys) == 0:
+                continue
+            positions = np.minimum(np.searchsorted(keys, hashes), len(keys) - 1)
+            found |= keys[positions] == hashes
+        return found
+
+    def keep_mask(self, chunk):
+        """
+        Returns a boolean array marking the rows of chunk to keep, and adds
+        their keys to the index.
+        """
+        keys = self.normalized_keys(chunk)
+        hashes = self.hash_keys(keys)
+
+        # First occurrence of each hash within the chunk
+        unique_hashes, first_index = np.unique(hashes, return_index=True)
+        first = np.zeros(len(hashes), dtype=bool)
+        first[first_index] = True
+        if self.check_collisions and len(unique_hashes) < len(hashes):
+            self.detected_collisions += self._count_collisions(keys, hashes)
+
+        keep = first & ~self.contains(hashes)
+        self._add(hashes[keep])
+
+        self.rows_in += len(chunk)
+        self.duplicates += int(len(chunk) - keep.sum())
+        return keep
+
+    def __call__(self, chunk):
+        """Returns chunk without the rows whose key was already seen."""
+        if not all(col in chunk.columns for col in self.subset):
+            return chunk
+        return chunk[self.keep_mask(chunk)]
+
+    def _count_collisions(self, keys, hashes):
+        # Distinct keys sharing a hash within the chunk
+        columns = [keys[col] for col in self.subset]
+        joined = columns[0].str.cat(columns[1:], sep='\x1f') if len(columns) > 1 else columns[0]
+        pairs = pd.DataFrame({'hash': hashes, 'key': joined.to_numpy()}).drop_duplicates()
+        return int(pairs['hash'].duplicated().sum())
+
+    def _add(self, new_hashes):
+        if len(new_hashes) == 0:
+            return
+        # new_hashes are unique and absent from the index: only they need sorting, and
+        # np.insert merges them into the sorted index in one linear copy
+        new_hashes = np.sort(new_hashes)
+        self._keys = np.insert(self._keys, np.searchsorted(self._keys, new_hashes), new_hashes)
+        if self.spill_dir is not None and len(self._keys) >= self.max_keys_in_memory:
+            self._spill()
+
+    def _spill(self):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix='dedup_run_', suffix='.npy', dir=self.spill_dir)
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, self._keys)
+        self._runs.append((path, np.load(path, mmap_mode='r')))
+        print(f"Spilled {len(self._keys)} dedup keys to {path}.")
+        self._keys = np.empty(0, dtype=np.uint64)
+
+    @property
+    def unique_keys(self):
+        return len(self._keys) + sum(len(run) for _, run in self._runs)
+
+    def collision_probability(self):
+        """Birthday bound on the probability that any two distinct keys seen share a 64-bit hash."""
+        n = self.unique_keys
+        return -math.expm1(-n * (n - 1) / 2.0 ** 65)
+
+    def stats(self):
+        return {
+            'rows_in': self.rows_in,
+            'duplicates_removed': self.duplicates,
+            'unique_keys': self.unique_keys,
+            'keys_in_memory': len(self._keys),
+            'index_memory_bytes': int(self._keys.nbytes),
+            'spilled_runs': len(self._runs),
+            'detected_collisions': self.detected_collisions,
+            'collision_probability': self.collision_probability(),
+        }
+
+    def report(self):
+        stats = self.stats()
+        return (f"Removed {stats['duplicates_removed']} duplicates of {stats['rows_in']} rows on {self.subset}; "
+                f"{stats['unique_keys']} unique keys ({stats['index_memory_bytes']} bytes in memory, "
+                f"{stats['spilled_runs']} spilled runs), {stats['detected_collisions']} hash collisions detected, "
+                f"collision probability <= {stats['collision_probability']:.2e}.")
+
+    def close(self):
+        """Removes the spilled runs from disk."""
+        paths = [path for path, _ in self._runs]
+        self._runs = []
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
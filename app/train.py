@@ -0,0 +1,293 @@
+# app/train.py
+"""
+Command-line training of the NutriScore model pipeline.
+
+Reproduces notebooks/training_save_models.ipynb and model_pipeline_save.ipynb:
+StandardScaler on the nutrients and OneHotEncoder on the PNNS groups,
+SMOTE to balance the grades, then a grid search over RandomForest, SVC and
+LogisticRegression, keeping the best one by cross-validated accuracy.
+
+Differences with the notebooks, for speed and correctness:
+- the three grids are searched by one GridSearchCV with n_jobs=-1, so every
+  candidate and fold of every model runs in parallel on all cores;
+- preprocessing and SMOTE are steps of an imblearn Pipeline with a `memory`
+  cache, so they are fitted once per fold and reused by all candidates
+  instead of being refitted for each of them;
+- SMOTE is applied inside the training folds, after the train/test split,
+  so no synthetic sample is built from test rows.
+
+The saved artifact is a plain sklearn Pipeline (preprocessor, model), as
+served by the app (see app/registry.py and app/inference.py). It is
+written to trained_models/ under a new version name, next to a JSON file
+with its parameters and scores.
+
+Usage: python -m app.train [--data data/selected_features.parquet] [--models random_forest logistic_regression]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from imblearn.over_sampling import SMOTE
+from imblearn.pipeline import Pipeline as ImbPipeline
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+from sklearn.model_selection import GridSearchCV, train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.svm import SVC
+
+from config import Config
+
+NUMERICAL_FEATURES = [
+    'energy-kcal_100g', 'fat_100g', 'saturated-fat_100g',
+    'carbohydrates_100g', 'sugars_100g', 'fiber_100g',
+    'proteins_100g', 'salt_100g', 'fruits-vegetables-nuts-estimate-from-ingredients_100g'
+]
+CATEGORICAL_FEATURES = ['pnns_groups_1', 'pnns_groups_2']
+TARGET_COLUMN = 'nutriscore_grade'
+
+RANDOM_STATE = 42
+
+# Models and hyperparameter grids of notebooks/training_save_models.ipynb
+MODEL_GRIDS = {
+    'random_forest': (
+        # n_jobs is left at 1: the grid search already uses every core
+        lambda: RandomForestClassifier(random_state=RANDOM_STATE),
+        {'n_estimators': [100, 200], 'max_depth': [10, 20, None], 'min_samples_split': [2, 5]},
+    ),
+    'svc': (
+        lambda: SVC(random_state=RANDOM_STATE),
+        {'C': [0.1, 1, 10], 'kernel': ['linear', 'rbf']},
+    ),
+    'logistic_regression': (
+        lambda: LogisticRegression(max_iter=1000, random_state=RANDOM_STATE),
+        {'C': [0.01, 0.1, 1, 10], 'solver': ['liblinear', 'lbfgs']},
+    ),
+}
+
+
+def load_training_data(path, sample_size=1.0):
+    """
+    Loads the features and target from a CSV or Parquet table (e.g. the output of the
+    app/scripts pipeline). Rows without a grade or with a missing nutrient are dropped,
+    since the models of the notebooks do not handle missing values.
+
+    Args:
+    - path (str): Path to the table (.csv or .parquet).
+    - sample_size (float): Fraction of the rows to use (default is 1.0, all rows).
+
+    Returns:
+    - tuple: (X, y) as a DataFrame of the feature columns and a Series of grades.
+    """
+    columns = NUMERICAL_FEATURES + CATEGORICAL_FEATURES + [TARGET_COLUMN]
+    if path.endswith('.parquet'):
+        df = pd.read_parquet(path, columns=columns)
+    else:
+        df = pd.read_csv(path, usecols=columns)
+
+    n_rows = len(df)
+    df = df.dropna(subset=NUMERICAL_FEATURES + [TARGET_COLUMN])
+    if len(df) < n_rows:
+        print(f"Dropped {n_rows - len(df)} of {n_rows} rows with a missing grade or nutrient.")
+    if sample_size < 1.0:
+        df = df.sample(frac=sample_size, random_state=RANDOM_STATE)
+
+    X = df[NUMERICAL_FEATURES + CATEGORICAL_FEATURES].copy()
+    X[CATEGORICAL_FEATURES] = X[CATEGORICAL_FEATURES].astype(object)
+    return X, df[TARGET_COLUMN].astype(str)
+
+
+def build_preprocessor():
+    return ColumnTransformer(
+        transformers=[
+            ('num', StandardScaler(), NUMERICAL_FEATURES),
+            ('cat', OneHotEncoder(handle_unknown='ignore'), CATEGORICAL_FEATURES)
+        ]
+    )
+
+
+def build_search(model_names, cv=3, n_jobs=-1, memory=None):
+    """
+    Builds one GridSearchCV over the given models.
+
+    The pipeline's 'model' step is itself a grid parameter, so the candidates of every
+    model are scheduled together on the worker pool. With `memory`, the fitted
+    preprocessor and the SMOTE resampling of each fold are cached and shared by all
+    candidates, across worker processes.
+
+    Args:
+    - model_names (list): Keys of MODEL_GRIDS to search.
+    - cv (int): Number of cross-validation folds (default is 3).
+    - n_jobs (int): Parallel jobs of the search (default is -1, all cores).
+    - memory (str or joblib.Memory): Cache of the fitted transformers (default is None, no cache).
+
+    Returns:
+    - GridSearchCV: The unfitted search.
+    """
+    pipeline = ImbPipeline([
+        ('preprocessor', build_preprocessor()),
+        ('smote', SMOTE(random_state=RANDOM_STATE)),
+        ('model', MODEL_GRIDS[model_names[0]][0]()),
+    ], memory=memory)
+
+    param_grid = []
+    for name in model_names:
+        make_model, params = MODEL_GRIDS[name]
+        grid = {'model': [make_model()]}
+        grid.update({f"model__{param}": values for param, values in params.items()})
+        param_grid.append(grid)
+
+    return GridSearchCV(
+        estimator=pipeline,
+        param_grid=param_grid,
+        cv=cv,
+        scoring='accuracy',
+        n_jobs=n_jobs,
+        error_score='raise',
+        verbose=1
+    )
+
+
+def best_per_model(search):
+    """Returns the best cross-validated accuracy and parameters of each model of a fitted search."""
+    results = search.cv_results_
+    best = {}
+    for i, model in enumerate(results['param_model']):
+        name = type(model).__name__
+        score = results['mean_test_score'][i]
+        if name not in best or score > best[name]['cv_accuracy']:
+            params = {key: value for key, value in results['params'][i].items() if key != 'model'}
+            best[name] = {'cv_accuracy': float(score), 'params': params}
+    return best
+
+
+def export_pipeline(fitted):
+    """
+    Builds the served pipeline from the best fitted search pipeline: its preprocessor
+    and model, without SMOTE (only used when fitting) or the transformer cache.
+    """
+    return Pipeline([
+        ('preprocessor', fitted.named_steps['preprocessor']),
+        ('model', fitted.named_steps['model'])
+    ])
+
+
+def train(data_path, output_dir, version=None, model_names=None, cv=3, n_jobs=-1, test_size=0.2,
+          sample_size=1.0, cache_dir=None):
+    """
+    Trains, evaluates and saves the best model pipeline.
+
+    Args:
+    - data_path (str): Path to the training table (.csv or .parquet).
+    - output_dir (str): Directory of the model versions (e.g. trained_models/).
+    - version (str): Name of the saved version (default: best_model_pipeline_<timestamp>).
+    - model_names (list): Keys of MODEL_GRIDS to search (default: all).
+    - cv (int): Number of cross-validation folds (default is 3).
+    - n_jobs (int): Parallel jobs of the search (default is -1, all cores).
+    - test_size (float): Fraction of the rows held out for the test evaluation (default is 0.2).
+    - sample_size (float): Fraction of the rows to use (default is 1.0).
+    - cache_dir (str): Directory of the transformer cache; kept between runs when given,
+      otherwise a temporary directory removed at the end (default is None).
+
+    Returns:
+    - str: Path of the saved pipeline.
+    """
+    model_names = model_names or list(MODEL_GRIDS)
+    version = version or f"best_model_pipeline_{time.strftime('%Y%m%d_%H%M%S')}"
+
+    X, y = load_training_data(data_path, sample_size=sample_size)
+    print(f"Loaded {len(X)} rows from {data_path}.")
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=RANDOM_STATE, stratify=y
+    )
+
+    temporary_cache = cache_dir is None
+    cache_dir = cache_dir or tempfile.mkdtemp(prefix='train_cache_')
+    try:
+        search = build_search(model_names, cv=cv, n_jobs=n_jobs, memory=joblib.Memory(cache_dir, verbose=0))
+        n_workers = joblib.cpu_count() if n_jobs == -1 else n_jobs
+        print(f"Searching {', '.join(model_names)} with {cv}-fold GridSearchCV on {n_workers} workers...")
+        started = time.perf_counter()
+        search.fit(X_train, y_train)
+        search_seconds = time.perf_counter() - started
+    finally:
+        if temporary_cache:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    scores = best_per_model(search)
+    for name, result in scores.items():
+        print(f"Best {name}: accuracy on CV data {result['cv_accuracy']:.4f} with {result['params']}")
+
+    best_name = type(search.best_estimator_.named_steps['model']).__name__
+    pipeline = export_pipeline(search.best_estimator_)
+    y_pred = pipeline.predict(X_test)
+    test_accuracy = accuracy_score(y_test, y_pred)
+    print(f"\nBest model: {best_name} (accuracy on CV data {search.best_score_:.4f})")
+    print("Accuracy on test data:", test_accuracy)
+    print("Classification Report:\n", classification_report(y_test, y_pred))
+    print("Confusion Matrix:\n", confusion_matrix(y_test, y_pred))
+
+    os.makedirs(output_dir, exist_ok=True)
+    model_path = os.path.join(output_dir, f"{version}.joblib")
+    joblib.dump(pipeline, model_path)
+    metadata = {
+        'version': version,
+        'data_path': os.path.abspath(data_path),
+        'rows': len(X),
+        'model': best_name,
+        'params': {key: value for key, value in search.best_params_.items() if key != 'model'},
+        'cv': cv,
+        'cv_accuracy': float(search.best_score_),
+        'test_accuracy': float(test_accuracy),
+        'models': scores,
+        'classes': [str(label) for label in np.unique(y)],
+        'n_jobs': n_jobs,
+        'search_seconds': search_seconds,
+        'trained_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    with open(os.path.join(output_dir, f"{version}.json"), 'w') as f:
+        json.dump(metadata, f, indent=2, default=str)
+
+    print(f"Search took {search_seconds:.1f} s.")
+    print(f"Best model pipeline saved successfully at: {model_path}")
+    return model_path
+
+
+def main():
+    """
+    Trains the NutriScore model pipeline and saves it as a new version in trained_models/.
+
+    Usage: python -m app.train [--data PATH] [--output-dir DIR] [--version NAME] [--models NAME ...]
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__.strip().splitlines()[0])
+    parser.add_argument('--data', default=os.path.join('data', 'selected_features.parquet'),
+                        help="Training table, CSV or Parquet (default: data/selected_features.parquet).")
+    parser.add_argument('--output-dir', default=os.path.dirname(Config.MODEL_PATH) or '.',
+                        help="Directory of the model versions (default: the directory of MODEL_PATH).")
+    parser.add_argument('--version', default=None,
+                        help="Name of the saved version (default: best_model_pipeline_<timestamp>).")
+    parser.add_argument('--models', nargs='+', choices=list(MODEL_GRIDS), default=list(MODEL_GRIDS),
+                        help="Models to search (default: all).")
+    parser.add_argument('--cv', type=int, default=3, help="Cross-validation folds (default: 3).")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="Parallel jobs of the search (default: -1, all cores).")
+    parser.add_argument('--test-size', type=float, default=0.2, help="Held-out fraction (default: 0.2).")
+    parser.add_argument('--sample', type=float, default=1.0, help="Fraction of the rows to use (default: 1.0).")
+    parser.add_argument('--cache-dir', default=None,
+                        help="Keep the fitted-transformer cache in this directory between runs (default: temporary).")
+    args = parser.parse_args()
+
+    train(args.data, args.output_dir, version=args.version, model_names=args.models, cv=args.cv,
+          n_jobs=args.n_jobs, test_size=args.test_size, sample_size=args.sample, cache_dir=args.cache_dir)
+
+
+if __name__ == "__main__":
+    main()
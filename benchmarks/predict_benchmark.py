@@ -0,0 +1,280 @@
+# Filename: predict_benchmark.py
+
+"""
+Load test and latency benchmark for the prediction API.
+
+Starts the app in-process against a local database (a SQLite file by
+default, or any DATABASE_URL such as a local Postgres), or targets an
+already running server with --url. It drives concurrent POST requests with
+synthetic nutrient payloads shaped like the form in templates/index.html
+and reports p50/p95/p99 latency and requests/sec.
+
+It also times the stages of one prediction in-process (JSON parsing,
+DataFrame construction, model predict, DB commit) and writes everything to
+a JSON file so runs can be compared.
+
+Usage:
+    python benchmarks/predict_benchmark.py --concurrency 16 --requests 5000
+    python benchmarks/predict_benchmark.py --url http://localhost:5000 --duration 60
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, '..'))
+sys.path.insert(0, project_root)
+
+# PNNS groups as found in the Open Food Facts dump
+PNNS_GROUPS = {
+    'Sugary snacks': ['Biscuits and cakes', 'Sweets', 'Chocolate products'],
+    'Milk and dairy products': ['Cheese', 'Milk and yogurt', 'Dairy desserts'],
+    'Cereals and potatoes': ['Bread', 'Breakfast cereals', 'Cereals', 'Potatoes'],
+    'Fat and sauces': ['Dressings and sauces', 'Fats'],
+    'Fish Meat Eggs': ['Processed meat', 'Meat', 'Fish and seafood', 'Eggs'],
+    'Beverages': ['Sweetened beverages', 'Unsweetened beverages', 'Fruit juices'],
+    'Composite foods': ['One-dish meals', 'Pizza pies and quiches', 'Sandwiches'],
+    'Fruits and vegetables': ['Vegetables', 'Fruits', 'Soups'],
+    'Salty snacks': ['Appetizers', 'Nuts'],
+}
+
+
+def synthetic_payload(rng):
+    """Builds one random product with the fields of the prediction form."""
+    group_1 = rng.choice(list(PNNS_GROUPS))
+    fat = round(rng.uniform(0, 60), 1)
+    carbohydrates = round(rng.uniform(0, 90), 1)
+    proteins = round(rng.uniform(0, 40), 1)
+    return {
+        "pnns_groups_1": group_1,
+        "pnns_groups_2": rng.choice(PNNS_GROUPS[group_1]),
+        "energy-kcal_100g": round(9 * fat + 4 * (carbohydrates + proteins), 1),
+        "fat_100g": fat,
+        "saturated-fat_100g": round(fat * rng.uniform(0, 0.7), 1),
+        "carbohydrates_100g": carbohydrates,
+        "sugars_100g": round(carbohydrates * rng.uniform(0, 1), 1),
+        "fiber_100g": round(rng.uniform(0, 12), 1),
+        "proteins_100g": proteins,
+        "salt_100g": round(rng.uniform(0, 3), 2),
+        "fruits-vegetables-nuts-estimate-from-ingredients_100g": round(rng.uniform(0, 100), 1),
+    }
+
+
+def percentile(sorted_values, q):
+    """Linear-interpolated percentile (q in [0, 100]) of an already sorted list."""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(latencies_ms):
+    values = sorted(latencies_ms)
+    return {
+        "count": len(values),
+        "mean_ms": sum(values) / len(values) if values else None,
+        "p50_ms": percentile(values, 50),
+        "p95_ms": percentile(values, 95),
+        "p99_ms": percentile(values, 99),
+        "max_ms": values[-1] if values else None,
+    }
+
+
+def start_local_server(database_url=None):
+    """
+    Starts the app in a background thread and returns its base URL.
+    database_url overrides DATABASE_URL; without either, a local SQLite file is used.
+    """
+    if database_url:
+        os.environ['DATABASE_URL'] = database_url
+    else:
+        os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(project_root, 'benchmark.db'))
+    from werkzeug.serving import make_server
+    from app import create_app, db
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return app, f"http://127.0.0.1:{server.server_port}"
+
+
+def run_load(base_url, endpoint, concurrency, total_requests, duration, batch_size, seed):
+    """Drives concurrent requests and returns latency and throughput figures."""
+    url = base_url.rstrip('/') + endpoint
+    latencies_ms = []
+    errors = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration if duration else None
+    counter = iter(range(total_requests if not duration else sys.maxsize))
+
+    def worker(worker_id):
+        rng = random.Random(seed + worker_id)
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+
+            if batch_size > 1:
+                payload = [synthetic_payload(rng) for _ in range(batch_size)]
+            else:
+                payload = synthetic_payload(rng)
+            request = urllib.request.Request(
+                url, data=json.dumps(payload).encode('utf-8'),
+                headers={'Content-Type': 'application/json'}, method='POST'
+            )
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    response.read()
+                status = 200
+            except urllib.error.HTTPError as e:
+                status = e.code
+            except Exception as e:
+                status = type(e).__name__
+            elapsed_ms = (time.perf_counter() - started) * 1000.0
+
+            with lock:
+                if status == 200:
+                    latencies_ms.append(elapsed_ms)
+                else:
+                    errors[str(status)] = errors.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for worker_id in range(concurrency):
+            pool.submit(worker, worker_id)
+    wall_time = time.perf_counter() - started
+
+    results = summarize(latencies_ms)
+    results.update({
+        "wall_time_s": wall_time,
+        "requests_per_s": len(latencies_ms) / wall_time if wall_time else None,
+        "products_per_s": len(latencies_ms) * batch_size / wall_time if wall_time else None,
+        "errors": errors,
+    })
+    return results
+
+
+def profile_stages(app, iterations, seed):
+    """
+    Times the stages of one /predict call in-process: JSON parsing, DataFrame
+    construction, model predict and DB commit.
+    """
+    import pandas as pd
+    from app import db
+    from app.routes import model_registry, build_prediction, to_grade
+
+    rng = random.Random(seed)
+    pipeline = model_registry.current().pipeline
+    stages = {"parse": [], "dataframe": [], "predict": [], "db_commit": []}
+
+    with app.app_context():
+        for _ in range(iterations):
+            body = json.dumps(synthetic_payload(rng)).encode('utf-8')
+
+            t0 = time.perf_counter()
+            input_data = json.loads(body)
+            t1 = time.perf_counter()
+            df = pd.DataFrame([input_data])
+            t2 = time.perf_counter()
+            prediction = pipeline.predict(df)[0]
+            t3 = time.perf_counter()
+            db.session.add(build_prediction(input_data, to_grade(prediction)))
+            db.session.commit()
+            t4 = time.perf_counter()
+
+            stages["parse"].append((t1 - t0) * 1000.0)
+            stages["dataframe"].append((t2 - t1) * 1000.0)
+            stages["predict"].append((t3 - t2) * 1000.0)
+            stages["db_commit"].append((t4 - t3) * 1000.0)
+
+    return {stage: summarize(values) for stage, values in stages.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test and latency benchmark for /predict.")
+    parser.add_argument('--url', help="Base URL of a running server (default: start the app in-process).")
+    parser.add_argument('--database-url',
+                        help="Database used when starting the app in-process "
+                             "(default: DATABASE_URL, else a local SQLite file).")
+    parser.add_argument('--endpoint', default='/predict', help="Endpoint to load (default: /predict).")
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help="Products per request; values > 1 send JSON arrays (use with /predict/batch).")
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent clients (default: 8).")
+    parser.add_argument('--requests', type=int, default=2000, help="Total requests (default: 2000).")
+    parser.add_argument('--duration', type=float, default=0,
+                        help="Run for this many seconds instead of a fixed number of requests.")
+    parser.add_argument('--warmup', type=int, default=50, help="Requests sent before measuring (default: 50).")
+    parser.add_argument('--stage-iterations', type=int, default=200,
+                        help="Iterations of the in-process stage breakdown, 0 to skip (default: 200).")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Result file (default: benchmarks/results/<timestamp>.json).")
+    args = parser.parse_args()
+
+    app = None
+    base_url = args.url
+    if base_url is None:
+        app, base_url = start_local_server(args.database_url)
+        print(f"Started app in-process at {base_url} using {os.environ['DATABASE_URL']}")
+
+    if args.warmup:
+        run_load(base_url, args.endpoint, min(args.concurrency, args.warmup), args.warmup, 0, args.batch_size, args.seed)
+
+    print(f"Running {args.duration or args.requests} {'seconds' if args.duration else 'requests'} "
+          f"against {base_url}{args.endpoint} with {args.concurrency} concurrent clients...")
+    load = run_load(base_url, args.endpoint, args.concurrency, args.requests, args.duration,
+                    args.batch_size, args.seed)
+
+    stages = None
+    if app is not None and args.stage_iterations:
+        stages = profile_stages(app, args.stage_iterations, args.seed)
+
+    results = {
+        "timestamp": datetime.now().isoformat(timespec='seconds'),
+        "parameters": vars(args),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "load": load,
+        "stages": stages,
+    }
+
+    print(f"Requests/sec: {load['requests_per_s']:.1f}  "
+          f"p50: {load['p50_ms']:.2f} ms  p95: {load['p95_ms']:.2f} ms  p99: {load['p99_ms']:.2f} ms"
+          if load['count'] else "No successful requests.")
+    if load['errors']:
+        print(f"Errors: {load['errors']}")
+    if stages:
+        for stage, stats in stages.items():
+            print(f"  {stage:<10} p50: {stats['p50_ms']:.3f} ms  p99: {stats['p99_ms']:.3f} ms")
+
+    output = args.output or os.path.join(
+        current_dir, 'results', f"predict_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
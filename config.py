@@ -7,3 +7,61 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')  # Utilise la variable d'environnement
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SECRET_KEY = os.getenv('SECRET_KEY') or 'you-will-never-guess'
+
+    # Maximum number of products accepted by /predict/batch in a single request
+    PREDICT_BATCH_MAX_SIZE = int(os.getenv('PREDICT_BATCH_MAX_SIZE', 5000))
+
+    # Single-row inference engine: 'pipeline' (sklearn Pipeline.predict) or
+    # 'compiled' (pandas-free NumPy engine from app/inference.py)
+    INFERENCE_ENGINE = os.getenv('INFERENCE_ENGINE', 'pipeline')
+
+    # Coalesce concurrent /predict calls into one batched predict per window
+    PREDICT_COALESCE_ENABLED = os.getenv('PREDICT_COALESCE_ENABLED', 'false').lower() == 'true'
+    PREDICT_COALESCE_WINDOW_MS = float(os.getenv('PREDICT_COALESCE_WINDOW_MS', 2))
+    PREDICT_COALESCE_MAX_ROWS = int(os.getenv('PREDICT_COALESCE_MAX_ROWS', 64))
+
+    # Write-behind persistence: /predict queues rows and a background thread bulk-inserts them
+    PREDICTION_WRITE_BEHIND = os.getenv('PREDICTION_WRITE_BEHIND', 'false').lower() == 'true'
+    PREDICTION_WRITE_QUEUE_SIZE = int(os.getenv('PREDICTION_WRITE_QUEUE_SIZE', 10000))
+    PREDICTION_WRITE_BATCH_SIZE = int(os.getenv('PREDICTION_WRITE_BATCH_SIZE', 500))
+    PREDICTION_WRITE_FLUSH_INTERVAL = float(os.getenv('PREDICTION_WRITE_FLUSH_INTERVAL', 0.5))
+    PREDICTION_ID_BLOCK_SIZE = int(os.getenv('PREDICTION_ID_BLOCK_SIZE', 100))
+
+    # Prediction cache: 'none', 'memory' (in-process LRU) or 'redis' (shared)
+    PREDICTION_CACHE = os.getenv('PREDICTION_CACHE', 'none')
+    PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', 10000))
+    PREDICTION_CACHE_TTL = float(os.getenv('PREDICTION_CACHE_TTL', 3600))
+    PREDICTION_CACHE_REDIS_URL = os.getenv('PREDICTION_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+    # Model registry: every *.joblib next to MODEL_PATH is a selectable version
+    MODEL_LOAD_MODE = os.getenv('MODEL_LOAD_MODE', 'lazy')  # 'lazy', 'background' or 'eager'
+    # Seconds between checks of the active model file and of the version published by POST /admin/model
+    # (0 disables; must be > 0 to activate a version with several workers)
+    MODEL_WATCH_INTERVAL = float(os.getenv('MODEL_WATCH_INTERVAL', 0))
+    MODEL_MMAP_MODE = os.getenv('MODEL_MMAP_MODE') or None  # e.g. 'r' to memory-map an uncompressed model file
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')  # required by the /admin endpoints
+
+    # Production server (gunicorn.conf.py)
+    SERVER_BIND = os.getenv('SERVER_BIND', '0.0.0.0:5000')
+    SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', os.cpu_count() or 1))
+    SERVER_THREADS = int(os.getenv('SERVER_THREADS', 4))
+    SERVER_PRELOAD = os.getenv('SERVER_PRELOAD', 'true').lower() == 'true'
+    SERVER_KEEPALIVE = int(os.getenv('SERVER_KEEPALIVE', 5))
+    SERVER_TIMEOUT = int(os.getenv('SERVER_TIMEOUT', 30))
+    SERVER_GRACEFUL_TIMEOUT = int(os.getenv('SERVER_GRACEFUL_TIMEOUT', 30))
+
+    # Thread pool running model inference for the ASGI /predict route (app/asgi.py)
+    ASGI_INFERENCE_THREADS = int(os.getenv('ASGI_INFERENCE_THREADS', 4))
+
+    # SQLAlchemy connection pool (app/pool.py)
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 5))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))  # seconds to wait before failing fast
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))  # seconds, -1 disables
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 5000))  # 0 disables
+
+    # Sampling profiler: profile this fraction of /predict requests and keep the slowest
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))  # 0 disables
+    PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', 10))
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
@@ -0,0 +1,28 @@
+# gunicorn.conf.py
+# Production server settings, read from Config.
+# Usage: gunicorn -c gunicorn.conf.py run:app
+from config import Config
+
+bind = Config.SERVER_BIND
+workers = Config.SERVER_WORKERS
+threads = Config.SERVER_THREADS
+worker_class = 'gthread'
+
+# Import the app (and, with MODEL_LOAD_MODE=eager, load the model) once in
+# the master so forked workers share its memory pages
+preload_app = Config.SERVER_PRELOAD
+
+keepalive = Config.SERVER_KEEPALIVE
+timeout = Config.SERVER_TIMEOUT
+graceful_timeout = Config.SERVER_GRACEFUL_TIMEOUT
+
+accesslog = '-'
+errorlog = '-'
+
+
+def worker_exit(server, worker):
+    # Flush predictions still queued by the write-behind writer
+    extensions = getattr(getattr(worker, 'wsgi', None), 'extensions', {})
+    writer = extensions.get('prediction_writer')
+    if writer is not None:
+        writer.close(timeout=Config.SERVER_GRACEFUL_TIMEOUT)
@@ -0,0 +1,97 @@
+# tests/test_inference.py
+"""
+Parity between the compiled NumPy engine of app/inference.py and
+Pipeline.predict, on small RandomForest and LogisticRegression pipelines
+shaped like the saved model (imputed and scaled nutrients, one-hot PNNS group).
+"""
+
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+pytest.importorskip('sklearn')
+
+from sklearn.compose import ColumnTransformer  # noqa: E402
+from sklearn.ensemble import RandomForestClassifier  # noqa: E402
+from sklearn.impute import SimpleImputer  # noqa: E402
+from sklearn.linear_model import LogisticRegression  # noqa: E402
+from sklearn.pipeline import Pipeline  # noqa: E402
+from sklearn.preprocessing import OneHotEncoder, StandardScaler  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.inference import CompiledPipeline, check_parity  # noqa: E402
+
+NUMERIC = ['energy-kcal_100g', 'fat_100g', 'sugars_100g', 'salt_100g']
+CATEGORICAL = ['pnns_groups_1']
+GROUPS = ['Sugary snacks', 'Beverages', 'Composite foods', 'Fruits and vegetables', 'Cereals and potatoes']
+
+
+def make_products(n, seed):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'energy-kcal_100g': rng.uniform(0, 600, n),
+        'fat_100g': rng.uniform(0, 50, n),
+        'sugars_100g': rng.uniform(0, 60, n),
+        'salt_100g': rng.uniform(0, 3, n),
+        'pnns_groups_1': rng.choice(GROUPS, n).astype(object),
+    })
+    score = df['energy-kcal_100g'] / 150 + df['sugars_100g'] / 15 + df['salt_100g']
+    grades = np.array(list('abcde'))[np.clip(score.astype(int), 0, 4)]
+    return df, grades
+
+
+def build_pipeline(model, with_mean):
+    preprocessor = ColumnTransformer([
+        ('num', Pipeline([
+            ('imputer', SimpleImputer(strategy='median')),
+            ('scaler', StandardScaler(with_mean=with_mean)),
+        ]), NUMERIC),
+        ('cat', Pipeline([
+            ('imputer', SimpleImputer(strategy='most_frequent')),
+            ('onehot', OneHotEncoder(handle_unknown='ignore')),
+        ]), CATEGORICAL),
+    ])
+    return Pipeline([('preprocessor', preprocessor), ('model', model)])
+
+
+def held_out_products():
+    df, _ = make_products(200, seed=1)
+    # Missing nutrients, a missing group and a group never seen during training
+    df.loc[0:9, 'fat_100g'] = np.nan
+    df.loc[5:14, 'energy-kcal_100g'] = np.nan
+    df.loc[20:29, 'pnns_groups_1'] = np.nan
+    df.loc[30:39, 'pnns_groups_1'] = 'Spaceships'
+    return df
+
+
+@pytest.mark.parametrize('with_mean', [True, False])
+@pytest.mark.parametrize('model', [
+    RandomForestClassifier(n_estimators=20, max_depth=8, random_state=0),
+    LogisticRegression(max_iter=2000),
+], ids=['random_forest', 'logistic_regression'])
+def test_compiled_pipeline_matches_pipeline_predict(model, with_mean):
+    X, y = make_products(500, seed=0)
+    pipeline = build_pipeline(model, with_mean).fit(X, y)
+    compiled = CompiledPipeline(pipeline)
+
+    df = held_out_products()
+    expected = pipeline.predict(df)
+    records = df.to_dict(orient='records')
+
+    assert [compiled.predict_one(record) for record in records] == list(expected)
+    assert list(compiled.predict(records)) == list(expected)
+    assert check_parity(pipeline, compiled, df) == []
+
+
+def test_scaler_without_mean_is_not_centered():
+    X, y = make_products(100, seed=0)
+    pipeline = build_pipeline(LogisticRegression(max_iter=2000), with_mean=False).fit(X, y)
+    compiled = CompiledPipeline(pipeline)
+
+    record = X.iloc[0].to_dict()
+    scaler = pipeline.named_steps['preprocessor'].named_transformers_['num'].named_steps['scaler']
+    expected = np.asarray([record[col] for col in NUMERIC]) / scaler.scale_
+    np.testing.assert_allclose(compiled.transform(record)[:len(NUMERIC)], expected)
@@ -0,0 +1,91 @@
+# tests/test_pipeline_parity.py
+"""
+Parity between the chunked scripts (02 then 06, followed by the sentinel
+replacement of 04 and the feature selection of 05) and the single-pass
+runner 09_streaming_pipeline.py, on a small dump with duplicates.
+"""
+
+import importlib
+import os
+import sys
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('pyarrow')
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app', 'scripts')
+sys.path.insert(0, SCRIPTS_DIR)
+
+clean_chunks = importlib.import_module('02_process_and_clean_csv_chunks')
+save_cleaned = importlib.import_module('06_process_and_save_cleaned_df')
+streaming = importlib.import_module('09_streaming_pipeline')
+from pipeline_stages import FEATURE_COLUMNS, NormalizeSentinels, SelectColumns  # noqa: E402
+
+HEADER = [
+    'code', 'url', 'product_name', 'brands', 'categories_tags', 'nutriscore_grade',
+    'pnns_groups_1', 'pnns_groups_2', 'energy-kcal_100g', 'fat_100g', 'sugars_100g', 'salt_100g',
+    'fruits-vegetables-nuts-estimate-from-ingredients_100g',
+]
+
+# (product_name, brands, grade, pnns_groups_1, energy, fat, sugars, salt, fruits)
+CHUNK_1 = [
+    ('Cookies', 'Acme', 'e', 'Sugary snacks', 480, 22, 30, 0.5, ''),
+    ('Cookies', 'Acme', 'e', 'Sugary snacks', 481, 22, 30, 0.5, ''),  # duplicate within the chunk
+    ('Juice', 'Fresh', 'c', 'Beverages', 45, 0, 10, 0, 100),
+    ('Soup', 'Chef', 'unknown', 'Composite foods', 60, 2, 1, 0.8, 10),  # invalid grade
+    # First copy without nutrients of 06 Step 2: dropped there, so the copy of chunk 2 must survive
+    ('Salad', 'Green', 'a', 'Fruits and vegetables', '', '', '', '', 80),
+    ('Yogurt', 'Dairy', 'b', 'unknown', 70, 3, 5, 0.1, ''),
+]
+CHUNK_2 = [
+    ('Cookies', 'Acme', 'e', 'Sugary snacks', 490, 23, 31, 0.5, ''),  # duplicate of chunk 1
+    ('Salad', 'Green', 'a', 'Fruits and vegetables', 20, 0.2, 2, 0.1, 80),
+    ('cookies', 'ACME', 'e', 'Sugary snacks', 470, 21, 29, 0.4, ''),  # differs by case: kept
+    ('Bread', 'Bakery', 'b', 'Cereals and potatoes', 250, 1, 3, 1.2, ''),
+    ('Juice', 'Fresh', 'c', 'Beverages', 46, 0, 11, 0, 100),  # duplicate of chunk 1
+]
+
+
+def write_tsv(path, rows, start):
+    lines = ['\t'.join(HEADER)]
+    for i, (name, brand, grade, pnns, energy, fat, sugars, salt, fruits) in enumerate(rows, start=start):
+        values = [str(i), f'http://example/{i}', name, brand, 'en:tag', grade, pnns, pnns,
+                  energy, fat, sugars, salt, fruits]
+        lines.append('\t'.join(str(value) for value in values))
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def as_text(df):
+    return df.reset_index(drop=True).astype(object).where(df.reset_index(drop=True).notna(), None).astype(str)
+
+
+def test_chunked_scripts_match_streaming_pipeline(tmp_path):
+    chunks_dir = tmp_path / 'output_chunks'
+    chunks_dir.mkdir()
+    write_tsv(chunks_dir / 'chunk_1.csv', CHUNK_1, start=1)
+    write_tsv(chunks_dir / 'chunk_2.csv', CHUNK_2, start=len(CHUNK_1) + 1)
+
+    # The raw dump is the two chunks one after the other
+    raw_file = tmp_path / 'big.csv'
+    with open(raw_file, 'w') as f:
+        f.write((chunks_dir / 'chunk_1.csv').read_text())
+        f.write(''.join((chunks_dir / 'chunk_2.csv').read_text().splitlines(keepends=True)[1:]))
+
+    cleaned_file = str(tmp_path / 'cleaned_df.csv')
+    cleaned_2_file = str(tmp_path / 'cleaned_df_2.csv')
+    assert clean_chunks.process_and_clean_csv_chunks(str(chunks_dir), cleaned_file) is not None
+    assert save_cleaned.process_and_save_cleaned_df(cleaned_file, cleaned_2_file) is not None
+    # 03 drops metadata columns, 04 replaces the sentinels and 05 keeps the feature columns
+    chunked = SelectColumns(FEATURE_COLUMNS)(NormalizeSentinels()(pd.read_csv(cleaned_2_file)))
+
+    streamed_file = str(tmp_path / 'selected_features.csv')
+    # Same chunk boundaries as the chunk files of 01, so the per-chunk steps see the same rows
+    streaming.run_streaming_pipeline(str(raw_file), streamed_file, chunk_size=len(CHUNK_1))
+    streamed = pd.read_csv(streamed_file)
+
+    assert list(chunked.columns) == list(streamed.columns)
+    assert as_text(chunked).equals(as_text(streamed))
+    # Cookies, Juice, Salad (its copy with nutrients), Yogurt, cookies/ACME and Bread
+    assert len(streamed) == 6